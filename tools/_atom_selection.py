@@ -0,0 +1,216 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Compiled atom selections for the functional group tools.
+
+A selection string such as
+
+    ((atom_type == 'S.3') | (atom_type == 'S.o2')) --> (atom_type == 'O.2')
+
+consists of sub-selections separated by `-->`. Each sub-selection is
+parsed once into a tree of comparisons between an atom column and a
+constant, combined with `&`, `|`, and `~` (or `and`, `or`, and `not`).
+The tree is evaluated with vectorized NumPy operations on the atom
+arrays of a molecule (or of many molecules at once), so no expression
+needs to be re-parsed per molecule.
+
+Atom columns are looked up as attributes of the `atoms` object, which
+may be a `_mol2_parser.AtomArrays` object or a pandas DataFrame. If
+`atoms` has an `atom_type_names` attribute, `atoms.atom_type` is
+expected to contain integer codes into `atom_type_names` (as in a
+`_mol2_store.MoleculeStore`); atom type comparisons are then evaluated
+once per distinct atom type and looked up by code.
+"""
+
+import ast
+import operator
+
+import numpy as np
+
+from _mol2_parser import ATOM_COLUMNS
+
+
+_OPERATORS = {ast.Eq: operator.eq,
+              ast.NotEq: operator.ne,
+              ast.Lt: operator.lt,
+              ast.LtE: operator.le,
+              ast.Gt: operator.gt,
+              ast.GtE: operator.ge}
+_FLIPPED = {operator.eq: operator.eq, operator.ne: operator.ne,
+            operator.lt: operator.gt, operator.le: operator.ge,
+            operator.gt: operator.lt, operator.ge: operator.le}
+
+
+def split_selection(s):
+    """Splits a selection string into its `-->`-separated
+    sub-selection strings."""
+    return [subs.strip() for subs in s.split('-->')]
+
+
+def parse_selection(s):
+    """Returns the compiled `AtomSelection` of each `-->`-separated
+    sub-selection in `s`."""
+    return [AtomSelection(subs) for subs in split_selection(s)]
+
+
+def selection_columns(selections):
+    """Returns the atom columns referenced by any of the compiled
+    `selections`."""
+    return [c for c in ATOM_COLUMNS
+            if any(c in sele.columns for sele in selections)]
+
+
+class AtomSelection(object):
+    """A single sub-selection compiled into NumPy predicates.
+
+    Parameters
+    -----------
+    source : str
+      Sub-selection string, for example,
+      `"(atom_type == 'O.2') & (charge <= -0.5)"`.
+
+    Attributes
+    -----------
+    columns : list
+      Atom columns referenced by the selection.
+
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.columns = []
+        try:
+            tree = ast.parse(source.strip(), mode='eval')
+        except SyntaxError:
+            raise ValueError('Invalid selection: %s' % source)
+        self._predicate = self._compile(tree.body)
+
+    def __repr__(self):
+        return 'AtomSelection(%r)' % self.source
+
+    def __call__(self, atoms):
+        """Returns the boolean mask of the selected atoms."""
+        return self._predicate(atoms)
+
+    def _compile(self, node):
+        if isinstance(node, ast.BinOp) and isinstance(node.op,
+                                                      (ast.BitAnd, ast.BitOr)):
+            return _combine(isinstance(node.op, ast.BitAnd),
+                            [self._compile(node.left),
+                             self._compile(node.right)])
+        if isinstance(node, ast.BoolOp):
+            return _combine(isinstance(node.op, ast.And),
+                            [self._compile(n) for n in node.values])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op,
+                                                        (ast.Invert, ast.Not)):
+            operand = self._compile(node.operand)
+            return lambda atoms: ~operand(atoms)
+        if isinstance(node, ast.Compare):
+            terms = [node.left] + node.comparators
+            return _combine(True, [
+                self._comparison(terms[i], op, terms[i + 1])
+                for i, op in enumerate(node.ops)])
+        raise ValueError('Unsupported expression in selection %r: %s' %
+                         (self.source, _source(node)))
+
+    def _comparison(self, left, op, right):
+        if type(op) not in _OPERATORS:
+            raise ValueError('Unsupported comparison in selection %r' %
+                             self.source)
+        op = _OPERATORS[type(op)]
+        if isinstance(right, ast.Name) and not isinstance(left, ast.Name):
+            left, right, op = right, left, _FLIPPED[op]
+        if not isinstance(left, ast.Name):
+            raise ValueError('Comparisons in selection %r must compare an'
+                             ' atom column with a constant' % self.source)
+        column = left.id
+        if column not in ATOM_COLUMNS:
+            raise ValueError('Unknown column %r in selection %r (columns:'
+                             ' %s)' % (column, self.source,
+                                       ', '.join(ATOM_COLUMNS)))
+        try:
+            value = ast.literal_eval(right)
+        except ValueError:
+            raise ValueError('Comparisons in selection %r must compare an'
+                             ' atom column with a constant' % self.source)
+        if column not in self.columns:
+            self.columns.append(column)
+
+        if column == 'atom_type':
+            return _AtomTypeComparison(op, value)
+
+        def predicate(atoms):
+            return op(np.asarray(getattr(atoms, column)), value)
+        return predicate
+
+
+def _combine(conjunction, predicates):
+    if len(predicates) == 1:
+        return predicates[0]
+    combine = np.logical_and if conjunction else np.logical_or
+
+    def predicate(atoms):
+        mask = predicates[0](atoms)
+        for p in predicates[1:]:
+            mask = combine(mask, p(atoms))
+        return mask
+    return predicate
+
+
+class _AtomTypeComparison(object):
+    """Compares atom types with a constant; integer-coded atom types
+    are looked up in a table of per-type results."""
+
+    def __init__(self, op, value):
+        self.op = op
+        self.value = value
+        self._names = None
+        self._table = None
+
+    def __call__(self, atoms):
+        names = getattr(atoms, 'atom_type_names', None)
+        if names is None:
+            return self.op(np.asarray(atoms.atom_type), self.value)
+        if names is not self._names:
+            self._table = np.array([bool(self.op(name, self.value))
+                                    for name in names], dtype=bool)
+            self._names = names
+        return self._table[atoms.atom_type]
+
+
+def _source(node):
+    try:
+        return ast.unparse(node)
+    except AttributeError:
+        return type(node).__name__
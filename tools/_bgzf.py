@@ -0,0 +1,348 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Seekable block-compressed gzip files (BGZF).
+
+BGZF files are a series of independently compressed gzip members of
+at most 64 KB each, followed by an empty end-of-file member. They are
+valid gzip files (readable with `gzip`, `zcat`, and so forth), can be
+compressed and decompressed in parallel, and support random access
+through a block index that maps uncompressed to compressed offsets.
+The block index is stored next to the data file in the `.gzi` format
+used by `bgzip`.
+"""
+
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+BLOCK_SIZE = 0xff00
+GZI_SUFFIX = '.gzi'
+THREADS = min(8, os.cpu_count() or 1)
+
+_HEADER = struct.Struct('<4BI2BH2BHH')
+_TRAILER = struct.Struct('<2I')
+EOF_BLOCK = (b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC'
+             b'\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00')
+
+
+def gzi_path(path):
+    return path + GZI_SUFFIX
+
+
+def is_bgzf(path):
+    """Checks whether the gzip file at `path` starts with a BGZF block."""
+    with open(path, 'rb') as f:
+        header = f.read(18)
+    return (len(header) == 18 and
+            header[:4] == b'\x1f\x8b\x08\x04' and
+            header[12:16] == b'BC\x02\x00')
+
+
+def _compress_block(data, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = compressor.compress(data) + compressor.flush()
+    bsize = _HEADER.size + len(cdata) + _TRAILER.size - 1
+    return b''.join((_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6,
+                                  66, 67, 2, bsize),
+                     cdata,
+                     _TRAILER.pack(zlib.crc32(data) & 0xffffffff,
+                                   len(data))))
+
+
+def _decompress_block(block):
+    cdata, crc, isize = block
+    data = zlib.decompress(cdata, -15)
+    if len(data) != isize or zlib.crc32(data) & 0xffffffff != crc:
+        raise IOError('Corrupted BGZF block')
+    return data
+
+
+def _read_block(fileobj):
+    """Reads the next raw block as `(cdata, crc, isize)`, or None at
+    the end of the file."""
+    header = fileobj.read(12)
+    if not header:
+        return None
+    if len(header) < 12 or header[:4] != b'\x1f\x8b\x08\x04':
+        raise IOError('Not a BGZF block')
+    xlen, = struct.unpack('<H', header[10:12])
+    extra = fileobj.read(xlen)
+    bsize = _find_bsize(extra)
+    rest = fileobj.read(bsize - xlen - 11)
+    crc, isize = _TRAILER.unpack(rest[-8:])
+    return rest[:-8], crc, isize
+
+
+def _find_bsize(extra):
+    pos = 0
+    while pos + 4 <= len(extra):
+        slen, = struct.unpack('<H', extra[pos + 2:pos + 4])
+        if extra[pos:pos + 2] == b'BC' and slen == 2:
+            return struct.unpack('<H', extra[pos + 4:pos + 6])[0]
+        pos += 4 + slen
+    raise IOError('BGZF block without BSIZE field')
+
+
+def build_block_index(path):
+    """Scans the block headers of a BGZF file.
+
+    Returns
+    -----------
+    (coffsets, uoffsets) : tuple of numpy.ndarray
+      Compressed and uncompressed start offsets of each block.
+
+    """
+    coffsets, uoffsets = [], []
+    coffset, uoffset = 0, 0
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        while coffset < size:
+            f.seek(coffset)
+            header = f.read(12)
+            xlen, = struct.unpack('<H', header[10:12])
+            bsize = _find_bsize(f.read(xlen))
+            f.seek(coffset + bsize + 1 - 4)
+            isize, = struct.unpack('<I', f.read(4))
+            if isize:
+                coffsets.append(coffset)
+                uoffsets.append(uoffset)
+            coffset += bsize + 1
+            uoffset += isize
+    return (np.array(coffsets, dtype=np.uint64),
+            np.array(uoffsets, dtype=np.uint64))
+
+
+def write_block_index(path, coffsets, uoffsets):
+    """Writes a `bgzip`-compatible `.gzi` block index for `path`."""
+    pairs = np.column_stack((coffsets[1:], uoffsets[1:])).astype('<u8')
+    with open(gzi_path(path), 'wb') as f:
+        f.write(struct.pack('<Q', len(pairs)))
+        f.write(pairs.tobytes())
+
+
+def load_block_index(path):
+    """Returns `(coffsets, uoffsets)` of the BGZF file at `path`, from
+    its `.gzi` file if it is up to date and by scanning otherwise."""
+    index_file = gzi_path(path)
+    if (os.path.isfile(index_file) and
+            os.path.getmtime(index_file) >= os.path.getmtime(path)):
+        with open(index_file, 'rb') as f:
+            n, = struct.unpack('<Q', f.read(8))
+            pairs = np.frombuffer(f.read(16 * n), dtype='<u8').reshape(n, 2)
+        return (np.concatenate(([0], pairs[:, 0])).astype(np.uint64),
+                np.concatenate(([0], pairs[:, 1])).astype(np.uint64))
+    return build_block_index(path)
+
+
+class BgzfWriter(object):
+    """Writes BGZF files, compressing blocks in parallel threads.
+
+    Parameters
+    -----------
+    path : str
+      Output path, typically ending in `.gz`.
+
+    threads : int (default: `THREADS`)
+      Number of compression threads.
+
+    level : int (default: 6)
+      zlib compression level.
+
+    write_index : bool (default: True)
+      Writes a `.gzi` block index next to the output file on `close()`.
+
+    """
+
+    def __init__(self, path, threads=THREADS, level=6, write_index=True):
+        self.path = path
+        self._f = open(path, 'wb')
+        self._level = level
+        self._buf = []
+        self._buf_size = 0
+        self._batch = max(1, threads) * 4 * BLOCK_SIZE
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._write_index = write_index
+        self._coffsets, self._uoffsets = [], []
+        self._coffset, self._uoffset = 0, 0
+
+    def write(self, data):
+        self._buf.append(bytes(data))
+        self._buf_size += len(data)
+        if self._buf_size >= self._batch:
+            self._flush_blocks(final=False)
+        return len(data)
+
+    def _flush_blocks(self, final):
+        data = b''.join(self._buf)
+        n_full = len(data) // BLOCK_SIZE
+        n_blocks = n_full + 1 if final and len(data) % BLOCK_SIZE else n_full
+        blocks = [data[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE]
+                  for i in range(n_blocks)]
+        rest = data[n_blocks * BLOCK_SIZE:]
+        self._buf = [rest] if rest else []
+        self._buf_size = len(rest)
+
+        if self._executor is not None:
+            compressed = self._executor.map(
+                lambda b: _compress_block(b, self._level), blocks)
+        else:
+            compressed = (_compress_block(b, self._level) for b in blocks)
+
+        for block, cblock in zip(blocks, compressed):
+            self._coffsets.append(self._coffset)
+            self._uoffsets.append(self._uoffset)
+            self._f.write(cblock)
+            self._coffset += len(cblock)
+            self._uoffset += len(block)
+
+    def close(self):
+        if self._f.closed:
+            return
+        self._flush_blocks(final=True)
+        self._f.write(EOF_BLOCK)
+        self._f.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+        if self._write_index:
+            write_block_index(self.path,
+                              np.array(self._coffsets, dtype=np.uint64),
+                              np.array(self._uoffsets, dtype=np.uint64))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BgzfReader(object):
+    """Reads BGZF files, decompressing batches of blocks in parallel
+    threads. Supports `read`, `tell`, and `seek` relative to the
+    uncompressed data.
+
+    Parameters
+    -----------
+    path : str
+      Path to a BGZF file.
+
+    threads : int (default: `THREADS`)
+      Number of decompression threads.
+
+    """
+
+    def __init__(self, path, threads=THREADS):
+        self.path = path
+        self._f = open(path, 'rb')
+        self._batch = max(1, threads) * 4
+        self._executor = ThreadPoolExecutor(threads) if threads > 1 else None
+        self._buf = b''
+        self._pos = 0
+        self._buf_offset = 0
+        self._eof = False
+        self._block_index = None
+
+    def _fill(self):
+        blocks = []
+        for _ in range(self._batch):
+            block = _read_block(self._f)
+            if block is None:
+                self._eof = True
+                break
+            blocks.append(block)
+
+        if self._executor is not None:
+            data = list(self._executor.map(_decompress_block, blocks))
+        else:
+            data = [_decompress_block(b) for b in blocks]
+
+        self._buf_offset += self._pos
+        self._buf = b''.join([self._buf[self._pos:]] + data)
+        self._pos = 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            chunks = [self._buf[self._pos:]]
+            self._buf_offset += len(self._buf)
+            self._buf, self._pos = b'', 0
+            while not self._eof:
+                self._fill()
+                chunks.append(self._buf)
+                self._buf_offset += len(self._buf)
+                self._buf = b''
+            return b''.join(chunks)
+        while len(self._buf) - self._pos < size and not self._eof:
+            self._fill()
+        data = self._buf[self._pos:self._pos + size]
+        self._pos += len(data)
+        return data
+
+    def tell(self):
+        return self._buf_offset + self._pos
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.tell()
+        elif whence != 0:
+            raise ValueError('Seeking from the end is not supported')
+
+        if self._buf_offset <= offset <= self._buf_offset + len(self._buf):
+            self._pos = offset - self._buf_offset
+            return offset
+
+        if self._block_index is None:
+            self._block_index = load_block_index(self.path)
+        coffsets, uoffsets = self._block_index
+        i = max(int(np.searchsorted(uoffsets, offset, side='right')) - 1, 0)
+        self._f.seek(int(coffsets[i]))
+        self._buf, self._pos = b'', 0
+        self._buf_offset = int(uoffsets[i])
+        self._eof = False
+        self._fill()
+        self._pos = min(offset - self._buf_offset, len(self._buf))
+        return offset
+
+    def close(self):
+        self._f.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
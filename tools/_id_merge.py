@@ -0,0 +1,223 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Out-of-core set operations on molecule ID files.
+
+Each ID file is sorted externally: IDs are read in chunks of at most
+`run_size` unique IDs, and every chunk is sorted and spilled to a
+temporary run file. Runs are merged lazily (in several passes if there
+are more than `MERGE_FAN_IN` of them), so memory usage is bounded by the
+chunk size regardless of the size of the inputs. The sorted, duplicate-
+free streams of all files are then combined in a single N-way merge.
+
+Sorted streams are passed around as blocks (lists) of IDs rather than
+one ID at a time: a merge step takes the IDs up to the smallest block
+maximum from every stream and combines them with Python's set and
+sort operations, so the per-ID work happens in C.
+"""
+
+import os
+import tempfile
+from bisect import bisect_right
+from functools import reduce
+
+from _id_set import READ_SIZE
+
+
+RUN_SIZE = 1000000
+MERGE_FAN_IN = 64
+RUN_READ_SIZE = 1 << 18
+OPERATIONS = ('union', 'intersection', 'difference', 'symdiff')
+
+
+def _union(pieces):
+    if len(pieces) == 1:
+        return pieces[0]
+    # the pieces are sorted runs, which timsort merges in linear time;
+    # dict.fromkeys drops the (adjacent) duplicates and keeps the order
+    return list(dict.fromkeys(sorted([i for piece in pieces for i in piece])))
+
+
+def _intersection(pieces):
+    common = set(pieces[0]).intersection(*pieces[1:])
+    return [i for i in pieces[0] if i in common]
+
+
+def _difference(pieces):
+    rest = set().union(*pieces[1:])
+    return [i for i in pieces[0] if i not in rest]
+
+
+def _symdiff(pieces):
+    odd = reduce(set.symmetric_difference, pieces[1:], set(pieces[0]))
+    return [i for i in _union(pieces) if i in odd]
+
+
+_COMBINE = {'union': _union,
+            'intersection': _intersection,
+            'difference': _difference,
+            'symdiff': _symdiff}
+
+
+def _iter_blocks(path, read_size, skip_comments=False):
+    """Yields lists of the stripped, non-empty lines of a file, read in
+    blocks of about `read_size` bytes."""
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(read_size)
+            if not block:
+                return
+            block += f.readline()
+            lines = [line.strip() for line in block.split(b'\n')]
+            if skip_comments and b'#' in block:
+                yield [line for line in lines
+                       if line and not line.startswith(b'#')]
+            else:
+                yield [line for line in lines if line]
+
+
+def _write_run(sorted_blocks, tmpdir):
+    fd, path = tempfile.mkstemp(suffix='.ids', dir=tmpdir)
+    with os.fdopen(fd, 'wb') as f:
+        for block in sorted_blocks:
+            if block:
+                f.write(b'\n'.join(block) + b'\n')
+    return path
+
+
+def merge_blocks(streams, operation='union'):
+    """Combines sorted, duplicate-free block streams (iterables of
+    sorted lists of IDs) via a set operation and yields the result as
+    sorted blocks.
+
+    `operation` is one of
+      - 'union': IDs contained in any stream
+      - 'intersection': IDs contained in all streams
+      - 'difference': IDs of the first stream that are not contained
+        in any of the other streams
+      - 'symdiff': IDs contained in an odd number of streams (the
+        symmetric difference of all streams applied pairwise)
+    """
+    combine = _COMBINE.get(operation)
+    if combine is None:
+        raise ValueError('Unknown set operation %r' % operation)
+
+    streams = [iter(stream) for stream in streams]
+    buffers = [[] for _ in streams]
+    active = list(range(len(streams)))
+    while True:
+        for i in list(active):
+            while not buffers[i]:
+                buffers[i] = next(streams[i], None)
+                if buffers[i] is None:
+                    buffers[i] = []
+                    active.remove(i)
+                    break
+        if not active:
+            return
+
+        # all IDs <= cutoff are in the buffers, since every active
+        # buffer ends with an ID >= cutoff
+        cutoff = min(buffers[i][-1] for i in active)
+        pieces = []
+        for i, buf in enumerate(buffers):
+            k = bisect_right(buf, cutoff)
+            pieces.append(buf[:k])
+            buffers[i] = buf[k:]
+        block = combine(pieces)
+        if block:
+            yield block
+
+
+def sort_idfile(id_file_path, tmpdir, run_size=RUN_SIZE):
+    """Sorts the IDs in an ID file (one ID per line; lines starting
+    with `#` are ignored) into run files in `tmpdir`.
+
+    Returns a list of run file paths whose merged content (see
+    `iter_sorted`) is the sorted, deduplicated content of the ID file.
+    At most `run_size` IDs (plus one read block) are held in memory at
+    a time.
+    """
+    runs = []
+    chunk = set()
+    for lines in _iter_blocks(id_file_path, READ_SIZE,
+                              skip_comments=True):
+        chunk.update(lines)
+        if len(chunk) >= run_size:
+            runs.append(_write_run([sorted(chunk)], tmpdir))
+            chunk = set()
+    if chunk or not runs:
+        runs.append(_write_run([sorted(chunk)], tmpdir))
+    del chunk
+
+    while len(runs) > MERGE_FAN_IN:
+        merged = []
+        for i in range(0, len(runs), MERGE_FAN_IN):
+            group = runs[i:i + MERGE_FAN_IN]
+            merged.append(_write_run(iter_sorted(group), tmpdir))
+            for path in group:
+                os.remove(path)
+        runs = merged
+    return runs
+
+
+def iter_sorted(runs):
+    """Yields the sorted, deduplicated IDs of the given run files as
+    sorted blocks."""
+    if len(runs) == 1:
+        return _iter_blocks(runs[0], RUN_READ_SIZE)
+    return merge_blocks([_iter_blocks(path, RUN_READ_SIZE)
+                         for path in runs])
+
+
+def combine_idfiles(id_file_paths, output_path, operation,
+                    run_size=RUN_SIZE, tmpdir=None):
+    """Applies a set operation (see `merge_blocks`) to ID files and
+    writes the resulting IDs in sorted order to `output_path`.
+
+    Temporary run files are written to a new directory inside `tmpdir`
+    (default: the system's temporary directory) and removed afterwards.
+    Returns the number of IDs written.
+    """
+    if operation not in _COMBINE:
+        raise ValueError('Unknown set operation %r' % operation)
+    n_written = 0
+    with tempfile.TemporaryDirectory(dir=tmpdir) as run_dir:
+        streams = [iter_sorted(sort_idfile(path, run_dir, run_size))
+                   for path in id_file_paths]
+        with open(output_path, 'wb') as ofile:
+            for block in merge_blocks(streams, operation):
+                ofile.write(b'\n'.join(block) + b'\n')
+                n_written += len(block)
+    return n_written
@@ -0,0 +1,532 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Compact, read-only sets of molecule IDs.
+
+IDs that consist of a digit-free prefix (such as `ZINC`) followed by up
+to 19 digits are stored as sorted unsigned integer arrays, one per
+prefix and number of digits (4 bytes per ID for numbers below 2**32),
+and looked up via binary search. All other IDs are kept in a regular
+Python set, as are all IDs of small sets, for which memory usage is not
+a concern.
+
+An optional Bloom filter over the raw ID bytes rejects most absent IDs
+before they are parsed and looked up. It can be cached in a `.bloom`
+sidecar next to an ID file (see `read_idfile`), which is rebuilt if the
+size or modification time of the ID file changes.
+
+Bloom filter layout (little-endian):
+
+    header   : magic, version, n_bits, n_hashes, ID file size, mtime
+    bits     : (n_bits + 7) // 8 bytes
+"""
+
+import os
+import struct
+from array import array
+
+import numpy as np
+
+
+MAX_DIGITS = 19
+SMALL_SET_SIZE = 1 << 20
+READ_SIZE = 1 << 22
+
+BLOOM_SUFFIX = '.bloom'
+BLOOM_MAGIC = b'SLBLOOM1'
+BLOOM_VERSION = 1
+_BLOOM_HEADER = struct.Struct('<8sIQIQq')
+
+_DIGITS = b'0123456789'
+
+
+def _numeric_key(mol2_id):
+    """Returns `((prefix, n_digits), number)` for IDs like `ZINC00012345`,
+    and None for IDs with digits in the prefix or without trailing
+    digits (for example, `ZINC00012345_1`)."""
+    prefix = mol2_id.rstrip(_DIGITS)
+    n_digits = len(mol2_id) - len(prefix)
+    if not n_digits or n_digits > MAX_DIGITS:
+        return None
+    if prefix.translate(None, _DIGITS) != prefix:
+        return None
+    return (prefix, n_digits), int(mol2_id[len(prefix):])
+
+
+def _mix(x):
+    """SplitMix64 finalizer, applied element-wise to a uint64 array."""
+    with np.errstate(over='ignore'):
+        x = (x ^ (x >> np.uint64(30))) * np.uint64(0xbf58476d1ce4e5b9)
+        x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94d049bb133111eb)
+        return x ^ (x >> np.uint64(31))
+
+
+def hash_ids(mol2_ids):
+    """Stable 64-bit hashes (uint64 array) of a list of IDs (bytes
+    without newlines), computed on the raw bytes in 8-byte words."""
+    n = len(mol2_ids)
+    if not n:
+        return np.zeros(0, dtype=np.uint64)
+    buf = np.frombuffer(b'\n'.join(mol2_ids) + b'\n', dtype=np.uint8)
+    width = len(mol2_ids[0])
+    if len(buf) == n * (width + 1) and (
+            buf[width::width + 1] == 10).all():
+        chars = buf.reshape(n, width + 1)[:, :width]
+    else:
+        ids = np.array(mol2_ids, dtype=bytes)
+        width = ids.dtype.itemsize
+        chars = ids.view(np.uint8).reshape(n, width)
+    padded = np.zeros((n, -(-width // 8) * 8), dtype=np.uint8)
+    padded[:, :width] = chars
+    words = padded.view('<u8')
+
+    h = np.full(n, 0x9e3779b97f4a7c15, dtype=np.uint64)
+    for i in range(words.shape[1]):
+        word = words[:, i].astype(np.uint64)
+        # words beyond the end of shorter IDs are zero and skipped
+        h = np.where(word != 0, _mix(h ^ word), h)
+    return h
+
+
+class BloomFilter(object):
+    """Blocked Bloom filter over 64-bit hashes. The `n_hashes` bits of
+    an item all lie in the same 64-bit word, so a lookup reads a single
+    word of the filter."""
+
+    def __init__(self, n_bits, n_hashes, bits=None):
+        self.n_words = max(-(-int(n_bits) // 64), 1)
+        self.n_bits = self.n_words * 64
+        self.n_hashes = int(n_hashes)
+        if bits is None:
+            bits = np.zeros(self.n_words * 8, dtype=np.uint8)
+        self.bits = bits
+        self._words = bits.view('<u8')
+
+    @classmethod
+    def for_capacity(cls, n_items, bits_per_item=12, n_hashes=6):
+        """About 1.5% false positives with the default parameters."""
+        return cls(max(int(n_items), 1) * bits_per_item, n_hashes)
+
+    def _locate(self, hashes):
+        words = (hashes % np.uint64(self.n_words)).astype(np.int64)
+        # bit positions within the word from the upper 36 bits
+        masks = np.zeros(len(hashes), dtype=np.uint64)
+        high = hashes >> np.uint64(28)
+        for i in range(self.n_hashes):
+            masks |= np.uint64(1) << ((high >> np.uint64(6 * i)) &
+                                      np.uint64(63))
+        return words, masks
+
+    def add(self, hashes):
+        words, masks = self._locate(hashes)
+        np.bitwise_or.at(self._words, words, masks)
+
+    def contains(self, hashes):
+        """Returns a boolean array that is False for hashes that were
+        definitely not added."""
+        words, masks = self._locate(hashes)
+        return (self._words[words] & masks) == masks
+
+    def __getstate__(self):
+        return self.n_bits, self.n_hashes, self.bits
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def write(self, path, stamp=(0, 0)):
+        with open(path, 'wb') as f:
+            f.write(_BLOOM_HEADER.pack(BLOOM_MAGIC, BLOOM_VERSION,
+                                       self.n_bits, self.n_hashes, *stamp))
+            f.write(self.bits.tobytes())
+
+    @classmethod
+    def read(cls, path):
+        """Returns `(bloom_filter, stamp)` from a `.bloom` file."""
+        with open(path, 'rb') as f:
+            header = f.read(_BLOOM_HEADER.size)
+            if len(header) != _BLOOM_HEADER.size:
+                raise ValueError('%s is not a screenlamp Bloom filter' % path)
+            magic, version, n_bits, n_hashes, size, mtime = (
+                _BLOOM_HEADER.unpack(header))
+            if magic != BLOOM_MAGIC or version != BLOOM_VERSION:
+                raise ValueError('%s is not a screenlamp Bloom filter' % path)
+            bits = np.fromfile(f, dtype=np.uint8)
+        if len(bits) != (n_bits + 7) // 8:
+            raise ValueError('%s is truncated' % path)
+        return cls(n_bits, n_hashes, bits=bits), (size, mtime)
+
+
+def _parse_uniform(lines):
+    """Vectorized `_numeric_key` for a list of IDs that all have the same
+    prefix and number of digits as the first one. Returns `(key,
+    numbers)`, or None if that is not the case."""
+    key = _numeric_key(lines[0])
+    if key is None:
+        return None
+    prefix, n_digits = key[0]
+    width = len(prefix) + n_digits
+    ids = np.array(lines)
+    if ids.dtype.itemsize != width:
+        return None
+    chars = ids.view(np.uint8).reshape(len(lines), width)
+    if not (chars[:, :len(prefix)] ==
+            np.frombuffer(prefix, dtype=np.uint8)).all():
+        return None
+    digits = chars[:, len(prefix):] - np.uint8(48)
+    if not (digits < 10).all():
+        return None
+    powers = np.uint64(10) ** np.arange(n_digits - 1, -1, -1, dtype=np.uint64)
+    return key[0], digits.astype(np.uint64).dot(powers)
+
+
+class _IdSetBuilder(object):
+
+    def __init__(self, bloom=False):
+        self.numeric = {}
+        self.strings = set()
+        self.hashes = [] if bloom else None
+
+    def add(self, mol2_id):
+        if self.hashes is not None:
+            self.hashes.append(hash_ids([mol2_id]))
+        key = _numeric_key(mol2_id)
+        if key is None:
+            self.strings.add(mol2_id)
+        else:
+            self._values(key[0]).append(key[1])
+
+    def add_lines(self, lines):
+        """Adds the IDs in a list of stripped ID file lines, skipping
+        empty and comment lines."""
+        lines = [line for line in lines
+                 if line and not line.startswith(b'#')]
+        if self.hashes is not None:
+            self.hashes.append(hash_ids(lines))
+        parsed = _parse_uniform(lines) if lines else None
+        if parsed is not None:
+            self._values(parsed[0]).frombytes(parsed[1].tobytes())
+            return
+        for line in lines:
+            key = _numeric_key(line)
+            if key is None:
+                self.strings.add(line)
+            else:
+                self._values(key[0]).append(key[1])
+
+    def bloom_filter(self):
+        """Returns a Bloom filter over the hashes of all added IDs."""
+        hashes = np.unique(np.concatenate(self.hashes or [hash_ids([])]))
+        self.hashes = None
+        bloom = BloomFilter.for_capacity(len(hashes))
+        bloom.add(hashes)
+        return bloom
+
+    def _values(self, key):
+        values = self.numeric.get(key)
+        if values is None:
+            values = self.numeric[key] = array('Q')
+        return values
+
+    def unique_arrays(self):
+        """Returns the sorted, deduplicated numeric IDs per key."""
+        arrays = {}
+        for key in list(self.numeric):
+            values = np.frombuffer(self.numeric.pop(key),
+                                   dtype=np.uint64).copy()
+            values.sort()
+            keep = np.ones(len(values), dtype=bool)
+            np.not_equal(values[1:], values[:-1], out=keep[1:])
+            values = values[keep]
+            if values[-1] < 2**32:
+                values = values.astype(np.uint32)
+            arrays[key] = values
+        return arrays
+
+
+class IdSet(object):
+    """Memory-efficient, read-only set of molecule IDs (bytes).
+
+    Parameters
+    -----------
+    ids : iterable of bytes
+      Molecule IDs; duplicates are removed.
+
+    bloom : bool or BloomFilter (default: False)
+      If True, builds a Bloom filter over the raw ID bytes (about 1.2
+      bytes per ID) that is checked before any other lookup in
+      `contains_many`, so that most absent IDs are rejected after
+      hashing. This mainly helps when most queried IDs are absent from
+      a very large set. A previously built filter can be passed instead.
+
+    """
+
+    def __init__(self, ids=(), bloom=False, _builder=None):
+        if _builder is None:
+            _builder = _IdSetBuilder(bloom=bloom is True)
+            for mol2_id in ids:
+                _builder.add(mol2_id)
+
+        self.bloom = None
+        if isinstance(bloom, BloomFilter):
+            self.bloom = bloom
+        elif bloom:
+            self.bloom = _builder.bloom_filter()
+
+        self._numeric = _builder.unique_arrays()
+        self._strings = _builder.strings
+        self._ranks = None
+
+        # small sets are kept as a regular set for faster lookups
+        self._set = None
+        if len(self) < SMALL_SET_SIZE:
+            self._set = set(self)
+            self._numeric = {}
+            self._strings = set()
+
+    @classmethod
+    def from_blocks(cls, blocks, bloom=False):
+        """Creates a set from an iterable of ID blocks (bytes of
+        newline-separated IDs, each ending with a newline); empty lines
+        and lines starting with `#` are ignored."""
+        builder = _IdSetBuilder(bloom=bloom is True)
+        for block in blocks:
+            builder.add_lines([line.strip() for line in block.split(b'\n')])
+        return cls(bloom=bloom, _builder=builder)
+
+    @classmethod
+    def from_idfile(cls, id_file_path, bloom=False):
+        """Reads an ID file (one ID per line; lines starting with `#`
+        are ignored) block-wise."""
+        return cls.from_blocks(iter_idfile_blocks(id_file_path), bloom=bloom)
+
+    def __len__(self):
+        if self._set is not None:
+            return len(self._set)
+        return (sum(len(v) for v in self._numeric.values()) +
+                len(self._strings))
+
+    def __contains__(self, mol2_id):
+        if self._set is not None:
+            return mol2_id in self._set
+        key = _numeric_key(mol2_id)
+        if key is None:
+            return mol2_id in self._strings
+        values = self._numeric.get(key[0])
+        if values is None or key[1] > values[-1]:
+            return False
+        value = values.dtype.type(key[1])
+        return bool(values[values.searchsorted(value)] == value)
+
+    def contains_many(self, mol2_ids):
+        """Returns a boolean array indicating which of the IDs in the
+        list `mol2_ids` are in the set."""
+        if self.bloom is not None and len(mol2_ids):
+            candidates = np.flatnonzero(
+                self.bloom.contains(hash_ids(mol2_ids)))
+            found = np.zeros(len(mol2_ids), dtype=bool)
+            if len(candidates):
+                found[candidates] = self._contains_many(
+                    [mol2_ids[i] for i in candidates.tolist()])
+            return found
+        return self._contains_many(mol2_ids)
+
+    def _contains_many(self, mol2_ids):
+        if self._set is not None:
+            s = self._set
+            return np.fromiter((i in s for i in mol2_ids), dtype=bool,
+                               count=len(mol2_ids))
+
+        found = np.zeros(len(mol2_ids), dtype=bool)
+        groups, strings = _group_ids(mol2_ids)
+        for i, mol2_id in strings:
+            found[i] = mol2_id in self._strings
+        for key, (positions, numbers) in groups.items():
+            self._lookup(key, positions, numbers, found)
+        return found
+
+    def _lookup(self, key, positions, numbers, found):
+        values = self._numeric.get(key)
+        if values is None:
+            return
+        candidates = numbers <= values[-1]
+        positions = positions[candidates]
+        numbers = numbers[candidates].astype(values.dtype)
+        idx = values.searchsorted(numbers)
+        found[positions] = values[idx] == numbers
+
+    def index_many(self, mol2_ids):
+        """Returns the position of each of the IDs in the list
+        `mol2_ids` in the iteration order of the set (from 0 to
+        `len(self) - 1`), or -1 for IDs that are not in the set, for
+        example, to index an array with one entry per ID."""
+        if self._ranks is None:
+            self._ranks = self._build_ranks()
+        ranks, offsets = self._ranks
+        if self._set is not None:
+            return np.fromiter((ranks.get(i, -1) for i in mol2_ids),
+                               dtype=np.int64, count=len(mol2_ids))
+
+        index = np.full(len(mol2_ids), -1, dtype=np.int64)
+        groups, strings = _group_ids(mol2_ids)
+        for i, mol2_id in strings:
+            index[i] = ranks.get(mol2_id, -1)
+        for key, (positions, numbers) in groups.items():
+            values = self._numeric.get(key)
+            if values is None:
+                continue
+            candidates = numbers <= values[-1]
+            positions = positions[candidates]
+            numbers = numbers[candidates].astype(values.dtype)
+            # searching in sorted order is more cache-friendly
+            order = numbers.argsort()
+            idx = np.empty_like(order)
+            idx[order] = values.searchsorted(numbers[order])
+            found = values[idx] == numbers
+            index[positions[found]] = idx[found] + offsets[key]
+        return index
+
+    def _build_ranks(self):
+        """Returns `(ranks, offsets)`, a dict that maps non-numeric IDs
+        to their positions, and the position of the first ID of each
+        numeric key."""
+        if self._set is not None:
+            return {mol2_id: i for i, mol2_id in enumerate(self._set)}, {}
+        offsets = {}
+        n = 0
+        for key, values in sorted(self._numeric.items()):
+            offsets[key] = n
+            n += len(values)
+        return {mol2_id: n + i for i, mol2_id
+                in enumerate(self._strings)}, offsets
+
+    def __iter__(self):
+        """Yields the IDs (numeric IDs grouped by prefix and sorted)."""
+        if self._set is not None:
+            for mol2_id in self._set:
+                yield mol2_id
+            return
+        for (prefix, n_digits), values in sorted(self._numeric.items()):
+            fmt = prefix.replace(b'%', b'%%') + b'%0' + b'%d' % n_digits + b'd'
+            for start in range(0, len(values), 100000):
+                for v in values[start:start + 100000].tolist():
+                    yield fmt % v
+        for mol2_id in self._strings:
+            yield mol2_id
+
+
+def _group_ids(mol2_ids):
+    """Returns `(groups, strings)` for a list of IDs, where `groups`
+    maps numeric keys (see `_numeric_key`) to arrays of the positions
+    and numbers of the IDs with that key, and `strings` is a list of
+    `(position, mol2_id)` of the other IDs."""
+    parsed = _parse_uniform(mol2_ids) if len(mol2_ids) else None
+    if parsed is not None:
+        return {parsed[0]: (np.arange(len(mol2_ids)), parsed[1])}, []
+
+    groups, strings = {}, []
+    for i, mol2_id in enumerate(mol2_ids):
+        key = _numeric_key(mol2_id)
+        if key is None:
+            strings.append((i, mol2_id))
+        else:
+            group = groups.get(key[0])
+            if group is None:
+                group = groups[key[0]] = (array('q'), array('Q'))
+            group[0].append(i)
+            group[1].append(key[1])
+    return {key: (np.frombuffer(positions, dtype=np.int64),
+                  np.frombuffer(numbers, dtype=np.uint64))
+            for key, (positions, numbers) in groups.items()}, strings
+
+
+def iter_idfile_blocks(id_file_path):
+    """Yields blocks of about `READ_SIZE` bytes of complete lines from
+    an ID file."""
+    with open(id_file_path, 'rb') as f:
+        while True:
+            block = f.read(READ_SIZE)
+            if not block:
+                break
+            yield block + f.readline()
+
+
+def iter_idfile(id_file_path):
+    """Yields the IDs (bytes) in an ID file, skipping empty lines and
+    comment lines starting with `#`."""
+    with open(id_file_path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith(b'#'):
+                yield line
+
+
+def bloom_path(id_file_path):
+    return id_file_path + BLOOM_SUFFIX
+
+
+def _idfile_stamp(id_file_path):
+    stat = os.stat(id_file_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_bloom(id_file_path):
+    """Returns the cached Bloom filter of an ID file, or None if there
+    is no `.bloom` sidecar or if it is out of date."""
+    path = bloom_path(id_file_path)
+    if not os.path.isfile(path):
+        return None
+    bloom, stamp = BloomFilter.read(path)
+    if stamp != _idfile_stamp(id_file_path):
+        return None
+    return bloom
+
+
+def read_idfile(id_file_path, bloom=False):
+    """Reads an ID file (one ID per line) into an `IdSet`.
+
+    If `bloom` is True, the Bloom filter of the set is loaded from the
+    `.bloom` sidecar of the ID file, or built and saved to it if the
+    sidecar is missing or out of date."""
+    if not bloom:
+        return IdSet.from_idfile(id_file_path)
+    cached = load_bloom(id_file_path)
+    if cached is not None:
+        return IdSet.from_idfile(id_file_path, bloom=cached)
+    ids = IdSet.from_idfile(id_file_path, bloom=True)
+    # written under a temporary name so that concurrent readers never
+    # see a partial file
+    tmp_path = '%s.%d.tmp' % (bloom_path(id_file_path), os.getpid())
+    ids.bloom.write(tmp_path, stamp=_idfile_stamp(id_file_path))
+    os.replace(tmp_path, bloom_path(id_file_path))
+    return ids
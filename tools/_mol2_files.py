@@ -0,0 +1,184 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Shared discovery of MOL2 input files and planning of parallel work.
+
+Directories are walked recursively via `os.scandir`, and files are
+returned largest-first so that worker pools can use
+longest-processing-time-first scheduling. Files that are much larger
+than the rest can be split into virtual byte-range shards, which are
+read via `_mol2_reader.iter_mol2_range`.
+"""
+
+import os
+from collections import namedtuple
+
+from _bgzf import BLOCK_SIZE
+from _bgzf import is_bgzf
+from _bgzf import load_block_index
+from _mol2_index import indexed_count
+from _mol2_index import load_index
+from _mol2_reader import iter_mol2_range
+
+
+MOL2_SUFFIXES = ('.mol2', 'mol2.gz')
+SHARD_SIZE = 1 << 28
+
+
+Mol2File = namedtuple('Mol2File', ['path', 'size', 'n_molecules'])
+Mol2File.__doc__ = """A discovered MOL2 file, with its size in bytes on
+disk and its number of molecules (None if there is no up-to-date
+`.mol2.idx` index)."""
+
+Mol2Shard = namedtuple('Mol2Shard', ['path', 'start', 'stop'])
+Mol2Shard.__doc__ = """The records of `path` starting in the byte range
+`[start, stop)`; `stop` is None for the remainder of the file."""
+
+
+def _walk_mol2_paths(dir_path, recursive):
+    for entry in os.scandir(dir_path):
+        if entry.is_dir():
+            if recursive:
+                for path, size in _walk_mol2_paths(entry.path, recursive):
+                    yield path, size
+        elif entry.is_file() and entry.name.endswith(MOL2_SUFFIXES):
+            yield entry.path, entry.stat().st_size
+
+
+def scan_mol2_files(dir_path, recursive=True):
+    """Returns a list of `Mol2File`s, ordered largest-first.
+
+    Parameters
+    -----------
+    dir_path : str
+      Path to a `.mol2`/`.mol2.gz` file or a directory of such files.
+
+    recursive : bool (default: True)
+      Whether to include MOL2 files in subdirectories.
+
+    """
+    if os.path.isdir(dir_path):
+        found = _walk_mol2_paths(dir_path, recursive)
+    elif os.path.isfile(dir_path) and dir_path.endswith(MOL2_SUFFIXES):
+        found = [(dir_path, os.path.getsize(dir_path))]
+    else:
+        found = []
+
+    files = [Mol2File(path, size, indexed_count(path))
+             for path, size in found]
+    files.sort(key=lambda f: (-f.size, f.path))
+    return files
+
+
+def get_mol2_files(dir_path, recursive=True):
+    """Returns the paths of all `.mol2`/`.mol2.gz` files in `dir_path`
+    (or `dir_path` itself if it is a MOL2 file), ordered largest-first.
+
+    Raises a ValueError if two files in different subdirectories share
+    the same file name, since the tools name their output files after
+    the input files.
+    """
+    files = [f.path for f in scan_mol2_files(dir_path, recursive=recursive)]
+    seen = {}
+    for path in files:
+        name = os.path.basename(path)
+        if name in seen:
+            raise ValueError('Found multiple MOL2 files named %s:'
+                             '\n%s\n%s' % (name, seen[name], path))
+        seen[name] = path
+    return files
+
+
+def _record_boundaries(mol2_file, n_shards):
+    """Returns `n_shards - 1` split offsets of `mol2_file`, aligned to
+    record starts if the file is indexed."""
+    index = load_index(mol2_file.path)
+    if index is not None and len(index):
+        offsets = index.records['offset']
+        ordinals = [len(offsets) * i // n_shards for i in range(1, n_shards)]
+        return sorted(set(int(offsets[i]) for i in ordinals if i))
+
+    if mol2_file.path.endswith('.gz'):
+        _, uoffsets = load_block_index(mol2_file.path)
+        size = int(uoffsets[-1]) + BLOCK_SIZE
+    else:
+        size = mol2_file.size
+    return [size * i // n_shards for i in range(1, n_shards)]
+
+
+def plan_shards(mol2_files, shard_size=SHARD_SIZE):
+    """Splits MOL2 files into units of work of roughly `shard_size`
+    bytes (on disk), ordered largest-first.
+
+    Parameters
+    -----------
+    mol2_files : list
+      `Mol2File`s as returned by `scan_mol2_files`.
+
+    shard_size : int (default: 256 MB)
+      Files larger than `shard_size` are split into
+      `ceil(size / shard_size)` byte-range shards. Regular
+      (non-BGZF) `.mol2.gz` files cannot be split and are always
+      returned as a single shard.
+
+    Returns
+    -----------
+    A list of `Mol2Shard`s. Shards of the same file are consecutive and
+      in file order, so concatenating their outputs reproduces the
+      output of processing the whole file.
+
+    """
+    shards = []
+    for mol2_file in mol2_files:
+        n_shards = -(-mol2_file.size // shard_size)
+        splittable = (not mol2_file.path.endswith('.gz') or
+                      is_bgzf(mol2_file.path))
+        if n_shards < 2 or not splittable:
+            shards.append((mol2_file.size,
+                           Mol2Shard(mol2_file.path, 0, None)))
+            continue
+        bounds = [0] + _record_boundaries(mol2_file, n_shards) + [None]
+        shard_bytes = mol2_file.size // (len(bounds) - 1)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            shards.append((shard_bytes,
+                           Mol2Shard(mol2_file.path, start, stop)))
+
+    # stable sort keeps the shards of a file in order
+    shards.sort(key=lambda s: -s[0])
+    return [s for _, s in shards]
+
+
+def iter_shard_records(shard):
+    """Yields `(mol2_id, record)` for the records of a `Mol2Shard`."""
+    return iter_mol2_range(shard.path, shard.start, shard.stop)
@@ -0,0 +1,313 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Filtering of multi-MOL2 files by molecule ID sets or selections, shared
+by `id_to_mol2.py` and `datatable_to_id.py`.
+
+The selected molecules of each input file are written to a file of the
+same name in an output directory, optionally splitting large input
+files into byte-range shards that are filtered in parallel processes.
+"""
+
+import os
+import shutil
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from _bgzf import build_block_index
+from _bgzf import gzi_path
+from _bgzf import write_block_index
+from _mol2_files import Mol2File
+from _mol2_files import Mol2Shard
+from _mol2_files import plan_shards
+from _mol2_reader import iter_mol2_mmap
+from _mol2_reader import iter_mol2_range
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import open_mol2_output
+from _mol2_index import indexed_count
+from _mol2_index import load_index
+from _selection import Selection
+
+
+MIN_SHARD_SIZE = 1 << 24
+SHARDS_PER_PROCESS = 4
+ID_BATCH_SIZE = 4096
+
+
+class CountingWriter(object):
+    """Wraps an output file and counts the written records."""
+
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.n_written = 0
+
+    def write(self, record):
+        self.n_written += 1
+        return self.fileobj.write(record)
+
+
+def write_selected(mol2_ids, records, ids, includelist_filter, outfile):
+    found = ids.contains_many(mol2_ids)
+    for is_found, record in zip(found, records):
+        if is_found == includelist_filter:
+            outfile.write(record)
+
+
+def filter_selected(mol2_file, mask, includelist_filter, outfile,
+                    use_mmap=False, start=0, stop=None):
+    """Like `filter_records`, but selects molecules by their ordinal in
+    `mol2_file` via a boolean `mask`. Splitting a file into byte ranges
+    requires a `.mol2.idx` sidecar."""
+    if not includelist_filter:
+        mask = ~mask
+    whole_file = start == 0 and stop is None
+    index = load_index(mol2_file)
+
+    if index is not None:
+        if len(index) != len(mask):
+            raise ValueError('%s contains %d molecules, but the selection'
+                             ' expects %d' % (mol2_file, len(index),
+                                              len(mask)))
+        offsets = index.records['offset']
+        first = np.searchsorted(offsets, start)
+        last = len(index) if stop is None else np.searchsorted(offsets, stop)
+        ordinals = (np.flatnonzero(mask[first:last]) + first).tolist()
+        for _, _, record in index.iter_records(
+                mol2_file, ordinals, use_mmap=use_mmap):
+            outfile.write(record)
+        return int(last - first)
+
+    if not whole_file:
+        raise ValueError('Selecting molecules from a byte range of %s'
+                         ' requires an index' % mol2_file)
+    if use_mmap and not mol2_file.endswith('.gz'):
+        records = iter_mol2_mmap(mol2_file)
+    else:
+        records = iter_mol2_records(mol2_file)
+
+    n_molecules = 0
+    selected = mask.tolist()
+    for n_molecules, (_, record) in enumerate(records, 1):
+        if n_molecules <= len(selected) and selected[n_molecules - 1]:
+            outfile.write(record)
+    if n_molecules != len(selected):
+        raise ValueError('%s contains %d molecules, but the selection'
+                         ' expects %d' % (mol2_file, n_molecules,
+                                          len(selected)))
+    return n_molecules
+
+
+def filter_records(mol2_file, ids, includelist_filter, outfile,
+                   use_mmap=False, start=0, stop=None):
+    """Writes the selected molecules of `mol2_file` whose records start
+    in the byte range `[start, stop)` to `outfile` and returns the number
+    of scanned molecules. `ids` is an `_id_set.IdSet` or a
+    `_selection.Selection`."""
+    if isinstance(ids, Selection):
+        return filter_selected(mol2_file, ids.file_mask(mol2_file),
+                               includelist_filter, outfile,
+                               use_mmap=use_mmap, start=start, stop=stop)
+
+    whole_file = start == 0 and stop is None
+    index = load_index(mol2_file) if includelist_filter else None
+
+    if index is not None:
+        offsets = index.records['offset']
+        first = np.searchsorted(offsets, start)
+        last = len(index) if stop is None else np.searchsorted(offsets, stop)
+        ordinals = index.ordinals(ids, first, last)
+        for _, _, record in index.iter_records(
+                mol2_file, ordinals, use_mmap=use_mmap):
+            outfile.write(record)
+        return int(last - first)
+
+    if not whole_file:
+        records = iter_mol2_range(mol2_file, start, stop)
+    elif use_mmap and not mol2_file.endswith('.gz'):
+        records = iter_mol2_mmap(mol2_file)
+    else:
+        records = iter_mol2_records(mol2_file)
+
+    n_molecules = 0
+    batch_ids, batch_records = [], []
+    for n_molecules, (mol2_id, record) in enumerate(records, 1):
+        batch_ids.append(mol2_id)
+        batch_records.append(record)
+        if len(batch_ids) == ID_BATCH_SIZE:
+            write_selected(batch_ids, batch_records, ids, includelist_filter,
+                           outfile)
+            batch_ids, batch_records = [], []
+    write_selected(batch_ids, batch_records, ids, includelist_filter, outfile)
+    return n_molecules
+
+
+def filter_and_write(mol2_files, ids, output_dir, includelist_filter, verbose,
+                     use_mmap=False, bgzf=False):
+    """Writes the selected molecules of each input file to a file of the
+    same name in `output_dir` and returns the number of written
+    molecules."""
+    n_written = 0
+    for mol2_file in mol2_files:
+        if verbose:
+            sys.stdout.write('Processing %s' % os.path.basename(mol2_file))
+            sys.stdout.flush()
+
+        if not os.path.exists(output_dir):
+            os.mkdir(output_dir)
+
+        mol2_outpath = os.path.join(output_dir, os.path.basename(mol2_file))
+
+        with open_mol2_output(mol2_outpath, bgzf=bgzf) as f:
+            if verbose:
+                start = time.time()
+
+            out = CountingWriter(f)
+            n_molecules = filter_records(mol2_file, ids, includelist_filter,
+                                         out, use_mmap=use_mmap)
+            n_written += out.n_written
+
+            if verbose:
+                elapsed = time.time() - start
+                sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
+                                 (n_molecules, n_molecules / elapsed))
+                sys.stdout.flush()
+    return n_written
+
+
+def init_worker(ids):
+    global IDS
+    IDS = ids
+
+
+def filter_shard(job):
+    shard, out_path, includelist_filter, use_mmap, bgzf = job
+    with open_mol2_output(out_path, bgzf=bgzf) as f:
+        out = CountingWriter(f)
+        n_molecules = filter_records(shard.path, IDS, includelist_filter, out,
+                                     use_mmap=use_mmap, start=shard.start,
+                                     stop=shard.stop)
+    return n_molecules, out.n_written
+
+
+def concatenate_parts(part_paths, out_path, bgzf):
+    """Concatenates the outputs of the shards of a file. Concatenated
+    gzip (and BGZF) files are valid gzip files."""
+    with open(out_path, 'wb') as out:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as f:
+                shutil.copyfileobj(f, out, 1 << 24)
+            os.remove(part_path)
+            if os.path.exists(gzi_path(part_path)):
+                os.remove(gzi_path(part_path))
+
+    if bgzf and out_path.endswith('.gz'):
+        write_block_index(out_path, *build_block_index(out_path))
+
+
+def filter_and_write_parallel(mol2_files, ids, output_dir, includelist_filter,
+                              verbose, use_mmap=False, bgzf=False, n_cpus=1):
+    """Like `filter_and_write`, but splits the input files into byte-range
+    shards that are filtered by `n_cpus` processes (largest first). The
+    output files are identical to those of `filter_and_write`. Returns
+    the number of written molecules."""
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+
+    files = [Mol2File(p, os.path.getsize(p), None) for p in mol2_files]
+    shard_size = max(MIN_SHARD_SIZE,
+                     sum(f.size for f in files) // (SHARDS_PER_PROCESS * n_cpus))
+    if isinstance(ids, Selection):
+        # ordinals of byte-range shards are only known for indexed files
+        whole = [f for f in files if indexed_count(f.path) is None]
+        shards = (plan_shards([f for f in files if f not in whole],
+                              shard_size=shard_size) +
+                  [Mol2Shard(f.path, 0, None) for f in whole])
+    else:
+        shards = plan_shards(files, shard_size=shard_size)
+
+    file_shards = {}
+    for shard in shards:
+        file_shards.setdefault(shard.path, []).append(shard)
+
+    jobs, part_paths = [], {}
+    for shard in shards:
+        siblings = file_shards[shard.path]
+        base = os.path.basename(shard.path)
+        if len(siblings) == 1:
+            out_path = os.path.join(output_dir, base)
+        else:
+            out_path = os.path.join(output_dir, '.part%d_%s' % (
+                siblings.index(shard), base))
+            part_paths.setdefault(shard.path, [None] * len(siblings))
+            part_paths[shard.path][siblings.index(shard)] = out_path
+        jobs.append((shard, out_path, includelist_filter, use_mmap, bgzf))
+
+    if verbose:
+        start = time.time()
+
+    remaining = {path: len(s) for path, s in file_shards.items()}
+    scanned = dict.fromkeys(file_shards, 0)
+    n_written = 0
+    pool = Pool(processes=n_cpus, initializer=init_worker, initargs=(ids,))
+    try:
+        for job, (n_molecules, n_job_written) in zip(
+                jobs, pool.imap(filter_shard, jobs)):
+            path = job[0].path
+            scanned[path] += n_molecules
+            n_written += n_job_written
+            remaining[path] -= 1
+            if remaining[path]:
+                continue
+            if path in part_paths:
+                concatenate_parts(part_paths[path],
+                                  os.path.join(output_dir,
+                                               os.path.basename(path)),
+                                  bgzf)
+            if verbose:
+                sys.stdout.write('Processed %s | scanned %d molecules\n' %
+                                 (os.path.basename(path), scanned[path]))
+                sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+    if verbose:
+        elapsed = time.time() - start
+        n_molecules = sum(scanned.values())
+        sys.stdout.write('Total | scanned %d molecules | %d mol/sec\n' %
+                         (n_molecules, n_molecules / elapsed))
+        sys.stdout.flush()
+    return n_written
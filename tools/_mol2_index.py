@@ -0,0 +1,224 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Byte-offset index sidecars (`.mol2.idx`) for multi-MOL2 files.
+
+For every molecule in a MOL2 file, the index stores its ordinal (the
+position in the index), byte offset, record length, atom count, bond
+count, and molecule ID. Offsets refer to the decompressed byte stream
+for `.mol2.gz` files, which supports direct seeks only if the file is
+block-compressed (BGZF); regular gzip files are decompressed up to the
+requested offset.
+
+Binary layout (little-endian):
+
+    header   : magic, version, n_records, source size, source mtime
+    records  : n_records x (offset u8, length u4, n_atoms u4, n_bonds u4)
+    ids      : newline-separated molecule IDs
+"""
+
+import os
+import struct
+
+import numpy as np
+
+from _mol2_reader import mapped_mol2
+from _mol2_reader import open_mol2
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import iter_mol2_spans
+from _mol2_reader import record_counts
+
+
+INDEX_SUFFIX = '.idx'
+INDEX_MAGIC = b'SLMOL2IX'
+INDEX_VERSION = 1
+
+_HEADER = struct.Struct('<8sIQQq')
+RECORD_DTYPE = np.dtype([('offset', '<u8'),
+                         ('length', '<u4'),
+                         ('n_atoms', '<u4'),
+                         ('n_bonds', '<u4')])
+
+
+def index_path(mol2_path):
+    return mol2_path + INDEX_SUFFIX
+
+
+def _source_stamp(mol2_path):
+    stat = os.stat(mol2_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_index(mol2_path, out_path=None):
+    """Scans `mol2_path` and writes its `.idx` sidecar.
+
+    Returns the number of indexed molecules.
+    """
+    if out_path is None:
+        out_path = index_path(mol2_path)
+
+    records, ids = [], []
+    with open_mol2(mol2_path) as f:
+        for offset, mol2_id, record in iter_mol2_spans(f):
+            n_atoms, n_bonds = record_counts(record)
+            records.append((offset, len(record), n_atoms, n_bonds))
+            ids.append(mol2_id)
+
+    records = np.array(records, dtype=RECORD_DTYPE)
+    size, mtime = _source_stamp(mol2_path)
+    with open(out_path, 'wb') as f:
+        f.write(_HEADER.pack(INDEX_MAGIC, INDEX_VERSION,
+                             len(records), size, mtime))
+        f.write(records.tobytes())
+        f.write(b'\n'.join(ids))
+    return len(records)
+
+
+class Mol2Index(object):
+    """In-memory view of a `.mol2.idx` sidecar.
+
+    Attributes
+    -----------
+    records : numpy.ndarray
+      Structured array with `offset`, `length`, `n_atoms`,
+      and `n_bonds` fields; row i corresponds to molecule ordinal i.
+
+    ids : list
+      Molecule IDs (bytes) in file order.
+
+    """
+
+    def __init__(self, records, ids, source_stamp=None):
+        self.records = records
+        self.ids = ids
+        self.source_stamp = source_stamp
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            magic, version, n, size, mtime = _HEADER.unpack(
+                f.read(_HEADER.size))
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError('%s is not a screenlamp MOL2 index' % path)
+            records = np.frombuffer(f.read(n * RECORD_DTYPE.itemsize),
+                                    dtype=RECORD_DTYPE)
+            ids = f.read().split(b'\n') if n else []
+        return cls(records, ids, source_stamp=(size, mtime))
+
+    def ordinals(self, ids, start=0, stop=None):
+        """Returns the sorted ordinals in `[start, stop)` of all
+        molecules whose ID is in `ids` (an `_id_set.IdSet`)."""
+        found = ids.contains_many(self.ids[start:stop])
+        return (np.flatnonzero(found) + start).tolist()
+
+    def iter_records(self, mol2_path, ordinals, use_mmap=False):
+        """Yields `(ordinal, mol2_id, record)` for the given ordinals,
+        seeking directly to each record. `ordinals` should be sorted
+        for sequential access to gzip files.
+
+        If `use_mmap` is True and `mol2_path` is uncompressed, records
+        are `memoryview` slices of the memory-mapped file."""
+        if use_mmap and not mol2_path.endswith('.gz'):
+            with mapped_mol2(mol2_path) as mm:
+                view = memoryview(mm)
+                for i in ordinals:
+                    rec = self.records[i]
+                    start = int(rec['offset'])
+                    yield i, self.ids[i], view[start:start + rec['length']]
+                del view
+            return
+
+        with open_mol2(mol2_path) as f:
+            for i in ordinals:
+                yield i, self.ids[i], self.read_record(f, i)
+
+    def read_record(self, fileobj, ordinal):
+        """Reads the record of molecule `ordinal` from an open file
+        (see `_mol2_reader.open_mol2`)."""
+        rec = self.records[ordinal]
+        fileobj.seek(int(rec['offset']))
+        return fileobj.read(int(rec['length']))
+
+
+def load_index(mol2_path):
+    """Returns the `Mol2Index` of `mol2_path`, or None if there is no
+    sidecar or if it is out of date."""
+    path = index_path(mol2_path)
+    if not os.path.isfile(path):
+        return None
+    index = Mol2Index.read(path)
+    if index.source_stamp != _source_stamp(mol2_path):
+        return None
+    return index
+
+
+def indexed_count(mol2_path):
+    """Returns the number of molecules recorded in the `.mol2.idx`
+    sidecar of `mol2_path` by reading only the index header, or None if
+    there is no up-to-date sidecar."""
+    path = index_path(mol2_path)
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        header = f.read(_HEADER.size)
+    if len(header) != _HEADER.size:
+        return None
+    magic, version, n, size, mtime = _HEADER.unpack(header)
+    if (magic != INDEX_MAGIC or version != INDEX_VERSION or
+            (size, mtime) != _source_stamp(mol2_path)):
+        return None
+    return n
+
+
+def iter_records_at(mol2_path, ordinals):
+    """Yields `(ordinal, mol2_id, record)` for the sorted `ordinals`,
+    using the `.idx` sidecar if available and a single sequential scan
+    otherwise. Ordinals beyond the end of the file are skipped."""
+    index = load_index(mol2_path)
+    if index is not None:
+        ordinals = [i for i in ordinals if i < len(index)]
+        for rec in index.iter_records(mol2_path, ordinals):
+            yield rec
+        return
+
+    wanted = iter(ordinals)
+    next_wanted = next(wanted, None)
+    for i, (mol2_id, record) in enumerate(iter_mol2_records(mol2_path)):
+        if next_wanted is None:
+            break
+        if i == next_wanted:
+            yield i, mol2_id, record
+            next_wanted = next(wanted, None)
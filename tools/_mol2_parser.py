@@ -0,0 +1,189 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Lightweight NumPy parser for the `@<TRIPOS>ATOM` section of MOL2
+records that extracts only the requested columns, without building a
+pandas DataFrame per molecule.
+"""
+
+import numpy as np
+
+
+ATOM_COLUMNS = {'atom_id': (0, np.int64),
+                'atom_name': (1, str),
+                'x': (2, np.float64),
+                'y': (3, np.float64),
+                'z': (4, np.float64),
+                'atom_type': (5, str),
+                'subst_id': (6, np.int64),
+                'subst_name': (7, str),
+                'charge': (8, np.float64)}
+
+DEFAULT_COLUMNS = ('atom_type', 'x', 'y', 'z', 'charge')
+
+_ATOM_TAG = b'@<TRIPOS>ATOM'
+_SECTION_TAG = b'@<TRIPOS>'
+# stands in for line breaks in `atom_block_tokens`
+_LINE_END = b'\x00'
+
+
+class AtomArrays(object):
+    """Column arrays of a molecule's atoms, accessible as attributes
+    (for example, `atoms.atom_type` or `atoms.charge`)."""
+
+    def __init__(self, columns):
+        self.__dict__.update(columns)
+
+    def xyz(self):
+        return np.column_stack((self.x, self.y, self.z))
+
+
+def atom_block(record):
+    """Returns the raw atom lines of a MOL2 record (bytes or
+    memoryview)."""
+    record = bytes(record)
+    start = record.find(_ATOM_TAG)
+    if start == -1:
+        raise ValueError('Structural data could not be loaded. '
+                         'Is the input in the mol2 format?')
+    start = record.find(b'\n', start) + 1
+    end = record.find(_SECTION_TAG, start)
+    if end == -1:
+        end = len(record)
+    blank = record.find(b'\n\n', start - 1, end)
+    if blank != -1:
+        end = blank + 1
+    return record[start:end]
+
+
+def _column(table, name):
+    idx, dtype = ATOM_COLUMNS[name]
+    col = table[:, idx]
+    if dtype is str:
+        return col.astype(str)
+    return col.astype(dtype)
+
+
+def atom_block_tokens(block):
+    """Splits atom lines that all have exactly 9 columns into a flat
+    list of tokens in which each line is followed by an end-of-line
+    token, so that column i of the atoms is `tokens[i::10]`.
+
+    Returns `(tokens, n_atoms)`, where `tokens` is None if any line has
+    missing or extra columns.
+    """
+    if block and not block.endswith(b'\n'):
+        block += b'\n'
+    n_atoms = block.count(b'\n')
+    if not n_atoms or _LINE_END in block:
+        return None, n_atoms
+    tokens = block.replace(b'\n', b' ' + _LINE_END + b' ').split()
+    # every line is complete if the n_atoms end-of-line tokens are the
+    # ones at positions 9, 19, ...
+    if (len(tokens) != 10 * n_atoms or
+            tokens[9::10].count(_LINE_END) != n_atoms):
+        return None, n_atoms
+    return tokens, n_atoms
+
+
+def _token_column(tokens, name):
+    """Converts a column of a flat list of tokens as returned by
+    `atom_block_tokens`."""
+    idx, dtype = ATOM_COLUMNS[name]
+    col = np.array(tokens[idx::10], dtype=bytes)
+    if dtype is str:
+        return col.astype(str)
+    return col.astype(dtype)
+
+
+def parse_atom_block(record, columns=DEFAULT_COLUMNS):
+    """Parses the requested columns of a record's atom section.
+
+    Parameters
+    -----------
+    record : bytes or memoryview
+      Raw MOL2 record, for example, as returned by
+      `_mol2_reader.iter_mol2_records`.
+
+    columns : sequence of str (default: `DEFAULT_COLUMNS`)
+      Names of the columns to extract; see `ATOM_COLUMNS`.
+
+    Returns
+    -----------
+    AtomArrays with one NumPy array per requested column. String columns
+      are returned as unicode arrays. A missing charge column is
+      parsed as 0.0.
+
+    """
+    block = atom_block(record)
+    tokens, _ = atom_block_tokens(block)
+
+    if tokens is not None:
+        return AtomArrays({c: _token_column(tokens, c) for c in columns})
+
+    rows = [line.split() for line in block.split(b'\n') if line.strip()]
+    width = max([len(r) for r in rows] + [9])
+    table = np.array([r + [b'0.0'] * (width - len(r)) for r in rows],
+                     dtype=bytes).reshape(len(rows), width)
+    return AtomArrays({c: _column(table, c) for c in columns})
+
+
+def parse_atom_blocks(records, columns=DEFAULT_COLUMNS):
+    """Parses the requested atom columns of many records at once.
+
+    Returns `(atoms, offsets)`, where `atoms` is an `AtomArrays` object
+    holding the atoms of all records in a single array per column, and
+    the atoms of record i are `offsets[i]:offsets[i + 1]`.
+    """
+    blocks = [atom_block(record) for record in records]
+    blocks = [block if not block or block.endswith(b'\n') else block + b'\n'
+              for block in blocks]
+    counts = [block.count(b'\n') for block in blocks]
+    offsets = np.zeros(len(blocks) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    tokens, _ = atom_block_tokens(b''.join(blocks))
+    if tokens is not None:
+        return (AtomArrays({c: _token_column(tokens, c) for c in columns}),
+                offsets)
+
+    # some atom lines have missing or extra columns
+    parsed = [parse_atom_block(record, columns) for record in records]
+    atoms = {}
+    for c in columns:
+        arrays = [getattr(a, c) for a in parsed]
+        atoms[c] = (np.concatenate(arrays) if arrays else
+                    np.zeros(0, dtype=ATOM_COLUMNS[c][1]))
+    offsets[1:] = np.cumsum([len(getattr(a, columns[0])) for a in parsed]
+                            if columns else counts)
+    return AtomArrays(atoms), offsets
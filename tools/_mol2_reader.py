@@ -0,0 +1,366 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Shared multi-MOL2 record reader used by the screenlamp tools.
+
+Records are located by scanning large block-buffered byte chunks for
+`@<TRIPOS>MOLECULE` boundaries, so no per-line lists are built and
+`.mol2` and `.mol2.gz` inputs share the same bytes code path.
+Uncompressed files can alternatively be memory-mapped, in which case
+records are handed out as zero-copy `memoryview` slices. Block-compressed
+(BGZF) `.mol2.gz` files are decompressed in parallel threads.
+"""
+
+import os
+import re
+import gzip
+import mmap
+from contextlib import contextmanager
+
+from _bgzf import BgzfReader
+from _bgzf import BgzfWriter
+from _bgzf import is_bgzf
+
+
+MOLECULE_TAG = b'@<TRIPOS>MOLECULE'
+# record boundary followed by the rest of the tag line and the ID line
+_ID_PATTERN = re.compile(b'\n' + re.escape(MOLECULE_TAG) +
+                         b'[^\n]*(?:\n([^\n]*))?')
+CHUNK_SIZE = 1 << 22
+RELEASE_SIZE = 1 << 26
+
+
+def open_mol2(mol2_path):
+    """Opens a `.mol2` or `.mol2.gz` file for binary reading.
+
+    BGZF files are opened with a multi-threaded, seekable reader.
+    """
+    if mol2_path.endswith('.gz'):
+        if is_bgzf(mol2_path):
+            return BgzfReader(mol2_path)
+        return gzip.open(mol2_path, 'rb')
+    return open(mol2_path, 'rb')
+
+
+def open_mol2_output(mol2_path, bgzf=False):
+    """Opens a `.mol2` or `.mol2.gz` file for binary writing.
+
+    If `bgzf` is True, `.mol2.gz` files are written as independently
+    compressed BGZF blocks (plus a `.gzi` block index) using multiple
+    compression threads.
+    """
+    if mol2_path.endswith('.gz'):
+        if bgzf:
+            return BgzfWriter(mol2_path)
+        return gzip.open(mol2_path, 'wb')
+    return open(mol2_path, 'wb')
+
+
+def record_id(buf, start=0, end=None):
+    """Returns the molecule ID of the record starting at `start` in `buf`.
+
+    The ID is the (stripped) line following the `@<TRIPOS>MOLECULE` tag.
+    """
+    if end is None:
+        end = len(buf)
+    id_start = buf.find(b'\n', start, end) + 1
+    if not id_start:
+        return b''
+    id_end = buf.find(b'\n', id_start, end)
+    if id_end == -1:
+        id_end = end
+    return bytes(buf[id_start:id_end]).strip()
+
+
+def replace_record_id(record, new_id):
+    """Returns a copy of `record` where the molecule ID line is `new_id`."""
+    id_start = record.find(b'\n') + 1
+    id_end = record.find(b'\n', id_start)
+    return b''.join((record[:id_start], new_id, record[id_end:]))
+
+
+def record_counts(buf, start=0, end=None):
+    """Returns `(n_atoms, n_bonds)` from the MOLECULE header of a record.
+
+    Counts are read from the line following the molecule ID; missing
+    values are returned as 0.
+    """
+    if end is None:
+        end = len(buf)
+    line_start = buf.find(b'\n', start, end) + 1
+    line_start = buf.find(b'\n', line_start, end) + 1
+    if not line_start:
+        return 0, 0
+    line_end = buf.find(b'\n', line_start, end)
+    if line_end == -1:
+        line_end = end
+    counts = bytes(buf[line_start:line_end]).split()
+    try:
+        n_atoms = int(counts[0]) if counts else 0
+        n_bonds = int(counts[1]) if len(counts) > 1 else 0
+    except ValueError:
+        return 0, 0
+    return n_atoms, n_bonds
+
+
+def iter_mol2_spans(fileobj, chunk_size=CHUNK_SIZE):
+    """Yields `(offset, mol2_id, record)` from a binary file object.
+
+    `offset` is the position of the record's first byte relative to
+    where reading started; for gzip input, this refers to the
+    decompressed stream. See `iter_mol2_stream` for details.
+    """
+    boundary = b'\n' + MOLECULE_TAG
+    chunk_size = max(chunk_size, len(boundary))
+    buf = fileobj.read(chunk_size)
+    buf_offset = 0
+
+    # skip anything preceding the first molecule
+    if buf.startswith(MOLECULE_TAG):
+        start = 0
+    else:
+        while True:
+            start = buf.find(boundary)
+            if start != -1:
+                start += 1
+                break
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                return
+            buf_offset += max(len(buf) - len(boundary), 0)
+            buf = buf[-len(boundary):] + chunk
+
+    search_from = start
+    while True:
+        end = buf.find(boundary, search_from)
+        if end != -1:
+            end += 1
+            yield (buf_offset + start, record_id(buf, start, end),
+                   buf[start:end])
+            start = end
+            search_from = end
+            continue
+
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            if start < len(buf):
+                yield buf_offset + start, record_id(buf, start), buf[start:]
+            return
+        buf_offset += start
+        buf = buf[start:]
+        search_from = max(len(buf) - len(boundary) + 1, 0)
+        buf += chunk
+        start = 0
+
+
+def iter_mol2_stream(fileobj, chunk_size=CHUNK_SIZE):
+    """Yields `(mol2_id, record)` byte strings from a binary file object.
+
+    Parameters
+    -----------
+    fileobj : file-like
+      Binary file object supporting `read(n)`.
+
+    chunk_size : int (default: 4 MB)
+      Number of bytes read per block.
+
+    Returns
+    -----------
+    A generator of `(mol2_id, record)` tuples, where `record` contains
+      the raw bytes of a single molecule, starting with the
+      `@<TRIPOS>MOLECULE` line. Any content before the first
+      `@<TRIPOS>MOLECULE` tag is skipped.
+
+    """
+    for _, mol2_id, record in iter_mol2_spans(fileobj, chunk_size):
+        yield mol2_id, record
+
+
+def iter_mol2_records(mol2_path, chunk_size=CHUNK_SIZE):
+    """Yields `(mol2_id, record)` byte strings from a `.mol2(.gz)` file."""
+    with open_mol2(mol2_path) as f:
+        for rec in iter_mol2_stream(f, chunk_size=chunk_size):
+            yield rec
+
+
+def iter_mol2_range(mol2_path, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """Yields `(mol2_id, record)` for all records in a `.mol2` or BGZF
+    `.mol2.gz` file whose first byte lies in `[start, stop)`.
+
+    The byte range does not need to be aligned to record boundaries,
+    so a file can be split into arbitrary consecutive ranges and every
+    record is yielded by exactly one of them. For `.mol2.gz` files,
+    offsets refer to the decompressed stream (regular gzip files are
+    decompressed up to `start`).
+    """
+    with open_mol2(mol2_path) as f:
+        base = 0
+        if start > 0:
+            # start one byte early to see whether a record begins at `start`
+            base = start - 1
+            f.seek(base)
+        for offset, mol2_id, record in iter_mol2_spans(f, chunk_size):
+            if base + offset < start:
+                continue
+            if stop is not None and base + offset >= stop:
+                return
+            yield mol2_id, record
+
+
+def iter_mol2_ids(mol2_path, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """Yields the molecule IDs (bytes) of all records in a `.mol2` or
+    `.mol2.gz` file whose first byte lies in `[start, stop)`.
+
+    Same IDs as `iter_mol2_range`, but the input is only searched for
+    the ID lines following the `@<TRIPOS>MOLECULE` tags, without
+    splitting it into records. Whole uncompressed files are searched
+    in a memory map.
+    """
+    boundary = b'\n' + MOLECULE_TAG
+    if start == 0 and stop is None and not mol2_path.endswith('.gz'):
+        with mapped_mol2(mol2_path) as mm:
+            if mm[:len(MOLECULE_TAG)] == MOLECULE_TAG:
+                end = mm.find(boundary) + 1 or len(mm)
+                yield record_id(mm, 0, end)
+            for m in _ID_PATTERN.finditer(mm):
+                mol2_id = m.group(1)
+                yield mol2_id.strip() if mol2_id else b''
+        return
+
+    with open_mol2(mol2_path) as f:
+        if start > 0:
+            f.seek(start - 1)
+            base, buf = start - 1, b''
+        else:
+            # a virtual newline in front of the first byte
+            base, buf = -1, b'\n'
+
+        while True:
+            chunk = f.read(chunk_size)
+            buf += chunk
+            if chunk:
+                # the last record may continue in the next chunk
+                cut = buf.rfind(boundary)
+                if cut == -1:
+                    keep = len(boundary) - 1
+                    base += max(len(buf) - keep, 0)
+                    buf = buf[-keep:]
+                    continue
+                if cut == 0:
+                    continue
+            else:
+                cut = len(buf)
+
+            for m in _ID_PATTERN.finditer(buf, 0, cut):
+                offset = base + m.start() + 1
+                if offset < start:
+                    continue
+                if stop is not None and offset >= stop:
+                    return
+                mol2_id = m.group(1)
+                yield mol2_id.strip() if mol2_id else b''
+
+            if not chunk or (stop is not None and base + cut + 1 >= stop):
+                return
+            base += cut
+            buf = buf[cut:]
+
+
+def read_mol2_ids(mol2_path, start=0, stop=None, chunk_size=CHUNK_SIZE):
+    """Returns the molecule IDs of `iter_mol2_ids` as a list."""
+    return list(iter_mol2_ids(mol2_path, start, stop, chunk_size))
+
+
+@contextmanager
+def mapped_mol2(mol2_path):
+    """Memory-maps an uncompressed MOL2 file for reading.
+
+    Yields the `mmap` object (or an empty bytes object for empty files).
+    `memoryview` slices of the map remain valid until they are released;
+    the map itself is closed once all of them are gone.
+    """
+    with open(mol2_path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            yield b''
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if hasattr(mm, 'madvise'):
+        mm.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield mm
+    finally:
+        try:
+            mm.close()
+        except BufferError:
+            # slices are still referenced by the caller; the map is
+            # closed when they are garbage collected
+            pass
+
+
+def iter_mol2_mmap(mol2_path):
+    """Yields `(mol2_id, record)` from a memory-mapped `.mol2` file.
+
+    Same as `iter_mol2_records`, except that `record` is a read-only
+    `memoryview` into the mapped file rather than a bytes copy, which
+    can be passed to `write()` directly. Only supports uncompressed
+    MOL2 files.
+    """
+    boundary = b'\n' + MOLECULE_TAG
+    with mapped_mol2(mol2_path) as mm:
+        size = len(mm)
+        if mm[:len(MOLECULE_TAG)] == MOLECULE_TAG:
+            start = 0
+        else:
+            start = mm.find(boundary) + 1
+            if not start:
+                return
+
+        # pages behind the current position are dropped from the
+        # resident set periodically; they are re-read from the page
+        # cache if a caller still accesses an old slice
+        can_release = hasattr(mmap, 'MADV_DONTNEED')
+        released = 0
+
+        view = memoryview(mm)
+        while start < size:
+            end = mm.find(boundary, start) + 1
+            if not end:
+                end = size
+            yield record_id(mm, start, end), view[start:end]
+            start = end
+
+            if can_release and start - released > RELEASE_SIZE:
+                upto = start - start % mmap.PAGESIZE
+                mm.madvise(mmap.MADV_DONTNEED, released, upto - released)
+                released = upto
+        del view
@@ -0,0 +1,264 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Columnar molecule stores compiled from MOL2 libraries.
+
+A store is a directory of memory-mappable `.npy` arrays:
+
+    coords.npy        float32 (n_atoms, 3) atom coordinates
+    atom_types.npy    uint8   (n_atoms,) SYBYL atom type codes
+    charges.npy       float32 (n_atoms,) partial charges
+    atom_names.npy    bytes   (n_atoms,) atom names
+    mol_offsets.npy   int64   (n_molecules + 1,) first atom of each molecule
+    ids.npy           bytes   (n_molecules,) molecule IDs
+    file_offsets.npy  int64   (n_files + 1,) first molecule of each file
+
+plus `atom_types.txt` (atom type code table, one type per line) and
+`files.txt` (names of the compiled MOL2 files, one per line).
+Atoms of molecule i are `mol_offsets[i]:mol_offsets[i + 1]`.
+"""
+
+import os
+import shutil
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from _mol2_reader import iter_mol2_records
+from _mol2_parser import AtomArrays
+from _mol2_parser import parse_atom_block
+
+
+SYBYL_ATOM_TYPES = (
+    'Any', 'C.3', 'C.2', 'C.1', 'C.ar', 'C.cat', 'N.3', 'N.2', 'N.1',
+    'N.ar', 'N.am', 'N.pl3', 'N.4', 'O.3', 'O.2', 'O.co2', 'O.spc',
+    'O.t3p', 'S.3', 'S.2', 'S.O', 'S.O2', 'S.o', 'S.o2', 'P.3', 'F', 'H',
+    'H.spc', 'H.t3p', 'LP', 'Du', 'Du.C', 'Hal', 'Het', 'Hev', 'Li', 'Na',
+    'Mg', 'Al', 'Si', 'K', 'Ca', 'Cr.th', 'Cr.oh', 'Mn', 'Fe', 'Co.oh',
+    'Cu', 'Cl', 'Br', 'I', 'Zn', 'Se', 'Mo', 'Sn')
+
+STORE_COLUMNS = ('atom_type', 'atom_name', 'charge', 'x', 'y', 'z')
+
+
+def is_store(path):
+    return os.path.isfile(os.path.join(path, 'mol_offsets.npy'))
+
+
+class ArrayWriter(object):
+    """Appends fixed-dtype rows to a raw file and converts it to `.npy`
+    on `close()` without holding the column in memory."""
+
+    def __init__(self, path, dtype, row_shape=()):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.row_shape = row_shape
+        self.n = 0
+        self._f = open(path + '.tmp', 'wb')
+
+    def append(self, arr):
+        arr = np.ascontiguousarray(arr, dtype=self.dtype)
+        self._f.write(arr.tobytes())
+        self.n += len(arr)
+
+    def close(self):
+        self._f.close()
+        with open(self.path, 'wb') as out, open(self.path + '.tmp', 'rb') as f:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': np.lib.format.dtype_to_descr(self.dtype),
+                      'fortran_order': False,
+                      'shape': (self.n,) + self.row_shape})
+            shutil.copyfileobj(f, out, 1 << 24)
+        os.remove(self.path + '.tmp')
+
+
+class _StringWriter(object):
+    """Like `ArrayWriter` for byte strings, which are stored as
+    fixed-width `S` arrays of the longest appended string."""
+
+    def __init__(self, path):
+        self.path = path
+        self.n = 0
+        self.width = 1
+        self._f = open(path + '.tmp', 'wb')
+
+    def append(self, values):
+        if not values:
+            return
+        self.width = max(self.width, max(map(len, values)))
+        self._f.write(b'\n'.join(values) + b'\n')
+        self.n += len(values)
+
+    def close(self):
+        self._f.close()
+        dtype = np.dtype('S%d' % self.width)
+        with open(self.path, 'wb') as out, open(self.path + '.tmp', 'rb') as f:
+            np.lib.format.write_array_header_1_0(
+                out, {'descr': np.lib.format.dtype_to_descr(dtype),
+                      'fortran_order': False,
+                      'shape': (self.n,)})
+            while True:
+                lines = list(islice(f, 1 << 20))
+                if not lines:
+                    break
+                out.write(np.array([l[:-1] for l in lines],
+                                   dtype=dtype).tobytes())
+        os.remove(self.path + '.tmp')
+
+
+def compile_store(mol2_files, store_dir):
+    """Compiles MOL2 files into a columnar store at `store_dir`.
+
+    Returns the number of compiled molecules.
+    """
+    if not os.path.exists(store_dir):
+        os.mkdir(store_dir)
+
+    def path(name):
+        return os.path.join(store_dir, name)
+
+    codes = {t: i for i, t in enumerate(SYBYL_ATOM_TYPES)}
+    coords = ArrayWriter(path('coords.npy'), np.float32, (3,))
+    atom_types = ArrayWriter(path('atom_types.npy'), np.uint8)
+    charges = ArrayWriter(path('charges.npy'), np.float32)
+    atom_names = _StringWriter(path('atom_names.npy'))
+    ids = _StringWriter(path('ids.npy'))
+    mol_offsets, file_offsets = [0], [0]
+
+    for mol2_file in mol2_files:
+        for mol2_id, record in iter_mol2_records(mol2_file):
+            atoms = parse_atom_block(record, ('atom_name', 'atom_type',
+                                              'x', 'y', 'z', 'charge'))
+            types = atoms.atom_type.tolist()
+            for t in set(types) - set(codes):
+                if len(codes) > 255:
+                    raise ValueError('More than 256 distinct atom types')
+                codes[t] = len(codes)
+            atom_types.append([codes[t] for t in types])
+            coords.append(atoms.xyz())
+            charges.append(atoms.charge)
+            atom_names.append(np.char.encode(atoms.atom_name).tolist())
+            ids.append([mol2_id])
+            mol_offsets.append(mol_offsets[-1] + len(types))
+        file_offsets.append(ids.n)
+
+    for writer in (coords, atom_types, charges, atom_names, ids):
+        writer.close()
+    np.save(path('mol_offsets.npy'), np.array(mol_offsets, dtype=np.int64))
+    np.save(path('file_offsets.npy'), np.array(file_offsets, dtype=np.int64))
+    with open(path('atom_types.txt'), 'w') as f:
+        f.write(''.join(t + '\n' for t in sorted(codes, key=codes.get)))
+    with open(path('files.txt'), 'w') as f:
+        f.write(''.join(os.path.basename(m) + '\n' for m in mol2_files))
+    return ids.n
+
+
+class MoleculeStore(object):
+    """Read-only, memory-mapped view of a compiled molecule store."""
+
+    def __init__(self, store_dir):
+        def load(name):
+            return np.load(os.path.join(store_dir, name), mmap_mode='r')
+
+        self.path = store_dir
+        self.coords = load('coords.npy')
+        self.atom_types = load('atom_types.npy')
+        self.charges = load('charges.npy')
+        self.atom_names = load('atom_names.npy')
+        self.mol_offsets = load('mol_offsets.npy')
+        self.ids = load('ids.npy')
+        self.file_offsets = load('file_offsets.npy')
+        with open(os.path.join(store_dir, 'atom_types.txt'), 'r') as f:
+            self.atom_type_names = np.array(f.read().split(), dtype=object)
+        with open(os.path.join(store_dir, 'files.txt'), 'r') as f:
+            self.files = f.read().split('\n')[:-1]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def file_range(self, name):
+        """Returns the `(start, stop)` molecule range of a compiled file."""
+        i = self.files.index(name)
+        return int(self.file_offsets[i]), int(self.file_offsets[i + 1])
+
+    def atoms(self, start, stop):
+        """Returns the atoms of molecules `start:stop` as a DataFrame
+        with the columns in `STORE_COLUMNS` and the atom offsets of
+        each molecule relative to the first row."""
+        offsets = np.asarray(self.mol_offsets[start:stop + 1])
+        a, b = offsets[0], offsets[-1]
+        xyz = np.asarray(self.coords[a:b])
+        df = pd.DataFrame({
+            'atom_type': pd.Categorical.from_codes(
+                np.asarray(self.atom_types[a:b]),
+                categories=self.atom_type_names),
+            'atom_name': np.asarray(self.atom_names[a:b]).astype(str),
+            'charge': np.asarray(self.charges[a:b]),
+            'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2]})
+        return df, offsets - a
+
+    def atom_arrays(self, start, stop, columns=STORE_COLUMNS):
+        """Returns the requested columns of the atoms of molecules
+        `start:stop` as `_mol2_parser.AtomArrays` and the atom offsets
+        of each molecule relative to the first atom. Atom types are
+        integer codes into the `atom_type_names` attribute."""
+        offsets = np.asarray(self.mol_offsets[start:stop + 1])
+        a, b = offsets[0], offsets[-1]
+        arrays = {'atom_type_names': self.atom_type_names}
+        for c in columns:
+            if c == 'atom_type':
+                arrays[c] = np.asarray(self.atom_types[a:b])
+            elif c == 'atom_name':
+                arrays[c] = np.asarray(self.atom_names[a:b]).astype(str)
+            elif c == 'charge':
+                arrays[c] = np.asarray(self.charges[a:b])
+            elif c in ('x', 'y', 'z'):
+                arrays[c] = np.asarray(self.coords[a:b, 'xyz'.index(c)])
+            else:
+                raise ValueError('Column %r is not stored in molecule'
+                                 ' stores (columns: %s)' %
+                                 (c, ', '.join(STORE_COLUMNS)))
+        return AtomArrays(arrays), offsets - a
+
+
+def segment_any(mask, offsets):
+    """Returns for each segment `offsets[i]:offsets[i + 1]` whether any
+    element of the boolean `mask` is True."""
+    counts = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return counts[offsets[1:]] > counts[offsets[:-1]]
+
+
+def iter_chunks(n, chunk_size):
+    """Yields `(start, stop)` ranges covering `range(n)`."""
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
@@ -0,0 +1,63 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+"""
+Named selections (`"name=selection"`) for tools that evaluate several
+selections in a single pass over their input, for example,
+
+    strict=(NRB <= 5) & (MWT > 250)
+
+Selection files contain one named selection per line; blank lines and
+lines starting with `#` are ignored.
+"""
+
+import re
+
+
+_NAME_PATTERN = re.compile(r'\s*([A-Za-z_][\w.-]*)\s*=(?!=)(.*)$', re.DOTALL)
+
+
+def split_selection_name(s):
+    """Splits a `"name=selection"` argument into `(name, selection)`;
+    the name is None for plain selection strings."""
+    match = _NAME_PATTERN.match(s)
+    if match is None:
+        return None, s
+    return match.group(1), match.group(2).strip()
+
+
+def read_selection_file(path):
+    """Returns the `"name=selection"` lines of a selection file,
+    skipping blank lines and `#` comments."""
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
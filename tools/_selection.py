@@ -0,0 +1,262 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Packed bitmap selections (`.sel` files) of the molecules in a MOL2
+library.
+
+A selection flags molecules by their ordinal in the library catalog:
+the library's MOL2 files are ordered by file name, and molecules are
+numbered consecutively in file order, as in the `.mol2.idx` sidecars.
+Besides the bitmap (one bit per molecule), a selection file stores the
+name and molecule count of every catalog file, so that selections
+created from different libraries cannot be combined by accident, and
+so that the molecules of a MOL2 file can be looked up by its name.
+
+Binary layout (little-endian):
+
+    header : magic, version, n_files, n_molecules, size of the names
+    counts : n_files x molecule count (u8)
+    names  : newline-separated file names (UTF-8)
+    bits   : packed bitmap, least significant bit first
+"""
+
+import operator
+import os
+import struct
+from functools import reduce
+
+import numpy as np
+
+
+SELECTION_SUFFIX = '.sel'
+SELECTION_MAGIC = b'SLSELECT'
+SELECTION_VERSION = 1
+
+_HEADER = struct.Struct('<8sIIQQ')
+
+
+def is_selection_path(path):
+    """Returns True if `path` names a selection file (by its suffix)."""
+    return path.endswith(SELECTION_SUFFIX)
+
+
+def is_selection_file(path):
+    """Returns True if the existing file `path` is a selection file."""
+    with open(path, 'rb') as f:
+        return f.read(len(SELECTION_MAGIC)) == SELECTION_MAGIC
+
+
+class Selection(object):
+    """Selected molecules of a MOL2 library as a boolean mask over the
+    catalog ordinals.
+
+    Selections of the same catalog can be combined with the bitwise
+    operators `&` (intersection), `|` (union), `^` (symmetric
+    difference), `-` (difference), and `~` (complement).
+
+    Attributes
+    -----------
+    names : list
+      File names (basenames) of the catalog's MOL2 files, sorted.
+
+    counts : numpy.ndarray
+      Number of molecules in each file.
+
+    mask : numpy.ndarray
+      Boolean array with one entry per molecule.
+
+    """
+
+    def __init__(self, names, counts, mask):
+        self.names = list(names)
+        self.counts = np.asarray(counts, dtype=np.uint64)
+        self.mask = np.asarray(mask, dtype=bool)
+        if len(self.mask) != int(self.counts.sum()):
+            raise ValueError('Selection mask does not match the catalog')
+        stops = np.cumsum(self.counts).astype(np.int64).tolist()
+        self._ranges = {name: (stop - int(count), stop) for name, count, stop
+                        in zip(self.names, self.counts, stops)}
+
+    @classmethod
+    def from_masks(cls, file_masks):
+        """Creates a selection from a dict that maps MOL2 file paths to
+        a boolean mask of their molecules (in file order)."""
+        masks = {os.path.basename(path): np.asarray(mask, dtype=bool)
+                 for path, mask in file_masks.items()}
+        if len(masks) != len(file_masks):
+            raise ValueError('MOL2 file names must be unique')
+        names = sorted(masks)
+        mask = (np.concatenate([masks[name] for name in names])
+                if names else np.zeros(0, dtype=bool))
+        return cls(names, [len(masks[name]) for name in names], mask)
+
+    def __len__(self):
+        return len(self.mask)
+
+    def count(self):
+        """Returns the number of selected molecules."""
+        return int(np.count_nonzero(self.mask))
+
+    def file_mask(self, mol2_path):
+        """Returns the mask of the molecules in `mol2_path` (matched by
+        file name)."""
+        name = os.path.basename(mol2_path)
+        if name not in self._ranges:
+            raise ValueError('%s is not part of the library of this'
+                             ' selection' % name)
+        start, stop = self._ranges[name]
+        return self.mask[start:stop]
+
+    def _check_catalog(self, other):
+        if not isinstance(other, Selection):
+            return NotImplemented
+        if self.names != other.names or not np.array_equal(self.counts,
+                                                           other.counts):
+            raise ValueError('Selections refer to different libraries')
+        return None
+
+    def _combine(self, other, op):
+        if self._check_catalog(other) is NotImplemented:
+            return NotImplemented
+        return Selection(self.names, self.counts, op(self.mask, other.mask))
+
+    def __and__(self, other):
+        return self._combine(other, np.logical_and)
+
+    def __or__(self, other):
+        return self._combine(other, np.logical_or)
+
+    def __xor__(self, other):
+        return self._combine(other, np.logical_xor)
+
+    def __sub__(self, other):
+        return self._combine(other, lambda a, b: a & ~b)
+
+    def __invert__(self):
+        return Selection(self.names, self.counts, ~self.mask)
+
+    def write(self, path):
+        names = '\n'.join(self.names).encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(SELECTION_MAGIC, SELECTION_VERSION,
+                                 len(self.names), len(self.mask),
+                                 len(names)))
+            f.write(self.counts.astype('<u8').tobytes())
+            f.write(names)
+            f.write(np.packbits(self.mask, bitorder='little').tobytes())
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            magic, version, n_files, n_molecules, names_size = _HEADER.unpack(
+                f.read(_HEADER.size))
+            if magic != SELECTION_MAGIC or version != SELECTION_VERSION:
+                raise ValueError('%s is not a screenlamp selection' % path)
+            counts = np.frombuffer(f.read(8 * n_files), dtype='<u8')
+            names = f.read(names_size).decode('utf-8')
+            bits = np.frombuffer(f.read(), dtype=np.uint8)
+        mask = np.unpackbits(bits, count=n_molecules,
+                             bitorder='little').view(bool)
+        return cls(names.split('\n') if n_files else [], counts, mask)
+
+
+def read_selection(path):
+    return Selection.read(path)
+
+
+def combine_selections(selections, operation):
+    """Applies a set operation ('union', 'intersection', 'difference',
+    or 'symdiff'; see `_id_merge.merge_blocks`) to selections of the
+    same library."""
+    first, rest = selections[0], selections[1:]
+    if operation == 'union':
+        return reduce(operator.or_, rest, first)
+    if operation == 'intersection':
+        return reduce(operator.and_, rest, first)
+    if operation == 'difference':
+        return reduce(operator.sub, rest, first)
+    if operation == 'symdiff':
+        return reduce(operator.xor, rest, first)
+    raise ValueError('Unknown set operation %r' % operation)
+
+
+class IdFileWriter(object):
+    """Writes the IDs of matching molecules to a text ID file."""
+
+    def __init__(self, path, mol2_files=()):
+        self._file = open(path, 'wb')
+
+    def write(self, mol2_path, results):
+        """Writes the IDs in `results`, a list with one entry per
+        scanned molecule of `mol2_path` (in file order) that is the
+        molecule ID (bytes) if it matched and None otherwise. Matching
+        molecules with an empty ID are skipped."""
+        self._file.write(b''.join(mol2_id + b'\n' for mol2_id in results
+                                  if mol2_id))
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class SelectionWriter(IdFileWriter):
+    """Collects the matches of all scanned molecules (see
+    `IdFileWriter.write`) and writes them as a selection file."""
+
+    def __init__(self, path, mol2_files=()):
+        self._path = path
+        self._flags = {mol2_path: bytearray() for mol2_path in mol2_files}
+
+    def write(self, mol2_path, results):
+        flags = self._flags.setdefault(mol2_path, bytearray())
+        flags.extend(mol2_id is not None for mol2_id in results)
+
+    def close(self):
+        masks = {path: np.frombuffer(flags, dtype=bool)
+                 for path, flags in self._flags.items()}
+        Selection.from_masks(masks).write(self._path)
+
+
+def open_id_output(path, mol2_files=()):
+    """Opens the output of a tool that selects molecules among the
+    `mol2_files`: a selection file if `path` ends with `.sel`, and a
+    text ID file otherwise."""
+    if is_selection_path(path):
+        return SelectionWriter(path, mol2_files)
+    return IdFileWriter(path)
@@ -0,0 +1,211 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Columnar caches (`.cols` directories) of molecule property tables.
+
+The first time a table is read with a cache, it is parsed once (see
+`_table_reader.iter_table_chunks`) and every column is written to a memory-mappable
+`.npy` array next to the table:
+
+    columns.txt   column names, one per line (column i is `i.npy`)
+    stamp.txt     size, modification time, and separator of the table
+    0.npy, ...    numeric columns as int64/float64/bool arrays, text
+                  columns as fixed-width UTF-8 `S` arrays
+
+A cache is reused as long as the size and modification time of the
+table (and the separator) match the stamp; otherwise it is rebuilt.
+Reading a cache only touches the columns that are requested.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from _mol2_store import ArrayWriter
+from _table_reader import iter_table_chunks
+from _table_reader import read_table_columns
+
+
+CACHE_SUFFIX = '.cols'
+READ_CHUNK_SIZE = 100000
+
+
+def cache_path(table_path):
+    return table_path + CACHE_SUFFIX
+
+
+def _table_stamp(table_path, sep):
+    stat = os.stat(table_path)
+    return '%d %d %r' % (stat.st_size, stat.st_mtime_ns, sep)
+
+
+def _encode(series):
+    """Returns a text column as a fixed-width `S` array (UTF-8);
+    missing values become empty strings."""
+    values = series.fillna('').astype(str).str.encode('utf-8').tolist()
+    return np.array(values, dtype=bytes) if values else np.zeros(0, 'S1')
+
+
+def _finalize_column(chunk_paths, out_path):
+    """Concatenates the per-chunk arrays of a column, promoting them to
+    a common dtype (text if any chunk is text)."""
+    dtypes = [np.load(p, mmap_mode='r').dtype for p in chunk_paths]
+    if any(dt.kind == 'S' for dt in dtypes):
+        def convert(arr):
+            if arr.dtype.kind == 'S':
+                return arr
+            return _encode(pd.Series(arr))
+        width = max(max(convert(np.load(p)).dtype.itemsize
+                        for p in chunk_paths), 1)
+        dtype = np.dtype('S%d' % width)
+    else:
+        def convert(arr):
+            return arr
+        dtype = np.result_type(*dtypes) if dtypes else np.dtype(float)
+
+    writer = ArrayWriter(out_path, dtype)
+    for p in chunk_paths:
+        writer.append(convert(np.load(p)))
+        os.remove(p)
+    writer.close()
+
+
+def build_table_cache(table_path, sep, out_dir=None, n_threads=1):
+    """Parses the table at `table_path` and writes its columnar cache
+    to `out_dir` (default: `<table_path>.cols`). Returns the number of
+    rows."""
+    if out_dir is None:
+        out_dir = cache_path(table_path)
+    stamp = _table_stamp(table_path, sep)
+    tmp_dir = out_dir + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.mkdir(tmp_dir)
+
+    columns, chunk_paths = None, None
+    n_rows = 0
+    reader = iter_table_chunks(table_path, sep=sep, chunk_size=READ_CHUNK_SIZE,
+                               n_threads=n_threads)
+    for k, chunk in enumerate(reader):
+        if columns is None:
+            columns = [str(c) for c in chunk.columns]
+            chunk_paths = [[] for _ in columns]
+        for i, column in enumerate(chunk.columns):
+            values = chunk[column].to_numpy()
+            if values.dtype.kind not in 'biuf':
+                values = _encode(chunk[column])
+            path = os.path.join(tmp_dir, '%d_%d.npy' % (i, k))
+            np.save(path, values)
+            chunk_paths[i].append(path)
+        n_rows += len(chunk)
+
+    if columns is None:
+        columns = read_table_columns(table_path, sep=sep)
+        chunk_paths = [[] for _ in columns]
+    for i, paths in enumerate(chunk_paths):
+        _finalize_column(paths, os.path.join(tmp_dir, '%d.npy' % i))
+    with open(os.path.join(tmp_dir, 'columns.txt'), 'w') as f:
+        f.write(''.join(c + '\n' for c in columns))
+    with open(os.path.join(tmp_dir, 'stamp.txt'), 'w') as f:
+        f.write(stamp)
+
+    if os.path.exists(out_dir):
+        shutil.rmtree(out_dir)
+    os.rename(tmp_dir, out_dir)
+    return n_rows
+
+
+def decode_column(values):
+    """Decodes the `S` arrays of text columns to `str` arrays."""
+    if values.dtype.kind != 'S':
+        return values
+    try:
+        return values.astype(str)
+    except UnicodeDecodeError:
+        return pd.Series(values).str.decode('utf-8').values
+
+
+class TableCache(object):
+    """Read-only, memory-mapped view of a columnar table cache."""
+
+    def __init__(self, cache_dir):
+        self.path = cache_dir
+        with open(os.path.join(cache_dir, 'columns.txt'), 'r') as f:
+            self.columns = f.read().split('\n')[:-1]
+        with open(os.path.join(cache_dir, 'stamp.txt'), 'r') as f:
+            self.stamp = f.read()
+        self._arrays = {}
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(self.column(self.columns[0]))
+
+    def column(self, name):
+        """Returns the memory-mapped array of a column."""
+        if name not in self._arrays:
+            if name not in self.columns:
+                raise ValueError('Column %r is not in the table (columns:'
+                                 ' %s)' % (name, ', '.join(self.columns)))
+            self._arrays[name] = np.load(
+                os.path.join(self.path, '%d.npy' % self.columns.index(name)),
+                mmap_mode='r')
+        return self._arrays[name]
+
+    def iter_chunks(self, columns, chunk_size=1 << 20):
+        """Yields DataFrames of `chunk_size` consecutive rows that
+        contain only the given columns (text decoded to `str`), like
+        `pandas.read_table(..., usecols=columns, chunksize=chunk_size)`."""
+        arrays = [(name, self.column(name)) for name in columns]
+        n_rows = len(self)
+        for start in range(0, n_rows, chunk_size):
+            stop = min(start + chunk_size, n_rows)
+            data = {}
+            for name, arr in arrays:
+                data[name] = decode_column(np.asarray(arr[start:stop]))
+            yield pd.DataFrame(data, index=pd.RangeIndex(start, stop))
+
+
+def load_table_cache(table_path, sep):
+    """Returns the `TableCache` of `table_path`, or None if there is no
+    cache or if it is out of date."""
+    path = cache_path(table_path)
+    if not os.path.isfile(os.path.join(path, 'stamp.txt')):
+        return None
+    cache = TableCache(path)
+    if cache.stamp != _table_stamp(table_path, sep):
+        return None
+    return cache
@@ -0,0 +1,311 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Chunked readers for molecule property tables and ROCS reports.
+
+Tables are read as DataFrames of consecutive rows that contain only the
+requested columns. Besides delimited text files (for example, TSV
+tables or ROCS `.rpt` reports), Parquet (`.parquet`, `.pq`) and
+Feather/Arrow IPC (`.feather`, `.arrow`) files are supported.
+
+The columnar formats, and reading text tables in multiple threads,
+require the optional `pyarrow` package. Parquet row groups are skipped
+without reading them if their column statistics rule out all rows
+(see `selection_bounds`).
+"""
+
+import ast
+import re
+
+import pandas as pd
+
+
+READ_CHUNK_SIZE = 100000
+BLOCK_SIZE = 1 << 24
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+FEATHER_SUFFIXES = ('.feather', '.arrow')
+
+_COMPARISONS = {ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=',
+                ast.Eq: '=='}
+_FLIPPED = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '=='}
+_CSV_COLUMN_ERROR = re.compile(r'In CSV column #(\d+)')
+
+
+def table_format(path):
+    """Returns `'parquet'`, `'feather'`, or `'text'` based on the file
+    name suffix."""
+    lower = path.lower()
+    if lower.endswith(PARQUET_SUFFIXES):
+        return 'parquet'
+    if lower.endswith(FEATHER_SUFFIXES):
+        return 'feather'
+    return 'text'
+
+
+def _import_pyarrow(path):
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError('Reading %s requires the pyarrow package'
+                          ' (pip install pyarrow).' % path)
+    return pyarrow
+
+
+def selection_bounds(expression):
+    """Returns the comparisons `(column, op, value)` of a selection
+    string such as `"(NRB <= 7) & (MWT > 200)"` that every selected
+    row must satisfy, that is, the comparisons of a column with a
+    constant that are combined with `&` (or `and`) at the top level.
+    `op` is one of `'<'`, `'<='`, `'>'`, `'>='`, and `'=='`. Other
+    parts of the expression are ignored, so the bounds are necessary
+    but not sufficient conditions."""
+    try:
+        node = ast.parse(expression.strip(), mode='eval').body
+    except SyntaxError:
+        return []
+    bounds = []
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd):
+            stack.extend((node.right, node.left))
+            continue
+        if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.And):
+            stack.extend(reversed(node.values))
+            continue
+        if not isinstance(node, ast.Compare) or len(node.ops) != 1:
+            continue
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+        if type(op) not in _COMPARISONS:
+            continue
+        op = _COMPARISONS[type(op)]
+        if isinstance(right, ast.Name):
+            left, op, right = right, _FLIPPED[op], left
+        if not isinstance(left, ast.Name):
+            continue
+        try:
+            value = ast.literal_eval(right)
+        except ValueError:
+            continue
+        bounds.append((left.id, op, value))
+    return bounds
+
+
+def _may_match(bounds, stats):
+    """Returns False if the `(min, max)` statistics of a row group rule
+    out every row for at least one of the bounds."""
+    for column, op, value in bounds:
+        if column not in stats:
+            continue
+        low, high = stats[column]
+        try:
+            if op in ('<', '<='):
+                ok = low < value if op == '<' else low <= value
+            elif op in ('>', '>='):
+                ok = high > value if op == '>' else high >= value
+            else:
+                ok = low <= value <= high
+        except TypeError:
+            continue
+        if not ok:
+            return False
+    return True
+
+
+def _row_group_stats(metadata, i):
+    row_group = metadata.row_group(i)
+    stats = {}
+    for j in range(row_group.num_columns):
+        column = row_group.column(j)
+        s = column.statistics
+        if s is None or not s.has_min_max:
+            continue
+        stats[column.path_in_schema] = (s.min, s.max)
+    return stats
+
+
+def iter_table_chunks(path, columns=None, sep='\t',
+                      chunk_size=READ_CHUNK_SIZE, n_threads=1, bounds=None):
+    """Yields DataFrames of up to `chunk_size` consecutive rows of a
+    table, like `pandas.read_table(path, usecols=columns, sep=sep,
+    chunksize=chunk_size)`.
+
+    Parameters
+    -----------
+    path : str
+      Path to a delimited text file, or to a Parquet or Feather file
+      (see `table_format`).
+
+    columns : list or None (default: None)
+      Names of the columns to read; all columns if None.
+
+    sep : str (default: `'\\t'`)
+      Column separator of text files.
+
+    n_threads : int (default: 1)
+      If greater than 1, uses `pyarrow` with this number of threads for
+      reading. Text files with a single-character separator are then
+      parsed in parallel blocks.
+
+    bounds : list or None (default: None)
+      A list of alternative lists of `(column, op, value)` comparisons
+      as returned by `selection_bounds`. Parquet row groups are skipped
+      if their statistics rule out each of the alternatives. All rows
+      are read if None or if one of the alternatives is empty.
+
+    """
+    fmt = table_format(path)
+    if fmt == 'text' and (n_threads <= 1 or len(sep) != 1):
+        reader = pd.read_table(path, chunksize=chunk_size, usecols=columns,
+                               sep=sep)
+        for chunk in reader:
+            yield chunk
+        return
+
+    pyarrow = _import_pyarrow(path)
+    use_threads = n_threads > 1
+    if use_threads:
+        pyarrow.set_cpu_count(n_threads)
+
+    if fmt == 'parquet':
+        batches = _iter_parquet(pyarrow, path, columns, chunk_size,
+                                use_threads, bounds)
+    elif fmt == 'feather':
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(path, columns=columns,
+                                           memory_map=True,
+                                           use_threads=use_threads)
+        batches = table.to_batches(max_chunksize=chunk_size)
+    else:
+        batches = _iter_csv(pyarrow, path, columns, sep)
+
+    for batch in batches:
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def _iter_csv(pyarrow, path, columns, sep):
+    """Streams a text table in blocks that are parsed in parallel.
+
+    Column types are inferred from the first block. If a later block
+    does not fit, the column is widened (integers to float64, other
+    types to string), and reading resumes after the rows that were
+    already yielded, so that earlier batches keep their types (like
+    the chunks of `pandas.read_table`).
+    """
+    import pyarrow.csv
+    column_types = {}
+    names = None
+    n_rows = 0
+    while True:
+        reader = None
+        try:
+            # the first block is already converted when opening
+            reader = pyarrow.csv.open_csv(
+                path,
+                read_options=pyarrow.csv.ReadOptions(
+                    use_threads=True, block_size=BLOCK_SIZE,
+                    skip_rows_after_names=n_rows),
+                parse_options=pyarrow.csv.ParseOptions(delimiter=sep),
+                convert_options=pyarrow.csv.ConvertOptions(
+                    include_columns=columns, column_types=column_types))
+            for batch in reader:
+                n_rows += batch.num_rows
+                yield batch
+            return
+        except pyarrow.ArrowInvalid as e:
+            match = _CSV_COLUMN_ERROR.search(str(e))
+            if match is None:
+                raise
+            if names is None:
+                names = read_table_columns(path, sep=sep)
+            name = names[int(match.group(1))]
+            if name in column_types:
+                current = column_types[name]
+            elif reader is not None:
+                current = reader.schema.field(name).type
+            else:
+                raise
+            if pyarrow.types.is_integer(current):
+                widened = pyarrow.float64()
+            elif current != pyarrow.string():
+                widened = pyarrow.string()
+            else:
+                raise
+            column_types[name] = widened
+
+
+def _iter_parquet(pyarrow, path, columns, chunk_size, use_threads, bounds):
+    import pyarrow.parquet
+    parquet_file = pyarrow.parquet.ParquetFile(path, memory_map=True)
+    metadata = parquet_file.metadata
+    row_groups = list(range(metadata.num_row_groups))
+    if bounds and all(bounds):
+        row_groups = [i for i in row_groups
+                      if any(_may_match(b, _row_group_stats(metadata, i))
+                             for b in bounds)]
+    if not row_groups:
+        return
+    for batch in parquet_file.iter_batches(batch_size=chunk_size,
+                                           row_groups=row_groups,
+                                           columns=columns,
+                                           use_threads=use_threads):
+        yield batch
+
+
+def read_table_columns(path, sep='\t'):
+    """Returns the column names of a table without reading its rows."""
+    fmt = table_format(path)
+    if fmt == 'text':
+        return [str(c) for c in pd.read_table(path, sep=sep, nrows=0).columns]
+    pyarrow = _import_pyarrow(path)
+    if fmt == 'parquet':
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(path).names
+    import pyarrow.feather
+    return pyarrow.feather.read_table(path, memory_map=True).column_names
+
+
+def read_table(path, columns=None, sep='\t', n_threads=1):
+    """Reads a complete table (see `iter_table_chunks`) into a single
+    DataFrame."""
+    if table_format(path) == 'text' and (n_threads <= 1 or len(sep) != 1):
+        return pd.read_table(path, usecols=columns, sep=sep)
+    chunks = list(iter_table_chunks(path, columns=columns, sep=sep,
+                                    n_threads=n_threads))
+    if not chunks:
+        if columns is None:
+            columns = read_table_columns(path, sep=sep)
+        return pd.DataFrame(columns=columns)
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,216 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+"""
+Atom type fingerprint sidecars (`.mol2.types`) for multi-MOL2 files.
+
+For every molecule in a MOL2 file, the sidecar stores its ID and a
+bitmask of the atom types that occur in it, where bit j refers to the
+j-th entry of the sidecar's atom type table (the SYBYL atom types of
+`_mol2_store.SYBYL_ATOM_TYPES`, followed by any other types found in
+the file). Whether a molecule contains an atom that matches a
+selection which only refers to `atom_type` can then be decided with
+bitwise operations, without reading the MOL2 file.
+
+Binary layout (little-endian):
+
+    header        : magic, version, n_records, n_words, source size,
+                    source mtime, size of the type table
+    types         : newline-separated atom type names
+    fingerprints  : n_records x n_words uint64
+    ids           : newline-separated molecule IDs
+"""
+
+import os
+import struct
+from array import array
+
+import numpy as np
+
+from _mol2_parser import AtomArrays
+from _mol2_parser import atom_block
+from _mol2_parser import atom_block_tokens
+from _mol2_reader import iter_mol2_records
+from _mol2_store import SYBYL_ATOM_TYPES
+
+
+TYPES_SUFFIX = '.types'
+TYPES_MAGIC = b'SLTYPEFP'
+TYPES_VERSION = 1
+
+_HEADER = struct.Struct('<8sIQIQqI')
+_WORD_MASK = (1 << 64) - 1
+
+
+def type_index_path(mol2_path):
+    return mol2_path + TYPES_SUFFIX
+
+
+def _source_stamp(mol2_path):
+    stat = os.stat(mol2_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def record_atom_types(record):
+    """Returns the set of atom types (bytes) in a MOL2 record."""
+    block = atom_block(record)
+    tokens, _ = atom_block_tokens(block)
+    if tokens is not None:
+        return set(tokens[5::10])
+    return {fields[5] for fields in map(bytes.split, block.split(b'\n'))
+            if len(fields) > 5}
+
+
+def sets_contain_any(type_sets, selection):
+    """Returns a boolean array indicating which of the atom type sets
+    (see `record_atom_types`) contain at least one atom type that
+    matches the atom-type-only `selection`.
+
+    The selection is evaluated once per distinct atom type.
+    """
+    types = sorted(set().union(*type_sets))
+    atoms = AtomArrays({'atom_type': np.arange(len(types)),
+                        'atom_type_names': [t.decode('utf-8')
+                                            for t in types]})
+    matching = {t for t, m in zip(types, selection(atoms).tolist()) if m}
+    return np.array([not matching.isdisjoint(type_set)
+                     for type_set in type_sets], dtype=bool)
+
+
+def build_type_index(mol2_path, out_path=None):
+    """Scans `mol2_path` and writes its `.types` sidecar.
+
+    Returns the number of indexed molecules.
+    """
+    if out_path is None:
+        out_path = type_index_path(mol2_path)
+
+    bits = {t.encode('utf-8'): 1 << i for i, t in enumerate(SYBYL_ATOM_TYPES)}
+    # one array of 64-bit words per 64 atom types
+    words = [array('Q') for _ in range(-(-len(bits) // 64))]
+    ids = []
+    for mol2_id, record in iter_mol2_records(mol2_path):
+        fingerprint = 0
+        for atom_type in record_atom_types(record):
+            bit = bits.get(atom_type)
+            if bit is None:
+                bit = bits[atom_type] = 1 << len(bits)
+                if len(bits) > 64 * len(words):
+                    words.append(array('Q', bytes(8 * len(ids))))
+            fingerprint |= bit
+        for w, column in enumerate(words):
+            column.append((fingerprint >> (64 * w)) & _WORD_MASK)
+        ids.append(mol2_id)
+
+    types = sorted(bits, key=bits.get)
+    words = np.column_stack([np.frombuffer(column, dtype=np.uint64)
+                             for column in words]).astype('<u8')
+
+    type_table = b'\n'.join(types)
+    size, mtime = _source_stamp(mol2_path)
+    with open(out_path, 'wb') as f:
+        f.write(_HEADER.pack(TYPES_MAGIC, TYPES_VERSION, len(ids),
+                             words.shape[1], size, mtime, len(type_table)))
+        f.write(type_table)
+        f.write(words.tobytes())
+        f.write(b'\n'.join(ids))
+    return len(ids)
+
+
+class TypeIndex(object):
+    """In-memory view of a `.mol2.types` sidecar.
+
+    Attributes
+    -----------
+    fingerprints : numpy.ndarray
+      uint64 array of shape `(n_molecules, n_words)`; row i is the atom
+      type bitmask of molecule ordinal i.
+
+    atom_types : numpy.ndarray
+      Atom type names (object array) of the fingerprint bits.
+
+    ids : list
+      Molecule IDs (bytes) in file order.
+
+    """
+
+    def __init__(self, fingerprints, atom_types, ids, source_stamp=None):
+        self.fingerprints = fingerprints
+        self.atom_types = atom_types
+        self.ids = ids
+        self.source_stamp = source_stamp
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            magic, version, n, n_words, size, mtime, table_size = (
+                _HEADER.unpack(f.read(_HEADER.size)))
+            if magic != TYPES_MAGIC or version != TYPES_VERSION:
+                raise ValueError('%s is not a screenlamp atom type index' %
+                                 path)
+            types = f.read(table_size).decode('utf-8').split('\n')
+            fingerprints = np.frombuffer(f.read(n * n_words * 8),
+                                         dtype='<u8').reshape(n, n_words)
+            ids = f.read().split(b'\n') if n else []
+        return cls(fingerprints, np.array(types, dtype=object), ids,
+                   source_stamp=(size, mtime))
+
+    def type_mask(self, selection):
+        """Returns the fingerprint bitmask (uint64 words) of the atom
+        types that match an atom-type-only `_atom_selection.AtomSelection`."""
+        atoms = AtomArrays({'atom_type': np.arange(len(self.atom_types)),
+                            'atom_type_names': self.atom_types})
+        matching = np.zeros(self.fingerprints.shape[1] * 64, dtype=bool)
+        matching[:len(self.atom_types)] = selection(atoms)
+        return np.packbits(matching, bitorder='little').view('<u8')
+
+    def contains_any(self, selection):
+        """Returns a boolean array indicating which molecules contain
+        at least one atom that matches the atom-type-only `selection`."""
+        mask = self.type_mask(selection)
+        return ((self.fingerprints & mask) != 0).any(axis=1)
+
+
+def load_type_index(mol2_path):
+    """Returns the `TypeIndex` of `mol2_path`, or None if there is no
+    sidecar or if it is out of date."""
+    path = type_index_path(mol2_path)
+    if not os.path.isfile(path):
+        return None
+    index = TypeIndex.read(path)
+    if index.source_stamp != _source_stamp(mol2_path):
+        return None
+    return index
@@ -0,0 +1,144 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+
+import argparse
+import sys
+import time
+
+from _id_merge import OPERATIONS
+from _id_merge import RUN_SIZE
+from _id_merge import combine_idfiles
+from _selection import combine_selections
+from _selection import is_selection_file
+from _selection import is_selection_path
+from _selection import read_selection
+
+
+def main(input_paths, output_path, operation, chunk_size, tmpdir, verbose):
+
+    if verbose:
+        start = time.time()
+        sys.stdout.write('Computing the %s of %d ID files'
+                         % (operation, len(input_paths)))
+        sys.stdout.flush()
+
+    is_selection = [is_selection_file(path) for path in input_paths]
+    if any(is_selection):
+        if not all(is_selection) or not is_selection_path(output_path):
+            raise ValueError('Selection (`.sel`) files can only be combined'
+                             ' with other selection files into a `.sel`'
+                             ' output file.')
+        selection = combine_selections(
+            [read_selection(path) for path in input_paths], operation)
+        selection.write(output_path)
+        n_ids = selection.count()
+    else:
+        n_ids = combine_idfiles(input_paths, output_path, operation,
+                                run_size=chunk_size, tmpdir=tmpdir)
+
+    if verbose:
+        elapsed = time.time() - start
+        sys.stdout.write(' | wrote %d IDs | %.1f sec\n' % (n_ids, elapsed))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description="""Combines any number of molecule ID files
+(e.g., created via `datatable_to_id.py`, `funcgroup_presence_to_id.py`
+ or `mol2_to_id.py`) via a set operation and writes the resulting,
+ duplicate-free IDs in sorted order. The ID files are sorted and merged
+ externally with temporary files, so the inputs can be larger than
+ the available memory. Selection files (`.sel`) of the same MOL2
+ library are combined bitwise into a `.sel` output file.""",
+            epilog="""Example:
+python combine_id_files.py\\
+   --input mol2s_1.txt mol2s_2.txt mol2s_3.txt\\
+   --operation intersection\\
+   --output common.txt""",
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-i', '--input',
+                        type=str,
+                        nargs='+',
+                        required=True,
+                        help='(Required.) Input ID files that contain'
+                             ' molecule\nIDs (one ID per line).')
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=True,
+                        help='(Required.) Path to the output ID file.')
+    parser.add_argument('--operation',
+                        type=str,
+                        choices=OPERATIONS,
+                        default='union',
+                        help='(Optional, default: `union`.) Set operation:'
+                             '\n`union`: IDs in any input file'
+                             '\n`intersection`: IDs in all input files'
+                             '\n`difference`: IDs in the first input file'
+                             ' but in none of the others'
+                             '\n`symdiff`: IDs in an odd number of input'
+                             ' files (for two files,'
+                             '\nthe IDs in exactly one of them)')
+    parser.add_argument('--chunk_size',
+                        type=int,
+                        default=RUN_SIZE,
+                        help='(Optional, default: `%d`.) Maximum number of'
+                             ' IDs that are'
+                             '\nsorted in memory before being written to a'
+                             ' temporary file.' % RUN_SIZE)
+    parser.add_argument('--tmpdir',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: system temp. directory.)'
+                             ' Directory for'
+                             '\nthe temporary files.')
+    parser.add_argument('-v', '--verbose',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Verbosity level. If 0,'
+                             ' does not print any output.'
+                             '\nIf 1 (default), prints the number of'
+                             ' written IDs.')
+
+    parser.add_argument('--version', action='version', version='v. 1.0')
+
+    args = parser.parse_args()
+
+    main(input_paths=args.input,
+         output_path=args.output,
+         operation=args.operation,
+         chunk_size=args.chunk_size,
+         tmpdir=args.tmpdir,
+         verbose=args.verbose)
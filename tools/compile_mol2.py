@@ -0,0 +1,97 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+import argparse
+import sys
+import time
+
+from _mol2_files import get_mol2_files
+from _mol2_store import compile_store
+
+
+def main(input_dir, output_dir, verbose):
+    mol2_files = sorted(get_mol2_files(dir_path=input_dir))
+
+    if verbose:
+        start = time.time()
+        sys.stdout.write('Compiling %d MOL2 file(s)' % len(mol2_files))
+        sys.stdout.flush()
+
+    n_molecules = compile_store(mol2_files=mol2_files, store_dir=output_dir)
+
+    if verbose:
+        elapsed = time.time() - start
+        sys.stdout.write(' | compiled %d molecules | %d mol/sec\n' %
+                         (n_molecules, n_molecules / elapsed))
+        print('Finished')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description='Compiles MOL2 files into a columnar molecule store'
+                        '\n(a directory of memory-mappable `.npy` arrays'
+                        '\nholding atom coordinates, SYBYL atom types,'
+                        '\ncharges, and molecule IDs). The store can be'
+                        '\nused as `--input` for `funcgroup_presence_to_id.py`,'
+                        '\n`funcgroup_distance_to_id.py`, and'
+                        ' `funcgroup_matching.py`'
+                        '\nto skip MOL2 parsing in repeated screening runs.',
+            epilog="""Example:
+python compile_mol2.py --input mol2_dir/\\
+   --output mol2_store/""",
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-i', '--input',
+                        type=str,
+                        required=True,
+                        help='(Required.) Input `.mol2` or `.mol2.gz` file,'
+                             '\nor a directory of MOL2 files.')
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=True,
+                        help='(Required.) Output directory for the'
+                             ' molecule store.')
+    parser.add_argument('-v', '--verbose',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Verbosity level. If 0, does not print any'
+                             '\noutput.'
+                             '\nIf 1 (default), prints the progress.')
+
+    parser.add_argument('--version', action='version', version='v. 1.0')
+
+    args = parser.parse_args()
+
+    main(input_dir=args.input,
+         output_dir=args.output,
+         verbose=args.verbose)
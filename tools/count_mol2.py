@@ -37,6 +37,8 @@ import sys
 import os
 import gzip
 
+from _mol2_files import scan_mol2_files
+
 
 def mol_count_python(input_file, zipped):
 
@@ -72,19 +74,21 @@ def mol_count_shell(input_file, zipped):
 def count_in_dir(path, windows):
 
     total = 0
-    for f in os.listdir(path):
-        if f.endswith(('.mol2', 'mol2.gz')):
-            file_path = os.path.join(path, f)
-            zipped = f.endswith('.mol2.gz')
-
-            if windows:
-                cnt = mol_count_python(file_path, zipped)
-            else:
-                cnt = mol_count_shell(file_path, zipped)
-
-            sys.stdout.write('%s : %d\n' % (f, cnt))
-            sys.stdout.flush()
-            total += cnt
+    for mol2_file in scan_mol2_files(path):
+        file_path = mol2_file.path
+        zipped = file_path.endswith('.mol2.gz')
+
+        if mol2_file.n_molecules is not None:
+            cnt = mol2_file.n_molecules
+        elif windows:
+            cnt = mol_count_python(file_path, zipped)
+        else:
+            cnt = mol_count_shell(file_path, zipped)
+
+        sys.stdout.write('%s : %d\n' % (os.path.relpath(file_path, path),
+                                         cnt))
+        sys.stdout.flush()
+        total += cnt
     return total
 
 
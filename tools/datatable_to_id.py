@@ -31,77 +31,372 @@
 
 
 import argparse
+import ast
 import sys
 import os
+import numpy as np
 import pandas as pd
 import time
+from contextlib import ExitStack
+from functools import reduce
+from multiprocessing import cpu_count
+from _table_cache import build_table_cache
+from _table_cache import cache_path
+from _table_cache import load_table_cache
+from _table_cache import TableCache
+from _table_reader import iter_table_chunks
+from _table_reader import selection_bounds
+from _id_set import IdSet
+from _mol2_files import get_mol2_files
+from _mol2_filter import filter_and_write
+from _mol2_filter import filter_and_write_parallel
+from _named_selection import split_selection_name
 
 
-def read_and_write(source, target, selection,
-                   columns, id_column, sep, verbose):
+CACHE_CHUNK_SIZE = 1 << 20
 
-    if verbose:
-        counter = 0
-        sys.stdout.write('Using columns: %s\n' % columns)
-        sys.stdout.write('Using selection: %s\n' % selection)
-        sys.stdout.flush()
 
-    reader = pd.read_table(source, chunksize=100000, usecols=columns, sep=sep)
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
 
-    with open(target, 'w') as f:
+def get_num_cpus(n_cpus):
+    if not n_cpus:
+        n_cpus = cpu_count()
+    elif n_cpus < 0:
+        n_cpus = cpu_count() - n_cpus
+    return n_cpus
+
+
+def get_table_cache(source, sep, verbose, n_threads=1):
+    cache = load_table_cache(source, sep)
+    if cache is None:
         if verbose:
+            sys.stdout.write('Building column cache %s' % cache_path(source))
+            sys.stdout.flush()
             start = time.time()
-        for chunk in reader:
+        n_rows = build_table_cache(source, sep, n_threads=n_threads)
+        cache = TableCache(cache_path(source))
+        if verbose:
+            elapsed = time.time() - start
+            sys.stdout.write(' | %d rows | %d rows/sec\n' %
+                             (n_rows, n_rows / elapsed))
+            sys.stdout.flush()
+    return cache
+
+
+def evaluate_selection(code, chunk):
+    """Evaluates a compiled selection on a chunk and returns a boolean
+    mask; selects all rows if `code` is None."""
+    if code is None:
+        return np.ones(len(chunk), dtype=bool)
+    return np.asarray(eval(code, {'__builtins__': {}}, {'chunk': chunk}),
+                      dtype=bool)
+
+
+def print_selected(names, n_selected):
+    if len(names) == 1:
+        sys.stdout.write('\nSelected: %d\n' % n_selected[0])
+    else:
+        sys.stdout.write('\n')
+        for name, n in zip(names, n_selected):
+            sys.stdout.write('Selected (%s): %d\n' % (name, n))
+    sys.stdout.flush()
+
+
+def iter_selected(source, selections, columns, id_column, sep, verbose,
+                  use_cache=False, n_threads=1, bounds=None):
+    """Reads the table only once and yields, for each chunk, a list with
+    the selected IDs of each of the compiled `selections` as
+    `(ids, n_selected)`, where `ids` are newline-terminated bytes.
+    `bounds` are passed to `_table_reader.iter_table_chunks`."""
+    if use_cache:
+        chunks = iter_selected_cache(
+            cache=get_table_cache(source, sep, verbose, n_threads=n_threads),
+            selections=selections,
+            columns=columns,
+            id_column=id_column)
+    else:
+        chunks = iter_selected_table(source=source,
+                                     selections=selections,
+                                     columns=columns,
+                                     id_column=id_column,
+                                     sep=sep,
+                                     n_threads=n_threads,
+                                     bounds=bounds)
+
+    if verbose:
+        counter = 0
+        start = time.time()
+    for n_rows, selected in chunks:
+        yield selected
+        if verbose:
+            counter += n_rows
+            elapsed = time.time() - start
+            sys.stdout.write('\rProcessed %d rows | %d rows/sec' %
+                             (counter, counter / elapsed))
+            sys.stdout.flush()
+
+
+def iter_selected_table(source, selections, columns, id_column, sep,
+                        n_threads=1, bounds=None):
+    reader = iter_table_chunks(source, columns=columns, sep=sep,
+                               n_threads=n_threads, bounds=bounds)
+    for chunk in reader:
+        selected = []
+        for code in selections:
+            mask = evaluate_selection(code, chunk)
+            ids = chunk.loc[mask, [id_column]].to_csv(header=None, index=None)
+            selected.append((ids.encode('utf-8'), int(mask.sum())))
+        yield chunk.shape[0], selected
+
+
+def iter_selected_cache(cache, selections, columns, id_column):
+    ids = cache.column(id_column)
+    # the ID column is only decoded if a selection refers to it
+    sele_columns = [c for c in columns if c != id_column]
+    if any(code is not None and id_column in code.co_names
+           for code in selections):
+        sele_columns.append(id_column)
 
-            if selection is not None:
-                mask = pd.eval(selection)
+    for chunk in cache.iter_chunks(sele_columns,
+                                   chunk_size=CACHE_CHUNK_SIZE):
+        selected = []
+        for code in selections:
+            rows = chunk.index.values[evaluate_selection(code, chunk)]
+            chunk_ids = ids[rows]
+            if chunk_ids.dtype.kind == 'S':
+                chunk_ids = b''.join(mol2_id + b'\n'
+                                     for mol2_id in chunk_ids.tolist())
             else:
-                mask = chunk.index
-            chunk.loc[mask, [id_column]].to_csv(f,
-                                                header=None,
-                                                index=None)
-            if verbose:
-                counter += chunk.shape[0]
-
-                elapsed = time.time() - start
-                sys.stdout.write('\rProcessed %d rows | %d rows/sec' %
-                                 (counter, counter / elapsed))
-                sys.stderr.flush()
+                chunk_ids = pd.Series(chunk_ids).to_csv(
+                    header=None, index=None).encode('utf-8')
+            selected.append((chunk_ids, len(rows)))
+        yield len(chunk), selected
+
+
+def read_and_write(source, targets, selections, names, selection_strings,
+                   columns, id_column, sep, verbose, use_cache=False,
+                   n_threads=1, bounds=None):
+    """Writes the IDs of the rows matching each of the compiled
+    `selections` to the corresponding path in `targets`, reading the
+    table only once."""
+
+    if verbose:
+        print_selection(columns, selection_strings)
+
+    n_selected = [0] * len(targets)
+    with ExitStack() as stack:
+        files = [stack.enter_context(open(t, 'wb')) for t in targets]
+        for selected in iter_selected(source=source,
+                                      selections=selections,
+                                      columns=columns,
+                                      id_column=id_column,
+                                      sep=sep,
+                                      verbose=verbose,
+                                      use_cache=use_cache,
+                                      n_threads=n_threads,
+                                      bounds=bounds):
+            for i, (f, (ids, n)) in enumerate(zip(files, selected)):
+                f.write(ids)
+                n_selected[i] += n
+
+    if verbose:
+        print_selected(names, n_selected)
+
+
+def read_and_extract(source, target, selection, selection_string, columns,
+                     id_column, sep, verbose, mol2_input, mol2_output,
+                     use_cache=False, n_cpus=1, n_threads=1, bounds=None):
+    """Streams the IDs of the rows matching the compiled `selection`
+    into an in-memory ID set and writes the matching molecules of the
+    MOL2 files in `mol2_input` to `mol2_output`. The IDs are
+    additionally written to `target` unless it is None."""
+
+    if verbose:
+        print_selection(columns, [selection_string])
+
+    n_selected = [0]
+    with ExitStack() as stack:
+        f = None if target is None else stack.enter_context(open(target, 'wb'))
+
+        def blocks():
+            for ((ids, n),) in iter_selected(source=source,
+                                             selections=[selection],
+                                             columns=columns,
+                                             id_column=id_column,
+                                             sep=sep,
+                                             verbose=verbose,
+                                             use_cache=use_cache,
+                                             n_threads=n_threads,
+                                             bounds=bounds):
+                if f is not None:
+                    f.write(ids)
+                n_selected[0] += n
+                yield ids
+
+        ids = IdSet.from_blocks(blocks())
 
     if verbose:
-        n_lines = sum(1 for line in open(target, 'r'))
-        sys.stdout.write('\nSelected: %d\n' % n_lines)
+        print_selected([selection_string], n_selected)
+
+    n_cpus = get_num_cpus(n_cpus)
+    mol2_files = get_mol2_files(dir_path=mol2_input)
+    if n_cpus > 1:
+        n_written = filter_and_write_parallel(mol2_files=mol2_files,
+                                              ids=ids,
+                                              output_dir=mol2_output,
+                                              includelist_filter=True,
+                                              verbose=verbose,
+                                              n_cpus=n_cpus)
+    else:
+        n_written = filter_and_write(mol2_files=mol2_files,
+                                     ids=ids,
+                                     output_dir=mol2_output,
+                                     includelist_filter=True,
+                                     verbose=verbose)
+
+    if verbose:
+        sys.stdout.write('Extracted molecules: %d\n' % n_written)
         sys.stdout.flush()
 
 
+def print_selection(columns, selection_strings):
+    sys.stdout.write('Using columns: %s\n' % columns)
+    for sele in selection_strings:
+        sys.stdout.write('Using selection: %s\n' % sele)
+    sys.stdout.flush()
+
+
 def parse_selection_string(s, df_name='chunk'):
     return s.replace('(', '(%s.' % df_name)
 
 
+class _ElementwiseOperators(ast.NodeTransformer):
+    """Rewrites `and`, `or`, `not`, and chained comparisons into the
+    element-wise `&`, `|`, and `~` operators, as in `pd.eval`."""
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        op = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        return reduce(lambda left, right: ast.BinOp(left, op, right),
+                      node.values)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return ast.UnaryOp(ast.Invert(), node.operand)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        terms = [node.left] + node.comparators
+        return reduce(lambda left, right: ast.BinOp(left, ast.BitAnd(),
+                                                    right),
+                      [ast.Compare(terms[i], [op], [terms[i + 1]])
+                       for i, op in enumerate(node.ops)])
+
+
+def compile_selection(s, df_name='chunk'):
+    """Compiles a selection string for `evaluate_selection`."""
+    tree = ast.parse(parse_selection_string(s, df_name=df_name).strip(),
+                     mode='eval')
+    tree = ast.fix_missing_locations(_ElementwiseOperators().visit(tree))
+    return compile(tree, '<selection>', 'eval')
+
+
 def columns_from_selection(s):
     return [c.replace('(', '') for c in s.split() if '(' in c]
 
 
-def main(input_dir, output_file, verbose, selection, id_column):
+def main(input_dir, output_file, verbose, selection, id_column,
+         separator='\t', use_cache=False, mol2_input=None, mol2_output=None,
+         n_cpus=1, n_threads=1):
 
-    columns = [id_column]
     if selection is None:
-        parsed_sele = None
+        selection = [None]
+    elif isinstance(selection, str):
+        selection = [selection]
+
+    names, targets, codes, bounds = [], [], [], []
+    columns = [id_column]
+    for s in selection:
+        name, expression = (None, None) if s is None else (
+            split_selection_name(s))
+        names.append(name)
+        if expression is None:
+            codes.append(None)
+            bounds.append([])
+            continue
+        bounds.append(selection_bounds(expression))
+        codes.append(compile_selection(expression, df_name='chunk'))
+        columns += [c for c in columns_from_selection(expression)
+                    if c not in columns]
+
+    if mol2_input is not None:
+        if len(selection) > 1:
+            raise ValueError('Extracting MOL2 files requires a single'
+                             ' selection.')
+        if output_file is not None:
+            dirpath = os.path.dirname(output_file)
+            if dirpath and not os.path.exists(dirpath):
+                os.mkdir(dirpath)
+        read_and_extract(source=input_dir,
+                         target=output_file,
+                         selection=codes[0],
+                         selection_string=selection[0],
+                         columns=columns,
+                         id_column=id_column,
+                         sep=separator,
+                         verbose=verbose,
+                         mol2_input=mol2_input,
+                         mol2_output=mol2_output,
+                         use_cache=use_cache,
+                         n_cpus=n_cpus,
+                         n_threads=n_threads,
+                         bounds=bounds)
+        return
+
+    if output_file is None:
+        raise ValueError('An output path is required unless MOL2 files'
+                         ' are extracted.')
+
+    if len(selection) == 1 and names[0] is None:
+        dirpath = os.path.dirname(output_file)
+        targets = [output_file]
+        names = [selection[0]]
     else:
-        parsed_sele = parse_selection_string(selection, df_name='chunk')
-        columns += columns_from_selection(selection)
+        if None in names:
+            raise ValueError('Multiple selections must be named, for'
+                             ' example, "strict=(NRB <= 5)".')
+        if len(set(names)) != len(names):
+            raise ValueError('Selection names must be unique.')
+        dirpath = output_file
+        targets = [os.path.join(output_file, '%s.txt' % name)
+                   for name in names]
 
-    dirpath = os.path.dirname(output_file)
-    if not os.path.exists(dirpath):
+    if dirpath and not os.path.exists(dirpath):
         os.mkdir(dirpath)
 
-    read_and_write(source=args.input,
-                   target=args.output,
-                   selection=parsed_sele,
+    read_and_write(source=input_dir,
+                   targets=targets,
+                   selections=codes,
+                   names=names,
+                   selection_strings=selection,
                    columns=columns,
                    id_column=id_column,
-                   sep=args.separator,
-                   verbose=args.verbose)
+                   sep=separator,
+                   verbose=verbose,
+                   use_cache=use_cache,
+                   n_threads=n_threads,
+                   bounds=bounds)
 
 
 if __name__ == '__main__':
@@ -113,7 +408,21 @@ python datatable_to_id.py\\
   --input table.txt\\
   --output ids.txt\\
   --id_column ZINC_ID\\
-  --selection "(NRB <= 7) & (MWT > 200)" """,
+  --selection "(NRB <= 7) & (MWT > 200)"
+
+python datatable_to_id.py\\
+  --input table.txt\\
+  --output id_dir/\\
+  --id_column ZINC_ID\\
+  --selection "strict=(NRB <= 5) & (MWT > 250)"\\
+  --selection "loose=(NRB <= 9) & (MWT > 150)"
+
+python datatable_to_id.py\\
+  --input table.txt\\
+  --id_column ZINC_ID\\
+  --selection "(NRB <= 7) & (MWT > 200)"\\
+  --mol2_input mol2_dir/\\
+  --mol2_output filtered_mol2_dir/ """,
             formatter_class=argparse.RawTextHelpFormatter)
 
     parser.add_argument('-i', '--input',
@@ -121,11 +430,16 @@ python datatable_to_id.py\\
                         required=True,
                         help='(Required.) Path to a datatable file where each'
                              '\nrow represents a molecule and each columns'
-                             '\nstore the molecular features.')
+                             '\nstore the molecular features.'
+                             '\nParquet (`.parquet`, `.pq`) and Feather'
+                             '\n(`.feather`, `.arrow`) files are read'
+                             '\nwith the optional `pyarrow` package;'
+                             '\nall other files as delimited text.')
     parser.add_argument('-o', '--output',
                         type=str,
-                        required=True,
-                        help='(Required.) Output path for the ID file'
+                        default=None,
+                        help='(Required unless `--mol2_input` is given.)'
+                             '\nOutput path for the ID file'
                              ' (for example, `ids.txt`).')
     parser.add_argument('--id_column',
                         type=str,
@@ -138,11 +452,61 @@ python datatable_to_id.py\\
                               'Assumes tab-separated values by default.'))
     parser.add_argument('-s', '--selection',
                         type=str,
+                        action='append',
                         default=None,
                         help='(Optional, default: `None`.) A conditional selection string:\n'
                         ' Single column selection example: `"(MWT > 500)"`. '
                         ' Logical OR example: `"(MWT > 500) | (MWT < 200)"`.'
-                        ' Logical AND example: `"(NRB <= 7) & (MWT > 200)"`.')
+                        ' Logical AND example: `"(NRB <= 7) & (MWT > 200)"`.'
+                        '\nMay be given multiple times as named selections'
+                        '\n(`"name=selection"`), which are evaluated in a'
+                        '\nsingle pass over the table. In this case,'
+                        '\n`--output` is a directory, and the IDs of each'
+                        '\nselection are written to `<output>/<name>.txt`.')
+    parser.add_argument('--threads',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Number of threads for'
+                             '\nreading the input table. If threads > 1,'
+                             '\ntext tables with a single-character'
+                             '\nseparator are parsed in parallel blocks'
+                             '\nusing the optional `pyarrow` package.'
+                             '\nParquet row groups whose column statistics'
+                             '\nrule out the selection are skipped'
+                             '\nregardless of this setting.')
+    parser.add_argument('--cache',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, parses the'
+                             '\ninput table once into a columnar cache of'
+                             '\nmemory-mappable arrays (`<input>.cols`)'
+                             '\nand evaluates the selection on the cached'
+                             '\ncolumns it references. The cache is reused'
+                             '\nby later runs and rebuilt automatically if'
+                             '\nthe size or modification time of the input'
+                             '\ntable changes.')
+    parser.add_argument('--mol2_input',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: `None`.) Input `.mol2` or'
+                             '\n`.mol2.gz` file, or a directory of MOL2 files.'
+                             '\nIf provided, the selected IDs are kept in'
+                             '\nmemory and the matching molecules are'
+                             '\nwritten to `--mol2_output` in the same run'
+                             '\n(like `id_to_mol2.py` with `--includelist'
+                             '\nTrue`). `--output` is optional in this mode.')
+    parser.add_argument('--mol2_output',
+                        type=str,
+                        default=None,
+                        help='(Required if `--mol2_input` is given.) Output'
+                             '\ndirectory path for the filtered MOL2 files.')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Number of processes to'
+                             ' run in parallel'
+                             '\nwhen extracting MOL2 files (see'
+                             ' `id_to_mol2.py`).')
     parser.add_argument('-v', '--verbose',
                         type=int,
                         default=1,
@@ -155,4 +519,13 @@ python datatable_to_id.py\\
 
     args = parser.parse_args()
 
-    main(args.input, args.output, args.verbose, args.selection, args.id_column)
+    if args.mol2_input is None:
+        if args.output is None:
+            parser.error('the following arguments are required: -o/--output')
+    elif args.mol2_output is None:
+        parser.error('--mol2_output is required with --mol2_input')
+
+    main(args.input, args.output, args.verbose, args.selection, args.id_column,
+         separator=args.separator, use_cache=args.cache,
+         mol2_input=args.mol2_input, mol2_output=args.mol2_output,
+         n_cpus=args.processes, n_threads=args.threads)
@@ -33,27 +33,22 @@ import os
 import argparse
 import sys
 import time
-import gzip
-from biopandas.mol2 import split_multimol2
+from _mol2_files import get_mol2_files
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import open_mol2_output
+from _mol2_reader import replace_record_id
 
 
-def get_mol2_files(dir_path):
-
-    files = []
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
-
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
 
-def read_and_write(inp_mol2_path, out_mol2_path, verbose):
+def read_and_write(inp_mol2_path, out_mol2_path, verbose, bgzf=False):
 
     if verbose:
         sys.stdout.write('Processing %s' % os.path.basename(inp_mol2_path))
@@ -61,53 +56,20 @@ def read_and_write(inp_mol2_path, out_mol2_path, verbose):
         start = time.time()
 
 
-    if inp_mol2_path.endswith('.gz'):
-        write_mode = 'wb'
-        open_file = gzip.open
-    else:
-        write_mode = 'w'
-        open_file = open
-
-    """
-    if query_path.endswith('.gz'):
-        for id_, cont in split_multimol2(query_path):
-            cnt += 1
-            cont = b''.join(cont).decode('utf-8').split('\n')
-            if multiconf_query:
-                mol_idx = '%s_%d' % (id_.decode('utf-8'), cnt)
-            else:
-                mol_idx = id_
-    """
-
-    with open_file(out_mol2_path, write_mode) as outfile:
-
-        prev_molecule = ''
-
-        if inp_mol2_path.endswith('.gz'):
-            for i, (id_, cont) in enumerate(split_multimol2(inp_mol2_path)):
-                if prev_molecule != id_:
-                    cnt = 0
-                else:
-                    cnt += 1
+    with open_mol2_output(out_mol2_path, bgzf=bgzf) as outfile:
 
-                mol_idx = b'%s_%d' % (id_, cnt)
+        prev_molecule = b''
 
-                cont[1] = mol_idx + b'\n'
-                outfile.write(b''.join(cont))
-                prev_molecule = id_
-
-        else:
-            for i, (id_, cont) in enumerate(split_multimol2(inp_mol2_path)):
-                if prev_molecule != id_:
-                    cnt = 0
-                else:
-                    cnt += 1
-
-                mol_idx = '%s_%d' % (id_, cnt)
+        i = -1
+        for i, (id_, cont) in enumerate(iter_mol2_records(inp_mol2_path)):
+            if prev_molecule != id_:
+                cnt = 0
+            else:
+                cnt += 1
 
-                cont[1] = mol_idx + '\n'
-                outfile.write(''.join(cont))
-                prev_molecule = id_
+            mol_idx = b'%s_%d' % (id_, cnt)
+            outfile.write(replace_record_id(cont, mol_idx))
+            prev_molecule = id_
 
     if verbose:
         elapsed = time.time() - start
@@ -117,7 +79,7 @@ def read_and_write(inp_mol2_path, out_mol2_path, verbose):
         sys.stdout.flush()
 
 
-def main(input_dir, output_dir, verbose):
+def main(input_dir, output_dir, verbose, bgzf):
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
     inp_mol2_paths = get_mol2_files(input_dir)
@@ -125,7 +87,7 @@ def main(input_dir, output_dir, verbose):
     for mol2_path in inp_mol2_paths:
         base = os.path.basename(mol2_path)
         out_mol2_path = os.path.join(output_dir, base)
-        read_and_write(mol2_path, out_mol2_path, verbose)
+        read_and_write(mol2_path, out_mol2_path, verbose, bgzf)
 
 
 if __name__ == '__main__':
@@ -154,6 +116,14 @@ python enumerate_conformers.py -i conformer_mol2s/\\
                         required=True,
                         help='(Required.) Directory path for writing the'
                              ' numbered MOL2s')
+    parser.add_argument('--bgzf',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, `.mol2.gz`'
+                             '\noutput files are written as independently'
+                             '\ncompressed blocks (BGZF) that remain valid'
+                             '\ngzip files but can be decompressed in parallel'
+                             '\nand support random access.')
     parser.add_argument('-v', '--verbose',
                         type=int,
                         default=1,
@@ -168,4 +138,5 @@ python enumerate_conformers.py -i conformer_mol2s/\\
 
     main(input_dir=args.input,
          output_dir=args.output,
-         verbose=args.verbose)
+         verbose=args.verbose,
+         bgzf=args.bgzf)
@@ -33,12 +33,24 @@
 import os
 import argparse
 import sys
-import pandas as pd
+import numpy as np
 import time
 from mputil import lazy_imap
 from multiprocessing import cpu_count
-from biopandas.mol2 import split_multimol2
 from biopandas.mol2 import PandasMol2
+from _atom_selection import parse_selection
+from _atom_selection import selection_columns
+from _mol2_files import get_mol2_files
+from _mol2_parser import parse_atom_block
+from _mol2_reader import iter_mol2_records
+from _mol2_store import MoleculeStore
+from _mol2_store import is_store
+from _mol2_store import iter_chunks
+from _selection import is_selection_path
+from _selection import open_id_output
+
+
+STORE_CHUNK_SIZE = 10000
 
 
 def parse_distance_string(s):
@@ -46,88 +58,130 @@ def parse_distance_string(s):
     return dist
 
 
-def get_mol2_files(dir_path):
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
-    files = []
 
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
+def data_processor(mol2):
+
+    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2[1].splitlines(True),
+                                             mol2_code=mol2[0])
 
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
+    coordinates = pdmol.df.loc[SELECTION[0](pdmol.df), ['x', 'y', 'z']].values
 
-    return files
+    pdmol._df = pdmol._df[SELECTION[1](pdmol.df)]
 
+    for xyz in coordinates:
 
-def parse_selection_string(s, df_name='pdmol.df'):
+        distances = pdmol.distance(xyz)
 
-    columns = ['(atom_id', '(atom_name', '(atom_type',
-               '(subst_id', '(subst_name', '(charge']
-    lst = [subs.strip() for subs in s.split('-->')]
-    parsed = []
+        match = ((distances.values >= DISTANCE[0]).any() and
+                 (distances.values <= DISTANCE[1]).any())
 
-    for subs in lst:
-        for c in columns:
-            subs = subs.replace(c, '(%s.%s' % (df_name, c[1:]))
-        parsed.append(subs)
-    return parsed
+        if match:
+            return mol2[0]
 
+    return None
 
-def data_processor(mol2):
 
-    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2[1],
-                                             mol2_code=mol2[0])
+def data_processor_numpy(mol2):
 
-    coordinates = pdmol.df.loc[pd.eval(SELECTION[0]), ['x', 'y', 'z']].values
+    atoms = parse_atom_block(mol2[1], columns=SELECTION_COLUMNS)
+    xyz = atoms.xyz()
 
-    pdmol._df = pdmol._df[pd.eval(SELECTION[1])]
+    coordinates = xyz[SELECTION[0](atoms)]
+    targets = xyz[SELECTION[1](atoms)]
 
     for xyz in coordinates:
 
-        distances = pdmol.distance(xyz)
+        distances = np.sqrt(((targets - xyz)**2).sum(axis=1))
 
-        match = ((distances.values >= DISTANCE[0]).any() and
-                 (distances.values <= DISTANCE[1]).any())
+        match = ((distances >= DISTANCE[0]).any() and
+                 (distances <= DISTANCE[1]).any())
 
         if match:
             return mol2[0]
 
-    return ''
+    return None
 
 
-def data_processor_gz(mol2_gz):
+def data_processor_store(chunk):
 
-    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2_gz[1],
-                                             mol2_code=mol2_gz[0])
+    store_path, start, stop = chunk
+    store = MoleculeStore(store_path)
+    atoms, offsets = store.atom_arrays(start, stop, SELECTION_COLUMNS)
 
-    coordinates = pdmol.df.loc[pd.eval(SELECTION[0]), ['x', 'y', 'z']].values
+    mask_1 = SELECTION[0](atoms)
+    mask_2 = SELECTION[1](atoms)
+    xyz = atoms.xyz()
+    ids = store.ids[start:stop]
 
-    pdmol._df = pdmol._df[pd.eval(SELECTION[1])]
+    matches = []
+    for i in range(stop - start):
+        a, b = offsets[i], offsets[i + 1]
+        coordinates = xyz[a:b][mask_1[a:b]]
+        targets = xyz[a:b][mask_2[a:b]]
+        if not coordinates.shape[0] or not targets.shape[0]:
+            continue
 
-    for xyz in coordinates:
+        distances = np.sqrt(((coordinates[:, np.newaxis, :] -
+                              targets[np.newaxis, :, :])**2).sum(axis=2))
 
-        distances = pdmol.distance(xyz)
+        match = ((distances >= DISTANCE[0]).any(axis=1) &
+                 (distances <= DISTANCE[1]).any(axis=1))
 
-        match = ((distances.values >= DISTANCE[0]).any() and
-                 (distances.values <= DISTANCE[1]).any())
+        if match.any():
+            matches.append(ids[i])
 
-        if match:
-            return mol2_gz[0].decode('utf-8')
+    return matches
+
+
+def read_and_write_store(store_path, id_file_path, verbose, n_cpus):
+
+    if verbose:
+        sys.stdout.write('Using selection: %s\n' %
+                         [sele.source for sele in SELECTION])
+        sys.stdout.write('Processing %s' % os.path.basename(
+            os.path.normpath(store_path)))
+        sys.stdout.flush()
+        start = time.time()
+
+    n_molecules = len(MoleculeStore(store_path))
+    chunks = ((store_path, a, b) for a, b
+              in iter_chunks(n_molecules, STORE_CHUNK_SIZE))
+
+    with open(id_file_path, 'wb') as f:
+        for chunk in lazy_imap(data_processor=data_processor_store,
+                               data_generator=chunks,
+                               n_cpus=n_cpus):
+            for mol2_ids in chunk:
+                f.write(b''.join(mol2_id + b'\n' for mol2_id in mol2_ids))
 
-    return ''
+    if verbose:
+        elapsed = time.time() - start
+        sys.stdout.write(' | %d mol/sec\n' % (n_molecules / elapsed))
+        sys.stdout.flush()
 
 
-def read_and_write(mol2_files, id_file_path, verbose, n_cpus):
+def read_and_write(mol2_files, id_file_path, verbose, n_cpus,
+                   numpy_parser=False):
 
     if verbose:
-        sys.stdout.write('Using selection: %s\n' % SELECTION)
+        sys.stdout.write('Using selection: %s\n' %
+                         [sele.source for sele in SELECTION])
         sys.stdout.flush()
 
-    with open(id_file_path, 'w') as f:
+    if numpy_parser:
+        data_processor_fn = data_processor_numpy
+    else:
+        data_processor_fn = data_processor
+
+    with open_id_output(id_file_path, mol2_files) as f:
 
         for mol2_file in mol2_files:
             if verbose:
@@ -137,15 +191,10 @@ def read_and_write(mol2_files, id_file_path, verbose, n_cpus):
 
             cnt = 0
 
-            if mol2_file.endswith('.gz'):
-                data_processor_fn = data_processor_gz
-            else:
-                data_processor_fn = data_processor
-
             for chunk in lazy_imap(data_processor=data_processor_fn,
-                                   data_generator=split_multimol2(mol2_file),
+                                   data_generator=iter_mol2_records(mol2_file),
                                    n_cpus=n_cpus):
-                _ = [f.write('%s\n' % mol2_id)for mol2_id in chunk if mol2_id]
+                f.write(mol2_file, chunk)
                 cnt += len(chunk)
 
             if verbose:
@@ -162,17 +211,27 @@ def get_num_cpus(n_cpus):
     return n_cpus
 
 
-def main(input_dir, output_file, verbose, n_cpus):
+def main(input_dir, output_file, verbose, n_cpus, numpy_parser):
 
     n_cpus = get_num_cpus(n_cpus)
     dirpath = os.path.dirname(output_file)
     if not os.path.exists(dirpath):
         os.mkdir(dirpath)
-    mol2_files = get_mol2_files(dir_path=input_dir)
-    read_and_write(mol2_files=mol2_files,
-                   id_file_path=output_file,
-                   verbose=verbose,
-                   n_cpus=n_cpus)
+    if is_store(input_dir):
+        if is_selection_path(output_file):
+            raise ValueError('Selection (`.sel`) output requires MOL2 input'
+                             ' files.')
+        read_and_write_store(store_path=input_dir,
+                             id_file_path=output_file,
+                             verbose=verbose,
+                             n_cpus=n_cpus)
+    else:
+        mol2_files = get_mol2_files(dir_path=input_dir)
+        read_and_write(mol2_files=mol2_files,
+                       id_file_path=output_file,
+                       verbose=verbose,
+                       n_cpus=n_cpus,
+                       numpy_parser=numpy_parser)
 
     if verbose:
         print('Finished')
@@ -205,11 +264,15 @@ python funcgroup_distance_to_id.py\\
                         required=True,
                         help='(Required.) Path to a `.mol2` or `.mol2.gz` file,'
                              '\nor a directory containing `.mol2`/`.mol2.gz`'
-                             'files.')
+                             'files,'
+                             '\nor a molecule store created via `compile_mol2.py`.')
     parser.add_argument('-o', '--output',
                         type=str,
                         required=True,
-                        help='(Required.) Directory for writing the output files.')
+                        help='(Required.) Path for the output ID file. If the path'
+                             '\nends with `.sel`, writes a selection file'
+                             '\n(a bitmap over the molecules of the input'
+                             '\nMOL2 files) instead.')
     parser.add_argument('-s', '--selection',
                         type=str,
                         required=True,
@@ -238,6 +301,13 @@ python funcgroup_distance_to_id.py\\
                              '\nargument, two atoms are considered a match'
                              '\nif they are not closer than 13 angstroms and'
                              '\n not farther than 20 angstroms.')
+    parser.add_argument('--numpy_parser',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, parses only the'
+                             '\natom columns used by the selection into NumPy'
+                             '\narrays instead of creating a pandas DataFrame'
+                             '\nper molecule via biopandas. Considerably faster.')
     parser.add_argument('--processes',
                         type=int,
                         default=1,
@@ -265,7 +335,10 @@ python funcgroup_distance_to_id.py\\
                          " for --distance"
                          "\nFor example 13-20")
 
-    SELECTION = parse_selection_string(args.selection)
+    SELECTION = parse_selection(args.selection)
+    SELECTION_COLUMNS = selection_columns(SELECTION)
+    SELECTION_COLUMNS += [c for c in ('x', 'y', 'z')
+                          if c not in SELECTION_COLUMNS]
     if len(SELECTION) != 2:
         raise ValueError("Make sure you have 2 --selection criteria"
                          " separated via '-->', for example,"
@@ -275,4 +348,5 @@ python funcgroup_distance_to_id.py\\
     main(input_dir=args.input,
          output_file=args.output,
          verbose=args.verbose,
-         n_cpus=args.processes)
+         n_cpus=args.processes,
+         numpy_parser=args.numpy_parser)
@@ -34,38 +34,42 @@ import argparse
 import sys
 import time
 from multiprocessing import cpu_count
+import numpy as np
 from numpy import nan as np_nan
 from mputil import lazy_imap
 from biopandas.mol2 import PandasMol2
-from biopandas.mol2 import split_multimol2
+from _mol2_files import get_mol2_files
+from _mol2_parser import parse_atom_block
+from _mol2_reader import iter_mol2_records
+from _mol2_store import MoleculeStore
+from _mol2_store import is_store
+from _mol2_store import iter_chunks
 
 
-def get_mol2_files(dir_path):
+STORE_CHUNK_SIZE = 1000
 
-    files = []
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
 
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
 
 def get_dbase_query_pairs(all_mol2s):
-    q_list, d_list = [], []
+    q_dict, d_list = {}, []
     for m in all_mol2s:
         if m.endswith(('_query.mol2.gz', '_query.mol2')):
-            q_list.append(m)
+            q_dict[m.rsplit('_query.mol2', 1)[0]] = m
         elif m.endswith(('_dbase.mol2.gz', '_dbase.mol2')):
             d_list.append(m)
-    if len(q_list) != len(q_list):
+    d_prefixes = [d.rsplit('_dbase.mol2', 1)[0] for d in d_list]
+    if len(q_dict) != len(d_list) or set(q_dict) != set(d_prefixes):
         raise ValueError('The input directory contains an unequal number of'
                          '*_dbase* and *_query* files.')
+    q_list = [q_dict[prefix] for prefix in d_prefixes]
     return q_list, d_list
 
 
@@ -84,40 +88,137 @@ def get_atom_matches(q_pdmol, d_pdmol):
     return atoms, charges
 
 
+def get_atom_matches_arrays(q_xyz, d_xyz, d_types, d_charges):
+    distances = np.sqrt(((q_xyz[:, np.newaxis, :] -
+                          d_xyz[np.newaxis, :, :])**2).sum(axis=2))
+    nearest_idx = distances.argmin(axis=1)
+    too_far = distances[np.arange(q_xyz.shape[0]), nearest_idx] > THRESHOLD
+
+    atoms = d_types[nearest_idx].astype(object)
+    atoms[too_far] = ''
+    charges = d_charges[nearest_idx].astype(float)
+    charges[too_far] = np_nan
+    return atoms.tolist(), charges.tolist()
+
+
 def data_processor(mol2s):
 
     q_pdmol = PandasMol2()
     d_pdmol = PandasMol2()
 
     d_pdmol.read_mol2_from_list(mol2_code=mol2s[0][0],
-                                mol2_lines=mol2s[0][1])
+                                mol2_lines=mol2s[0][1].splitlines(True))
 
     q_pdmol.read_mol2_from_list(mol2_code=mol2s[1][0],
-                                mol2_lines=mol2s[1][1])
+                                mol2_lines=mol2s[1][1].splitlines(True))
 
     atoms, charges = get_atom_matches(q_pdmol, d_pdmol)
     return mol2s[0][0], mol2s[1][0], atoms, charges
 
 
-def data_processor_gz(mol2s_gz):
+def data_processor_numpy(mol2s):
 
-    q_pdmol = PandasMol2()
-    d_pdmol = PandasMol2()
+    d_atoms = parse_atom_block(mol2s[0][1],
+                               columns=('atom_type', 'x', 'y', 'z', 'charge'))
+    q_atoms = parse_atom_block(mol2s[1][1], columns=('x', 'y', 'z'))
 
-    d_pdmol.read_mol2_from_list(mol2_code=mol2s_gz[0][0],
-                                mol2_lines=mol2s_gz[0][1])
+    atoms, charges = get_atom_matches_arrays(q_atoms.xyz(),
+                                             d_atoms.xyz(),
+                                             d_atoms.atom_type,
+                                             d_atoms.charge)
+    return mol2s[0][0], mol2s[1][0], atoms, charges
 
-    q_pdmol.read_mol2_from_list(mol2_code=mol2s_gz[1][0],
-                                mol2_lines=mol2s_gz[1][1])
 
-    atoms, charges = get_atom_matches(q_pdmol, d_pdmol)
-    return (mol2s_gz[0][0].decode('utf-8'),
-            mol2s_gz[1][0].decode('utf-8'),
-            atoms, charges)
+def write_tables(dct_results, columns, output_file):
+
+    with open(output_file + '_charge.tsv', 'w') as f1,\
+            open(output_file + '_atomtype.tsv', 'w') as f2:
+
+        f1.write('dbase\tquery\t%s\n' % '\t'.join(columns))
+        f2.write('dbase\tquery\t%s\n' % '\t'.join(columns))
+        for i in range(len(dct_results['dbase'])):
+            dbase_id = dct_results['dbase'][i].decode('utf-8')
+            query_id = dct_results['query'][i].decode('utf-8')
+            s1 = '%s\t%s\t%s\n' % (dbase_id,
+                                 query_id,
+                                 '\t'.join(format(x, "1.2f")
+                                          for x in dct_results['charges'][i]))
+
+            f1.write(s1)
+            s2 = '%s\t%s\t%s\n' % (dbase_id,
+                                 query_id,
+                                 '\t'.join(dct_results['atoms'][i]))
+            f2.write(s2)
+
+
+def data_processor_store(chunk):
+
+    store_path, q_start, d_start, n = chunk
+    store = MoleculeStore(store_path)
+    q_atoms, q_offsets = store.atoms(q_start, q_start + n)
+    d_atoms, d_offsets = store.atoms(d_start, d_start + n)
+
+    q_xyz = q_atoms[['x', 'y', 'z']].values
+    d_xyz = d_atoms[['x', 'y', 'z']].values
+    d_types = np.asarray(d_atoms['atom_type'], dtype=object)
+    d_charges = d_atoms['charge'].values.astype(float)
+
+    results = []
+    for i in range(n):
+        qa, qb = q_offsets[i], q_offsets[i + 1]
+        da, db = d_offsets[i], d_offsets[i + 1]
+
+        atoms, charges = get_atom_matches_arrays(q_xyz[qa:qb],
+                                                 d_xyz[da:db],
+                                                 d_types[da:db],
+                                                 d_charges[da:db])
+
+        results.append((store.ids[d_start + i], store.ids[q_start + i],
+                        atoms, charges))
+    return results
+
+
+def read_and_write_store(store_path, q_name, d_name, verbose,
+                         output_file, n_cpus):
+
+    dct_results = {'dbase': [], 'query': [], 'atoms': [], 'charges': []}
+
+    if verbose:
+        start = time.time()
+        sys.stdout.write('Processing %s/%s' % (d_name, q_name))
+        sys.stdout.flush()
+
+    store = MoleculeStore(store_path)
+    q_start, q_stop = store.file_range(q_name)
+    d_start, d_stop = store.file_range(d_name)
+    n_pairs = min(q_stop - q_start, d_stop - d_start)
+
+    chunks = ((store_path, q_start + a, d_start + a, b - a)
+              for a, b in iter_chunks(n_pairs, STORE_CHUNK_SIZE))
+
+    for chunk in lazy_imap(data_processor=data_processor_store,
+                           data_generator=chunks,
+                           n_cpus=n_cpus):
+        for results in chunk:
+            for dbase_id, query_id, atoms, charges in results:
+                dct_results['dbase'].append(dbase_id)
+                dct_results['query'].append(query_id)
+                dct_results['atoms'].append(atoms)
+                dct_results['charges'].append(charges)
+
+    columns = store.atom_names[store.mol_offsets[q_start]:
+                               store.mol_offsets[q_start + 1]].astype(str)
+    write_tables(dct_results, columns, output_file)
+
+    if verbose:
+        elapsed = time.time() - start
+        sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
+                         (n_pairs, n_pairs / elapsed))
+        sys.stdout.flush()
 
 
 def read_and_write(q_path, d_path, verbose,
-                   cache, output_file, n_cpus):
+                   cache, output_file, n_cpus, numpy_parser=False):
 
     dct_results = {'dbase': [], 'query': [], 'atoms': [], 'charges': []}
 
@@ -131,14 +232,14 @@ def read_and_write(q_path, d_path, verbose,
 
     cnt = 0
 
-    if q_path.endswith('.gz'):
-        data_processor_fn = data_processor_gz
+    if numpy_parser:
+        data_processor_fn = data_processor_numpy
     else:
         data_processor_fn = data_processor
 
     for chunk in lazy_imap(data_processor=data_processor_fn,
-                           data_generator=zip(split_multimol2(d_path),
-                                              split_multimol2(q_path)),
+                           data_generator=zip(iter_mol2_records(d_path),
+                                              iter_mol2_records(q_path)),
                            n_cpus=n_cpus):
 
         for dbase_id, query_id, atoms, charges in chunk:
@@ -177,23 +278,8 @@ def read_and_write(q_path, d_path, verbose,
         dct_results['charges'].append(charges)
     """
 
-    with open(output_file + '_charge.tsv', 'w') as f1,\
-            open(output_file + '_atomtype.tsv', 'w') as f2:
-
-        columns = PandasMol2().read_mol2(q_path).df['atom_name'].values
-        f1.write('dbase\tquery\t%s\n' % '\t'.join(columns))
-        f2.write('dbase\tquery\t%s\n' % '\t'.join(columns))
-        for i in range(len(dct_results['dbase'])):
-            s1 = '%s\t%s\t%s\n' % (dct_results['dbase'][i],
-                                 dct_results['query'][i],
-                                 '\t'.join(format(x, "1.2f")
-                                          for x in dct_results['charges'][i]))
-
-            f1.write(s1)
-            s2 = '%s\t%s\t%s\n' % (dct_results['dbase'][i],
-                                 dct_results['query'][i],
-                                 '\t'.join(dct_results['atoms'][i]))
-            f2.write(s2)
+    columns = PandasMol2().read_mol2(q_path).df['atom_name'].values
+    write_tables(dct_results, columns, output_file)
 
     if verbose:
         elapsed = time.time() - start
@@ -211,14 +297,17 @@ def get_num_cpus(n_cpus):
     return n_cpus
 
 
-def main(input_dir, output_dir, verbose, n_cpus):
+def main(input_dir, output_dir, verbose, n_cpus, numpy_parser):
 
     n_cpus = get_num_cpus(n_cpus)
 
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
 
-    mol2_in_files = get_mol2_files(input_dir)
+    if is_store(input_dir):
+        mol2_in_files = MoleculeStore(input_dir).files
+    else:
+        mol2_in_files = get_mol2_files(input_dir)
 
     q_list, d_list = get_dbase_query_pairs(mol2_in_files)
 
@@ -230,12 +319,21 @@ def main(input_dir, output_dir, verbose, n_cpus):
 
     cache = {}
     for q, d, c in zip(q_list, d_list, csv_out_bases):
+        if is_store(input_dir):
+            read_and_write_store(store_path=input_dir,
+                                 q_name=q,
+                                 d_name=d,
+                                 verbose=verbose,
+                                 output_file=c,
+                                 n_cpus=n_cpus)
+            continue
         read_and_write(q_path=q,
                        d_path=d,
                        verbose=verbose,
                        cache=cache,
                        output_file=c,
-                       n_cpus=n_cpus)
+                       n_cpus=n_cpus,
+                       numpy_parser=numpy_parser)
 
 
 if __name__ == '__main__':
@@ -257,7 +355,9 @@ python funcgroup_matching.py\\
                         required=True,
                         help='(Required.) Path to a directory containing pairs '
                              '\nof `*_query.mol2`/`.mol2.gz` '
-                             '\nand `*_dbase.mol2`/`.mol2.gz` files')
+                             '\nand `*_dbase.mol2`/`.mol2.gz` files,'
+                             '\nor a molecule store of such a directory'
+                             '\ncreated via `compile_mol2.py`.')
     parser.add_argument('-o', '--output',
                         type=str,
                         required=True,
@@ -274,6 +374,13 @@ python funcgroup_matching.py\\
                         '\nwould count atoms as a match if they'
                         '\nare within 0 and 1.3 angstroms'
                         '\nto the target atom.')
+    parser.add_argument('--numpy_parser',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, parses only the'
+                             '\natom coordinates, types, and charges into NumPy'
+                             '\narrays instead of creating a pandas DataFrame'
+                             '\nper molecule via biopandas. Considerably faster.')
     parser.add_argument('--processes',
                         type=int,
                         default=1,
@@ -301,4 +408,5 @@ python funcgroup_matching.py\\
     main(input_dir=args.input,
          output_dir=args.output,
          verbose=args.verbose,
-         n_cpus=args.processes)
+         n_cpus=args.processes,
+         numpy_parser=args.numpy_parser)
@@ -33,9 +33,18 @@ import argparse
 import os
 import sys
 import pandas as pd
-import gzip
 import time
-from biopandas.mol2 import split_multimol2
+from _mol2_index import iter_records_at
+from _mol2_reader import open_mol2_output
+
+
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
 
 def get_tsv_pairs(all_tsv):
@@ -62,7 +71,7 @@ def parse_selection_string(s, columns, df_name='df'):
 
 
 def main(input_dir, output_dir, atomtype_selection, charge_selection, 
-         input_mol2, verbose):
+         input_mol2, verbose, bgzf=False):
 
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
@@ -136,50 +145,28 @@ def main(input_dir, output_dir, atomtype_selection, charge_selection,
 
             if input_mol2_path_query.endswith('.gz'):
                 output_mol2_path_query += '.gz'
-                query_write_mode = 'wb'
-                query_open_file = gzip.open
-            else:
-                query_write_mode = 'w'
-                query_open_file = open
             if input_mol2_path_dbase.endswith('.gz'):
                 output_mol2_path_dbase += '.gz'
-                dbase_write_mode = 'wb'
-                dbase_open_file = gzip.open
-            else:
-                dbase_write_mode = 'w'
-                dbase_open_file = open
-
-            with query_open_file(output_mol2_path_query, query_write_mode) as opq,\
-                    dbase_open_file(output_mol2_path_dbase, dbase_write_mode) as opd:
-                for i in selection_indices:
 
-                    mol2_q_cont = ('DID NOT FIND %s\n'
-                                   % (df_atom.ix[i]['query']))
+            with open_mol2_output(output_mol2_path_query, bgzf) as opq,\
+                    open_mol2_output(output_mol2_path_dbase, bgzf) as opd:
+                query_mol2s = {i: cont for i, _, cont in iter_records_at(
+                               input_mol2_path_query, selection_indices)}
+                dbase_mol2s = {i: cont for i, _, cont in iter_records_at(
+                               input_mol2_path_dbase, selection_indices)}
 
-                    mol2_d_cont = ('DID NOT FIND %s\n'
-                                   % (df_atom.ix[i]['dbase']))
-
-                    for idx, mol2 in enumerate(split_multimol2(
-                            input_mol2_path_query)):
-                        if idx == i:
-                            mol2_q_cont = mol2[1]
-                            break
+                for i in selection_indices:
 
-                    for idx, mol2 in enumerate(split_multimol2(
-                            input_mol2_path_dbase)):
-                        if idx == i:
-                            mol2_d_cont = mol2[1]
-                            break
+                    mol2_q_cont = query_mol2s.get(i, (
+                        'DID NOT FIND %s\n'
+                        % (df_atom.ix[i]['query'])).encode('utf-8'))
 
-                    if query_write_mode == 'wb':
-                        opq.write(b''.join(mol2_q_cont))
-                    else:
-                        opq.write(''.join(mol2_q_cont))
+                    mol2_d_cont = dbase_mol2s.get(i, (
+                        'DID NOT FIND %s\n'
+                        % (df_atom.ix[i]['dbase'])).encode('utf-8'))
 
-                    if dbase_write_mode == 'wb':
-                        opd.write(b''.join(mol2_d_cont))
-                    else:
-                        opd.write(''.join(mol2_d_cont))
+                    opq.write(mol2_q_cont)
+                    opd.write(mol2_d_cont)
 
         if verbose:
             elapsed = time.time() - start
@@ -236,6 +223,14 @@ matching the charges in 2 atoms in the reference molecule, S1 and O2:
 "((S1 >= 1.0)) --> (O2 <= -0.5)".
 Here, the atom that matches S1 has to have a positive charge, 1 or greater. The charge
 matching the second atom, O2, must be (partially) negative (-0.5 or smaller).""")
+    parser.add_argument('--bgzf',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, `.mol2.gz`'
+                             '\noutput files are written as independently'
+                             '\ncompressed blocks (BGZF) that remain valid'
+                             '\ngzip files but can be decompressed in parallel'
+                             '\nand support random access.')
     parser.add_argument('-v', '--verbose',
                         type=int,
                         default=1,
@@ -253,4 +248,5 @@ matching the second atom, O2, must be (partially) negative (-0.5 or smaller)."""
          atomtype_selection=args.atomtype_selection,
          charge_selection=args.charge_selection,
          input_mol2=args.input_mol2,
-         verbose=args.verbose)
\ No newline at end of file
+         verbose=args.verbose,
+         bgzf=args.bgzf)
\ No newline at end of file
@@ -33,79 +33,195 @@
 import os
 import argparse
 import sys
-import pandas as pd
+import numpy as np
 import time
+from contextlib import ExitStack
+from itertools import islice
 from mputil import lazy_imap
 from multiprocessing import cpu_count
-from biopandas.mol2 import split_multimol2
 from biopandas.mol2 import PandasMol2
+from _atom_selection import parse_selection
+from _atom_selection import selection_columns
+from _mol2_files import get_mol2_files
+from _mol2_parser import parse_atom_blocks
+from _mol2_reader import iter_mol2_records
+from _mol2_store import MoleculeStore
+from _mol2_store import is_store
+from _mol2_store import iter_chunks
+from _mol2_store import segment_any
+from _named_selection import read_selection_file
+from _named_selection import split_selection_name
+from _selection import is_selection_path
+from _selection import open_id_output
+from _type_index import load_type_index
+from _type_index import record_atom_types
+from _type_index import sets_contain_any
+
+
+STORE_CHUNK_SIZE = 10000
+MOL2_BATCH_SIZE = 2000
+
+
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
+def match_selections(sub_match, n):
+    """Returns a boolean array per selection in SELECTIONS that flags
+    which of `n` molecules match all of its sub-selections.
+
+    `sub_match(sub_sele)` returns the per-molecule matches of a single
+    sub-selection. Sub-selections shared by several selections are
+    evaluated only once, and the remaining sub-selections of a
+    selection are skipped once no molecule matches.
+    """
+    cache = {}
+    matches = []
+    for selection in SELECTIONS:
+        match = np.ones(n, dtype=bool)
+        for sub_sele in selection:
+            if not match.any():
+                break
+            if sub_sele.source not in cache:
+                cache[sub_sele.source] = sub_match(sub_sele)
+            match &= cache[sub_sele.source]
+        matches.append(match)
+    return matches
+
+
+def to_results(mol2_ids, matches):
+    """Returns the results of each selection in file order (the ID of
+    each matching molecule, None otherwise)."""
+    return [[mol2_id if m else None for mol2_id, m
+             in zip(mol2_ids, match.tolist())] for match in matches]
 
 
-def get_mol2_files(dir_path):
+def data_processor(mol2):
 
-    files = []
+    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2[1].splitlines(True),
+                                             mol2_code=mol2[0])
 
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
+    matches = match_selections(lambda sub_sele: sub_sele(pdmol.df).any(), 1)
+    return [mol2[0] if match[0] else None for match in matches]
 
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
 
-    return files
+def data_processor_batch(batch):
 
+    results = [data_processor(mol2) for mol2 in batch]
+    return [list(sele_results) for sele_results in zip(*results)]
 
-def parse_selection_string(s, df_name='pdmol.df'):
 
-    columns = ['(atom_id', '(atom_name', '(atom_type',
-               '(subst_id', '(subst_name', '(charge']
-    lst = [subs.strip() for subs in s.split('-->')]
-    parsed = []
+def data_processor_numpy(batch):
 
-    for subs in lst:
-        for c in columns:
-            subs = subs.replace(c, '(%s.%s' % (df_name, c[1:]))
-        parsed.append(subs)
-    return parsed
+    atoms, offsets = parse_atom_blocks([mol2[1] for mol2 in batch],
+                                       columns=SELECTION_COLUMNS)
 
+    matches = match_selections(
+        lambda sub_sele: segment_any(sub_sele(atoms), offsets), len(batch))
+    return to_results([mol2[0] for mol2 in batch], matches)
 
-def data_processor(mol2):
 
-    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2[1],
-                                             mol2_code=mol2[0])
+def data_processor_types(batch):
+    """Evaluates atom-type-only selections on the atom type tokens of
+    the raw ATOM blocks, without parsing any other atom columns."""
+
+    type_sets = [record_atom_types(mol2[1]) for mol2 in batch]
+    matches = match_selections(
+        lambda sub_sele: sets_contain_any(type_sets, sub_sele), len(batch))
+    return to_results([mol2[0] for mol2 in batch], matches)
+
+
+def iter_batches(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
 
-    match = mol2[0]
-    for sub_sele in SELECTION:
-        if not pd.eval(sub_sele).any():
-            match = ''
-            break
 
-    return match
+def data_processor_store(chunk):
 
-def data_processor_gz(mol2_gz):
+    store_path, start, stop = chunk
+    store = MoleculeStore(store_path)
+    atoms, offsets = store.atom_arrays(start, stop, SELECTION_COLUMNS)
 
-    pdmol = PandasMol2().read_mol2_from_list(mol2_lines=mol2_gz[1],
-                                             mol2_code=mol2_gz[0])
+    matches = match_selections(
+        lambda sub_sele: segment_any(sub_sele(atoms), offsets), stop - start)
+    return [store.ids[start:stop][match].tolist() for match in matches]
 
-    match = mol2_gz[0].decode('utf-8')
-    for sub_sele in SELECTION:
-        if not pd.eval(sub_sele).any():
-            match = ''
-            break
 
-    return match
+def select_by_type_index(index):
+    """Evaluates atom-type-only selections on the atom type
+    fingerprints of a `_type_index.TypeIndex` and returns the results
+    of each selection in file order."""
+    return to_results(index.ids, match_selections(index.contains_any,
+                                                  len(index)))
 
 
-def read_and_write(mol2_files, id_file_path, verbose, n_cpus):
+def print_selections(names):
+    for name, selection in zip(names, SELECTIONS):
+        sys.stdout.write('Using selection: %s%s\n' %
+                         ('' if name is None else '%s=' % name,
+                          [sele.source for sele in selection]))
+    sys.stdout.flush()
+
+
+def read_and_write_store(store_path, id_file_paths, names, verbose, n_cpus):
+
+    if verbose:
+        print_selections(names)
+        sys.stdout.write('Processing %s' % os.path.basename(
+            os.path.normpath(store_path)))
+        sys.stdout.flush()
+        start = time.time()
+
+    n_molecules = len(MoleculeStore(store_path))
+    chunks = ((store_path, a, b) for a, b
+              in iter_chunks(n_molecules, STORE_CHUNK_SIZE))
+
+    with ExitStack() as stack:
+        outputs = [stack.enter_context(open(path, 'wb'))
+                   for path in id_file_paths]
+        for chunk in lazy_imap(data_processor=data_processor_store,
+                               data_generator=chunks,
+                               n_cpus=n_cpus):
+            for sele_ids in chunk:
+                for f, mol2_ids in zip(outputs, sele_ids):
+                    f.write(b''.join(mol2_id + b'\n' for mol2_id in mol2_ids))
 
     if verbose:
-        sys.stdout.write('Using selection: %s\n' % SELECTION)
+        elapsed = time.time() - start
+        sys.stdout.write(' | %d mol/sec\n' % (n_molecules / elapsed))
         sys.stdout.flush()
 
-    with open(id_file_path, 'w') as f:
+
+def read_and_write(mol2_files, id_file_paths, names, verbose, n_cpus,
+                   numpy_parser=False):
+
+    if verbose:
+        print_selections(names)
+
+    # selections that only refer to atom types are answered from
+    # `.mol2.types` files where available, and from the atom type
+    # tokens of the MOL2 records otherwise
+    types_only = SELECTION_COLUMNS == ['atom_type']
+
+    if types_only:
+        data_processor_fn = data_processor_types
+    elif numpy_parser:
+        data_processor_fn = data_processor_numpy
+    else:
+        data_processor_fn = data_processor_batch
+
+    with ExitStack() as stack:
+        outputs = [stack.enter_context(open_id_output(path, mol2_files))
+                   for path in id_file_paths]
 
         for mol2_file in mol2_files:
             if verbose:
@@ -113,25 +229,35 @@ def read_and_write(mol2_files, id_file_path, verbose, n_cpus):
                 sys.stdout.write('Processing %s' % os.path.basename(mol2_file))
                 sys.stdout.flush()
 
-            cnt = 0
+            type_index = load_type_index(mol2_file) if types_only else None
+            if type_index is not None:
+                for f, results in zip(outputs,
+                                      select_by_type_index(type_index)):
+                    f.write(mol2_file, results)
+                if verbose:
+                    elapsed = time.time() - start
+                    sys.stdout.write(' | %d mol/sec (atom type index)\n' %
+                                     (len(type_index) / elapsed))
+                    sys.stdout.flush()
+                continue
 
-            if mol2_file.endswith('.gz'):
-                data_processor_fn = data_processor_gz
-            else:
-                data_processor_fn = data_processor
+            cnt = 0
 
+            batches = iter_batches(iter_mol2_records(mol2_file),
+                                   MOL2_BATCH_SIZE)
             for chunk in lazy_imap(data_processor=data_processor_fn,
-                                   data_generator=split_multimol2(
-                                      mol2_file),
+                                   data_generator=batches,
                                    n_cpus=n_cpus):
-
-                _ = [f.write('%s\n' % mol2_id) for mol2_id
-                     in chunk if mol2_id]
-                cnt += len(chunk)
+                for sele_results in chunk:
+                    for f, results in zip(outputs, sele_results):
+                        f.write(mol2_file, results)
+                    cnt += len(sele_results[0])
 
             if verbose:
                 elapsed = time.time() - start
-                sys.stdout.write(' | %d mol/sec\n' % (cnt / elapsed))
+                sys.stdout.write(' | %d mol/sec%s\n' %
+                                 (cnt / elapsed,
+                                  ' (atom type scan)' if types_only else ''))
                 sys.stdout.flush()
 
 
@@ -143,16 +269,41 @@ def get_num_cpus(n_cpus):
     return n_cpus
 
 
-def main(input_dir, output_file, verbose, n_cpus):
+def main(input_dir, output_file, verbose, n_cpus, numpy_parser,
+         names=(None,), output_format='txt'):
     n_cpus = get_num_cpus(n_cpus)
-    dirpath = os.path.dirname(output_file)
-    if not os.path.exists(dirpath):
+    names = list(names)
+    if len(names) == 1 and names[0] is None:
+        dirpath = os.path.dirname(output_file)
+        targets = [output_file]
+    else:
+        if None in names:
+            raise ValueError('Multiple selections must be named, for'
+                             ' example, "sulfonyl=(atom_type == \'S.o2\')".')
+        if len(set(names)) != len(names):
+            raise ValueError('Selection names must be unique.')
+        dirpath = output_file
+        targets = [os.path.join(output_file, '%s.%s' % (name, output_format))
+                   for name in names]
+    if dirpath and not os.path.exists(dirpath):
         os.mkdir(dirpath)
-    mol2_files = get_mol2_files(dir_path=input_dir)
-    read_and_write(mol2_files=mol2_files,
-                   id_file_path=output_file,
-                   verbose=verbose,
-                   n_cpus=n_cpus)
+    if is_store(input_dir):
+        if any(is_selection_path(path) for path in targets):
+            raise ValueError('Selection (`.sel`) output requires MOL2 input'
+                             ' files.')
+        read_and_write_store(store_path=input_dir,
+                             id_file_paths=targets,
+                             names=names,
+                             verbose=verbose,
+                             n_cpus=n_cpus)
+    else:
+        mol2_files = get_mol2_files(dir_path=input_dir)
+        read_and_write(mol2_files=mol2_files,
+                       id_file_paths=targets,
+                       names=names,
+                       verbose=verbose,
+                       n_cpus=n_cpus,
+                       numpy_parser=numpy_parser)
     if verbose:
         print('Finished')
 
@@ -167,20 +318,31 @@ of certain atoms or functional groups and writing the results to a text file."""
 python funcgroup_presence_to_id.py --input mol2s/\\
   --output mol2ids.txt\\
   --selection "((atom_type == \'S.3\') | (atom_type == \'S.o2\')) --> (atom_type == \'O.2\')"\\
-  --processes 0""",
+  --processes 0
+
+python funcgroup_presence_to_id.py --input mol2s/\\
+  --output hypotheses/\\
+  --selection_file hypotheses.txt\\
+  --numpy_parser True""",
             formatter_class=argparse.RawTextHelpFormatter)
 
     parser.add_argument('-i', '--input',
                         type=str,
                         required=True,
-                        help='(Required.) Input directory with `.mol2` and `.mol2.gz` files.')
+                        help='(Required.) Input directory with `.mol2` and `.mol2.gz` files,'
+                             '\nor a molecule store created via `compile_mol2.py`.')
     parser.add_argument('-o', '--output',
                         type=str,
                         required=True,
-                        help='(Required.) Directory for writing the output files.')
+                        help='(Required.) Path for the output ID file. If the path'
+                             '\nends with `.sel`, writes a selection file'
+                             '\n(a bitmap over the molecules of the input'
+                             '\nMOL2 files) instead.'
+                             '\nFor named selections, the output directory.')
     parser.add_argument('-s', '--selection',
                         type=str,
-                        required=True,
+                        action='append',
+                        default=None,
                         help='Selection condition for the atom presence'
                         ' checks.'
                         '\n1) Require 2 atom types to be present:'
@@ -196,7 +358,39 @@ python funcgroup_presence_to_id.py --input mol2s/\\
                         '    "((atom_type == \'S.3\') | (atom_type == '
                         '\'S.o2\'))'
                         ' -->  ((atom_type == \'O.2\') |'
-                        ' (atom_type == \'O.3\'))"')
+                        ' (atom_type == \'O.3\'))"'
+                        '\nMay be given multiple times as named selections'
+                        '\n(`"name=selection"`), which are evaluated in a'
+                        '\nsingle pass over the molecules. In this case,'
+                        '\n`--output` is a directory, and the results of'
+                        '\neach selection are written to'
+                        '\n`<output>/<name>.txt` (see `--output_format`).')
+    parser.add_argument('--selection_file',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: `None`.) Path to a text file with'
+                             '\none named selection (`"name=selection"`) per'
+                             '\nline, for example,'
+                             '\n    sulfonyl=(atom_type == \'S.o2\') -->'
+                             ' (atom_type == \'O.2\')'
+                             '\nBlank lines and lines starting with `#` are'
+                             '\nignored. Evaluated together with any'
+                             '\n`--selection` arguments.')
+    parser.add_argument('--output_format',
+                        type=str,
+                        choices=('txt', 'sel'),
+                        default='txt',
+                        help='(Optional, default: `txt`.) Output format for named'
+                             '\nselections: ID files (`txt`) or selection'
+                             '\nfiles (`sel`, bitmaps over the molecules of'
+                             '\nthe input MOL2 files).')
+    parser.add_argument('--numpy_parser',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, parses only the'
+                             '\natom columns used by the selection into NumPy'
+                             '\narrays instead of creating a pandas DataFrame'
+                             '\nper molecule via biopandas. Considerably faster.')
     parser.add_argument('--processes',
                         type=int,
                         default=1,
@@ -218,9 +412,25 @@ python funcgroup_presence_to_id.py --input mol2s/\\
     parser.add_argument('--version', action='version', version='v. 1.0')
 
     args = parser.parse_args()
-    SELECTION = parse_selection_string(args.selection)
+    selection_strings = list(args.selection or [])
+    if args.selection_file is not None:
+        selection_strings += read_selection_file(args.selection_file)
+    if not selection_strings:
+        parser.error('a selection is required (`--selection` or'
+                     ' `--selection_file`)')
+
+    names, SELECTIONS = [], []
+    for s in selection_strings:
+        name, expression = split_selection_name(s)
+        names.append(name)
+        SELECTIONS.append(parse_selection(expression))
+    SELECTION_COLUMNS = selection_columns(
+        [sub_sele for selection in SELECTIONS for sub_sele in selection])
 
     main(input_dir=args.input,
          output_file=args.output,
          verbose=args.verbose,
-         n_cpus=args.processes)
+         n_cpus=args.processes,
+         numpy_parser=args.numpy_parser,
+         names=names,
+         output_format=args.output_format)
@@ -33,23 +33,7 @@ import os
 import subprocess
 import sys
 import argparse
-
-
-def get_mol2_files(dir_path):
-
-    files = []
-
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
-
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
+from _mol2_files import get_mol2_files
 
 
 def run_obabel(source_file, target_file, settings):
@@ -30,12 +30,14 @@
 #
 
 import argparse
-import os
-import sys
-import time
-import gzip
+from multiprocessing import cpu_count
 
-from biopandas.mol2.mol2_io import split_multimol2
+from _id_set import read_idfile
+from _mol2_filter import filter_and_write
+from _mol2_filter import filter_and_write_parallel
+from _mol2_files import get_mol2_files
+from _selection import is_selection_file
+from _selection import read_selection
 
 
 def str2bool(v):
@@ -47,90 +49,40 @@ def str2bool(v):
         raise argparse.ArgumentTypeError('Boolean value expected.')
 
 
-def get_mol2_files(dir_path):
+def get_num_cpus(n_cpus):
+    if not n_cpus:
+        n_cpus = cpu_count()
+    elif n_cpus < 0:
+        n_cpus = cpu_count() - n_cpus
+    return n_cpus
 
-    files = []
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
 
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
-
-
-def read_idfile(id_file_path):
-    with open(id_file_path, 'r') as f:
-        ids = {line.strip() for line in f if not line.startswith('#')}
-    return ids
-
-
-def filter_and_write(mol2_files, ids, output_dir, includelist_filter, verbose):
-    for mol2_file in mol2_files:
-        if verbose:
-            sys.stdout.write('Processing %s' % os.path.basename(mol2_file))
-            sys.stdout.flush()
-
-        if not os.path.exists(output_dir):
-            os.mkdir(output_dir)
-
-        mol2_outpath = os.path.join(output_dir, os.path.basename(mol2_file))
-
-        if mol2_outpath.endswith('.gz'):
-            write_mode = 'wb'
-            open_file = gzip.open
-        else:
-            write_mode = 'w'
-            open_file = open
-
-        with open_file(mol2_outpath, write_mode) as f:
-            if verbose:
-                start = time.time()
-
-            if includelist_filter:
-
-                if write_mode == 'w':
-                    for idx, mol2 in enumerate(split_multimol2(mol2_file)):
-
-                        if mol2[0] in ids:
-                            f.write(''.join(mol2[1]))
-                else:
-                    for idx, mol2 in enumerate(split_multimol2(mol2_file)):
-
-                        if mol2[0].decode('utf-8') in ids:
-                            f.write(b''.join(mol2[1]))
-
-            else:
-                if write_mode == 'w':
-                    for idx, mol2 in enumerate(split_multimol2(mol2_file)):
-                        if mol2[0] not in ids:
-                            f.write(''.join(mol2[1]))
-                else:
-                    for idx, mol2 in enumerate(split_multimol2(mol2_file)):
-                        if mol2[0].decode('utf-8') not in ids:
-                            f.write(b''.join(mol2[1]))
-            if verbose:
-                elapsed = time.time() - start
-                n_molecules = idx + 1
-                sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
-                                 (n_molecules, n_molecules / elapsed))
-                sys.stdout.flush()
-
-
-
-def main(input_dir, id_file_path, output_dir, includelist_filter, verbose):
+def main(input_dir, id_file_path, output_dir, includelist_filter, verbose,
+         use_mmap, bgzf, n_cpus=1, bloom=False):
+    n_cpus = get_num_cpus(n_cpus)
     mol2_files = get_mol2_files(dir_path=input_dir)
-    ids = read_idfile(id_file_path)
-
-    filter_and_write(mol2_files=mol2_files,
-                     ids=ids,
-                     output_dir=output_dir,
-                     includelist_filter=includelist_filter,
-                     verbose=verbose)
+    if is_selection_file(id_file_path):
+        ids = read_selection(id_file_path)
+    else:
+        ids = read_idfile(id_file_path, bloom=bloom)
+
+    if n_cpus > 1:
+        filter_and_write_parallel(mol2_files=mol2_files,
+                                  ids=ids,
+                                  output_dir=output_dir,
+                                  includelist_filter=includelist_filter,
+                                  verbose=verbose,
+                                  use_mmap=use_mmap,
+                                  bgzf=bgzf,
+                                  n_cpus=n_cpus)
+    else:
+        filter_and_write(mol2_files=mol2_files,
+                         ids=ids,
+                         output_dir=output_dir,
+                         includelist_filter=includelist_filter,
+                         verbose=verbose,
+                         use_mmap=use_mmap,
+                         bgzf=bgzf)
     if verbose:
         print('Finished')
 
@@ -156,7 +108,8 @@ python id_to_mol2.py --input mol2_dir/\\
                         type=str,
                         required=True,
                         help='(Required.) Input ID file that contains molecule'
-                             '\nIDs (one ID per line).')
+                             '\nIDs (one ID per line), or a selection file'
+                             '\n(`.sel`) created from the input MOL2 files.')
     parser.add_argument('-o', '--output',
                         type=str,
                         required=True,
@@ -167,6 +120,49 @@ python id_to_mol2.py --input mol2_dir/\\
                         default=True,
                         help='(Optional, default: `True`.) Uses ID file as includelist if True (default).'
                         '\nUses ID file as excludelist if False.')
+    parser.add_argument('--mmap',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, memory-maps'
+                             '\nuncompressed `.mol2` input files and copies the'
+                             '\nselected molecules to the output without'
+                             '\nintermediate Python strings. Has no effect on'
+                             '\n`.mol2.gz` files.')
+    parser.add_argument('--bgzf',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, `.mol2.gz`'
+                             '\noutput files are written as independently'
+                             '\ncompressed blocks (BGZF) that remain valid'
+                             '\ngzip files but can be decompressed in parallel'
+                             '\nand support random access.')
+    parser.add_argument('--bloom',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, checks the'
+                             '\nraw ID of each molecule against a Bloom filter'
+                             '\nof the ID file before the exact lookup, which'
+                             '\nrejects most molecules that are not in the'
+                             '\nID file after a single probe. Speeds up'
+                             '\nfiltering with very large ID files (such as'
+                             '\nlarge excludelists) that match few molecules.'
+                             '\nThe filter is built on the first run and'
+                             '\nsaved next to the ID file (`<id_file>.bloom`).'
+                             '\nHas no effect on selection files.')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Number of processes to'
+                             ' run in parallel.'
+                             '\nIf processes > 0, the specified number of CPUs'
+                             '\nwill be used.'
+                             '\nIf processes = 0, all available CPUs will'
+                             '\nbe used.'
+                             '\nIf processes = -1, all available CPUs'
+                             '\nminus `processes` will be used.'
+                             '\nInput files and byte ranges of large input'
+                             '\nfiles are processed in parallel; the output'
+                             '\nfiles are identical to those of a serial run.')
     parser.add_argument('-v', '--verbose',
                         type=int,
                         default=1,
@@ -183,4 +179,8 @@ python id_to_mol2.py --input mol2_dir/\\
          id_file_path=args.id_file,
          output_dir=args.output,
          includelist_filter=args.includelist,
-         verbose=args.verbose)
+         verbose=args.verbose,
+         use_mmap=args.mmap,
+         bgzf=args.bgzf,
+         n_cpus=args.processes,
+         bloom=args.bloom)
@@ -0,0 +1,149 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+import argparse
+import os
+import sys
+import time
+
+from _mol2_files import get_mol2_files
+from _mol2_index import build_index
+from _mol2_index import index_path
+from _type_index import build_type_index
+from _type_index import type_index_path
+
+
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
+def index_files(mol2_files, verbose, atom_types=False):
+    for mol2_file in mol2_files:
+        if verbose:
+            start = time.time()
+            sys.stdout.write('Indexing %s' % os.path.basename(mol2_file))
+            sys.stdout.flush()
+
+        n_molecules = build_index(mol2_file)
+
+        if verbose:
+            elapsed = time.time() - start
+            sys.stdout.write(' | indexed %d molecules | %d mol/sec'
+                             ' | %s\n' %
+                             (n_molecules, n_molecules / elapsed,
+                              os.path.basename(index_path(mol2_file))))
+            sys.stdout.flush()
+
+        if atom_types:
+            index_atom_types(mol2_file, verbose)
+
+
+def index_atom_types(mol2_file, verbose):
+    if verbose:
+        start = time.time()
+        sys.stdout.write('Indexing atom types of %s' %
+                         os.path.basename(mol2_file))
+        sys.stdout.flush()
+
+    n_molecules = build_type_index(mol2_file)
+
+    if verbose:
+        elapsed = time.time() - start
+        sys.stdout.write(' | indexed %d molecules | %d mol/sec | %s\n' %
+                         (n_molecules, n_molecules / elapsed,
+                          os.path.basename(type_index_path(mol2_file))))
+        sys.stdout.flush()
+
+
+def main(input_dir, verbose, atom_types=False):
+    mol2_files = get_mol2_files(dir_path=input_dir)
+    index_files(mol2_files=mol2_files, verbose=verbose,
+                atom_types=atom_types)
+    if verbose:
+        print('Finished')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description='Creates byte-offset index files (`.mol2.idx`)'
+                        '\nnext to MOL2 files for random access to'
+                        '\nindividual molecules. The index stores the ID,'
+                        '\nordinal, byte offset, length, atom count,'
+                        '\nand bond count of each molecule.'
+                        '\nIndexes are used automatically by `id_to_mol2.py`,'
+                        '\n`sort_rocs_mol2.py`, and'
+                        ' `funcgroup_matching_selection.py`'
+                        '\nand ignored once the MOL2 file was modified.',
+            epilog="""Example:
+python index_mol2.py --input mol2_dir/
+
+python index_mol2.py --input mol2_dir/ --atom_types True""",
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-i', '--input',
+                        type=str,
+                        required=True,
+                        help='(Required.) Input `.mol2` or `.mol2.gz` file,'
+                             '\nor a directory of MOL2 files.')
+    parser.add_argument('--atom_types',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, also'
+                             '\ncreates atom type index files'
+                             ' (`.mol2.types`)'
+                             '\nthat store the ID and a bitmask of the atom'
+                             '\ntypes of each molecule.'
+                             '\n`funcgroup_presence_to_id.py` answers'
+                             '\nselections that only refer to `atom_type`'
+                             '\nfrom these files without reading the'
+                             '\nMOL2 files.')
+    parser.add_argument('-v', '--verbose',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Verbosity level. If 0, does not print any'
+                             '\noutput.'
+                             '\nIf 1 (default), prints the file currently'
+                             '\nprocessing.')
+
+    parser.add_argument('--version', action='version', version='v. 1.0')
+
+    args = parser.parse_args()
+
+    main(input_dir=args.input,
+         verbose=args.verbose,
+         atom_types=args.atom_types)
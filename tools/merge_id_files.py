@@ -31,31 +31,54 @@
 
 
 import argparse
+from itertools import chain
 
+import numpy as np
 
-def read_idfile(id_file_path):
-    with open(id_file_path, 'r') as f:
-        ids = {line.strip() for line in f if not line.startswith('#')}
-    return ids
+from _id_merge import combine_idfiles
+from _id_set import IdSet, iter_idfile_blocks
 
 
-def main(id_file_path_1, id_file_path_2, output_path):
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
 
-    cache = set()
-    with open(output_path, 'w') as ofile:
-        with open(id_file_path_1, 'r') as f1:
-            for line in f1:
-                line = line.strip()
-                if not line.startswith('#') and line not in cache:
-                    ofile.write('%s\n' % line)
-                    cache.add(line)
-        with open(id_file_path_2, 'r') as f2:
-            for line in f2:
-                line = line.strip()
-                if not line.startswith('#') and line not in cache:
-                    ofile.write('%s\n' % line)
-                    cache.add(line)
 
+def main(id_file_path_1, id_file_path_2, output_path, sort_ids=False):
+
+    if sort_ids:
+        combine_idfiles([id_file_path_1, id_file_path_2], output_path,
+                        'union')
+        return
+
+    # Collect the IDs of both files in a compact `IdSet`, then write
+    # the first occurrence of each ID by marking its position in `seen`
+    # instead of caching all IDs in a Python set. Blank lines (written
+    # once, like any other line) use the extra last entry of `seen`.
+    ids = IdSet.from_blocks(chain(iter_idfile_blocks(id_file_path_1),
+                                  iter_idfile_blocks(id_file_path_2)))
+    seen = np.zeros(len(ids) + 1, dtype=bool)
+    with open(output_path, 'wb') as ofile:
+        for path in (id_file_path_1, id_file_path_2):
+            for block in iter_idfile_blocks(path):
+                lines = list(map(bytes.strip, block.splitlines()))
+                if b'#' in block:
+                    lines = [line for line in lines
+                             if not line.startswith(b'#')]
+                if not lines:
+                    continue
+                positions = ids.index_many(lines)
+                positions[positions < 0] = len(ids)
+                _, first = np.unique(positions, return_index=True)
+                first = np.sort(first)
+                first = first[~seen[positions[first]]]
+                seen[positions[first]] = True
+                ofile.write(b''.join(lines[i] + b'\n'
+                                     for i in first.tolist()))
 
 if __name__ == '__main__':
 
@@ -63,7 +86,8 @@ if __name__ == '__main__':
             description="""Merges two Molecule ID files
 (e.g., created via `datatable_to_id.py`, `funcgroup_presence_to_id.py`
  or `mol2_to_id.py`) into a single ID file
- while preventing duplicate entries.""",
+ while preventing duplicate entries. See `combine_id_files.py`
+ for other set operations and more than two input files.""",
             epilog="""Example:
 python merge_id_files.py\\
    --input1 mol2s_1.txt\\
@@ -85,6 +109,14 @@ python merge_id_files.py\\
                         type=str,
                         required=True,
                         help='(Required.) Path to the output ID file.')
+    parser.add_argument('--sorted',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If False, IDs are written'
+                             '\nin input order (first occurrence). If True,'
+                             '\nIDs are written in sorted order, and the input'
+                             '\nfiles are merged externally with bounded'
+                             '\nmemory (see `combine_id_files.py`).')
 
     parser.add_argument('--version', action='version', version='v. 1.0')
 
@@ -92,4 +124,5 @@ python merge_id_files.py\\
 
     main(id_file_path_1=args.input1,
          id_file_path_2=args.input2,
-         output_path=args.output)
+         output_path=args.output,
+         sort_ids=args.sorted)
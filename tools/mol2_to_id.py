@@ -34,29 +34,53 @@ import argparse
 import os
 import sys
 import time
+from itertools import islice
+from multiprocessing import Pool
+from multiprocessing import cpu_count
 
-from biopandas.mol2.mol2_io import split_multimol2
+import numpy as np
 
+from _mol2_files import Mol2File
+from _mol2_files import Mol2Shard
+from _mol2_files import get_mol2_files
+from _mol2_files import plan_shards
+from _mol2_index import load_index
+from _mol2_reader import iter_mol2_ids
 
-def get_mol2_files(dir_path):
 
-    files = []
+MIN_SHARD_SIZE = 1 << 24
+SHARDS_PER_PROCESS = 4
+WRITE_BATCH_SIZE = 10000
 
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
 
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
+def iter_shard_ids(shard):
+    """Yields the molecule IDs of a `Mol2Shard`, taken from the
+    `.mol2.idx` sidecar if available."""
+    index = load_index(shard.path)
+    if index is None:
+        for mol2_id in iter_mol2_ids(shard.path, shard.start, shard.stop):
+            yield mol2_id
+        return
+    offsets = index.records['offset']
+    first = np.searchsorted(offsets, shard.start)
+    last = (len(index) if shard.stop is None
+            else np.searchsorted(offsets, shard.stop))
+    for mol2_id in index.ids[first:last]:
+        yield mol2_id
 
-    return files
+
+def read_shard_ids(shard):
+    """Returns the molecule IDs of a `Mol2Shard` as a list."""
+    return list(iter_shard_ids(shard))
+
+
+def write_ids(f, ids):
+    if ids:
+        f.write(b'\n'.join(ids) + b'\n')
 
 
 def mol2_to_idfile(mol2_files, id_file_path, verbose=0):
-    with open(id_file_path, 'w') as f:
+    with open(id_file_path, 'wb') as f:
         for mol2_file in mol2_files:
 
             if verbose:
@@ -64,22 +88,85 @@ def mol2_to_idfile(mol2_files, id_file_path, verbose=0):
                 sys.stdout.flush()
                 start = time.time()
 
-            for idx, mol2 in enumerate(split_multimol2(mol2_file)):
-                f.write(mol2[0] + '\n')
+            n_molecules = 0
+            ids = iter_shard_ids(Mol2Shard(mol2_file, 0, None))
+            while True:
+                batch = list(islice(ids, WRITE_BATCH_SIZE))
+                if not batch:
+                    break
+                write_ids(f, batch)
+                n_molecules += len(batch)
 
             if verbose:
                 elapsed = time.time() - start
-                n_molecules = idx + 1
                 sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
                                  (n_molecules, n_molecules / elapsed))
                 sys.stdout.flush()
 
 
-def main(input_dir, output_file, verbose):
+def mol2_to_idfile_parallel(mol2_files, id_file_path, verbose=0, n_cpus=1):
+    """Like `mol2_to_idfile`, but reads the input files, and byte ranges
+    of large input files, in `n_cpus` processes. The IDs are written in
+    the same order as by `mol2_to_idfile`."""
+    files = [Mol2File(p, os.path.getsize(p), None) for p in mol2_files]
+    shard_size = max(MIN_SHARD_SIZE,
+                     sum(f.size for f in files) // (SHARDS_PER_PROCESS * n_cpus))
+    rank = {path: i for i, path in enumerate(mol2_files)}
+    shards = sorted(plan_shards(files, shard_size=shard_size),
+                    key=lambda s: (rank[s.path], s.start))
+
+    if verbose:
+        start = time.time()
+
+    remaining = {}
+    for shard in shards:
+        remaining[shard.path] = remaining.get(shard.path, 0) + 1
+    scanned = dict.fromkeys(remaining, 0)
+
+    pool = Pool(processes=n_cpus)
+    try:
+        with open(id_file_path, 'wb') as f:
+            for shard, ids in zip(shards, pool.imap(read_shard_ids, shards)):
+                write_ids(f, ids)
+                scanned[shard.path] += len(ids)
+                remaining[shard.path] -= 1
+                if verbose and not remaining[shard.path]:
+                    sys.stdout.write('Processed %s | scanned %d molecules\n' %
+                                     (os.path.basename(shard.path),
+                                      scanned[shard.path]))
+                    sys.stdout.flush()
+    finally:
+        pool.close()
+        pool.join()
+
+    if verbose:
+        elapsed = time.time() - start
+        n_molecules = sum(scanned.values())
+        sys.stdout.write('Total | scanned %d molecules | %d mol/sec\n' %
+                         (n_molecules, n_molecules / elapsed))
+        sys.stdout.flush()
+
+
+def get_num_cpus(n_cpus):
+    if not n_cpus:
+        n_cpus = cpu_count()
+    elif n_cpus < 0:
+        n_cpus = cpu_count() - n_cpus
+    return n_cpus
+
+
+def main(input_dir, output_file, verbose, n_cpus=1):
+    n_cpus = get_num_cpus(n_cpus)
     mol2_files = get_mol2_files(dir_path=input_dir)
-    mol2_to_idfile(mol2_files=mol2_files,
-                   id_file_path=output_file,
-                   verbose=verbose)
+    if n_cpus > 1:
+        mol2_to_idfile_parallel(mol2_files=mol2_files,
+                                id_file_path=output_file,
+                                verbose=verbose,
+                                n_cpus=n_cpus)
+    else:
+        mol2_to_idfile(mol2_files=mol2_files,
+                       id_file_path=output_file,
+                       verbose=verbose)
     if verbose:
         print('Finished')
 
@@ -104,6 +191,20 @@ python mol2_to_id.py\\
                         required=True,
                         help='(Required.) Output path for the ID file.'
                              ' For example, `ids.txt`.')
+    parser.add_argument('--processes',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Number of processes to'
+                             ' run in parallel.'
+                             '\nIf processes > 0, the specified number of CPUs'
+                             '\nwill be used.'
+                             '\nIf processes = 0, all available CPUs will'
+                             '\nbe used.'
+                             '\nIf processes = -1, all available CPUs'
+                             '\nminus `processes` will be used.'
+                             '\nInput files and byte ranges of large input'
+                             '\nfiles are read in parallel; the IDs are'
+                             '\nwritten in the same order as in a serial run.')
     parser.add_argument('-v', '--verbose',
                         type=int,
                         default=1,
@@ -117,4 +218,4 @@ python mol2_to_id.py\\
 
     args = parser.parse_args()
 
-    main(args.input, args.output, args.verbose)
+    main(args.input, args.output, args.verbose, args.processes)
@@ -0,0 +1,232 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+import argparse
+import os
+import sys
+import time
+from itertools import islice
+
+import numpy as np
+
+from _mol2_files import get_mol2_files
+from _mol2_index import load_index
+from _mol2_parser import atom_block
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import record_counts
+from _selection import open_id_output
+
+
+WRITE_BATCH_SIZE = 10000
+
+
+def parse_range_string(s):
+    if s is None:
+        return None
+    if '-' not in s:
+        raise ValueError('Ranges must be formatted as'
+                         ' "lowerbound-upperbound", for example, 10-50.'
+                         ' Got %s' % s)
+    lower, upper = [p.strip() for p in s.split('-', 1)]
+    return (int(lower) if lower else 0,
+            int(upper) if upper else np.iinfo(np.int64).max)
+
+
+def in_range(value, value_range):
+    return value_range is None or value_range[0] <= value <= value_range[1]
+
+
+def count_heavy_atoms(record):
+    n_heavy = 0
+    for line in atom_block(record).split(b'\n'):
+        fields = line.split()
+        if len(fields) > 5 and not (fields[5] == b'H' or
+                                    fields[5].startswith(b'H.')):
+            n_heavy += 1
+    return n_heavy
+
+
+def filter_index(mol2_file, index, atoms, bonds, heavy_atoms):
+    mask = np.ones(len(index), dtype=bool)
+    for column, value_range in (('n_atoms', atoms), ('n_bonds', bonds)):
+        if value_range is not None:
+            values = index.records[column]
+            mask &= (values >= value_range[0]) & (values <= value_range[1])
+    if heavy_atoms is not None:
+        # only read the records that pass the atom and bond ranges
+        ordinals = np.flatnonzero(mask).tolist()
+        for i, _, record in index.iter_records(mol2_file, ordinals,
+                                               use_mmap=True):
+            if not in_range(count_heavy_atoms(record), heavy_atoms):
+                mask[i] = False
+    return [mol2_id if selected else None
+            for mol2_id, selected in zip(index.ids, mask.tolist())]
+
+
+def filter_records(mol2_file, atoms, bonds, heavy_atoms):
+    for mol2_id, record in iter_mol2_records(mol2_file):
+        n_atoms, n_bonds = record_counts(record)
+        if not (in_range(n_atoms, atoms) and in_range(n_bonds, bonds)):
+            yield None
+        elif (heavy_atoms is not None and
+                not in_range(count_heavy_atoms(record), heavy_atoms)):
+            yield None
+        else:
+            yield mol2_id
+
+
+def read_and_write(mol2_files, id_file_path, atoms, bonds, heavy_atoms,
+                   verbose):
+
+    with open_id_output(id_file_path, mol2_files) as f:
+
+        for mol2_file in mol2_files:
+            if verbose:
+                start = time.time()
+                sys.stdout.write('Processing %s' %
+                                 os.path.basename(mol2_file))
+                sys.stdout.flush()
+
+            index = load_index(mol2_file)
+            if index is not None:
+                results = filter_index(mol2_file, index, atoms, bonds,
+                                       heavy_atoms)
+                f.write(mol2_file, results)
+                n_molecules = len(results)
+            else:
+                n_molecules = 0
+                results = filter_records(mol2_file, atoms, bonds, heavy_atoms)
+                while True:
+                    chunk = list(islice(results, WRITE_BATCH_SIZE))
+                    if not chunk:
+                        break
+                    f.write(mol2_file, chunk)
+                    n_molecules += len(chunk)
+
+            if verbose:
+                elapsed = time.time() - start
+                sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
+                                 (n_molecules, n_molecules / elapsed))
+                sys.stdout.flush()
+
+
+def main(input_dir, output_file, atoms, bonds, heavy_atoms, verbose):
+    if atoms is None and bonds is None and heavy_atoms is None:
+        raise ValueError('Please provide at least one of --atoms, --bonds,'
+                         ' or --heavy_atoms.')
+
+    dirpath = os.path.dirname(output_file)
+    if dirpath and not os.path.exists(dirpath):
+        os.mkdir(dirpath)
+
+    mol2_files = get_mol2_files(dir_path=input_dir)
+    read_and_write(mol2_files=mol2_files,
+                   id_file_path=output_file,
+                   atoms=atoms,
+                   bonds=bonds,
+                   heavy_atoms=heavy_atoms,
+                   verbose=verbose)
+    if verbose:
+        print('Finished')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description='Selects molecules by their number of atoms and'
+                        ' bonds and writes their IDs to a text file.'
+                        '\nAtom and bond counts are read from the'
+                        ' MOLECULE header of each record,'
+                        '\nor from the `.mol2.idx` sidecar created via'
+                        ' `index_mol2.py` if available,'
+                        '\nwithout parsing the ATOM and BOND sections.',
+            epilog="""Example:
+python molsize_to_id.py\\
+   --input mol2_dir\\
+   --output ids.txt\\
+   --heavy_atoms 10-40\\
+   --bonds -60""",
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-i', '--input',
+                        type=str,
+                        required=True,
+                        help='(Required.) Input `.mol2` or `.mol2.gz` file,'
+                             '\nor a directory of MOL2 files.')
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=True,
+                        help='(Required.) Output path for the ID file.'
+                             '\nFor example, `ids.txt`. If the path ends with'
+                             '\n`.sel`, writes a selection file (a bitmap over'
+                             '\nthe molecules of the input MOL2 files) instead.')
+    parser.add_argument('--atoms',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: `None`.) Range of the total'
+                             '\nnumber of atoms formatted as'
+                             '\n"lowerbound-upperbound" (inclusive),'
+                             '\nfor example, 10-50. Either bound may be'
+                             '\nomitted, for example, `-50` or `10-`.')
+    parser.add_argument('--heavy_atoms',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: `None`.) Range of the number'
+                             '\nof non-hydrogen atoms; same format as'
+                             '\n`--atoms`. Hydrogens are not counted in the'
+                             '\nMOLECULE header, so this option scans the'
+                             '\natom types of records that pass the'
+                             '\n`--atoms` and `--bonds` ranges (only these'
+                             '\nrecords are read if an index is available).')
+    parser.add_argument('--bonds',
+                        type=str,
+                        default=None,
+                        help='(Optional, default: `None`.) Range of the number'
+                             '\nof bonds; same format as `--atoms`.')
+    parser.add_argument('-v', '--verbose',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Verbosity level. If 0,'
+                             ' does not print any output.'
+                             '\nIf 1 (default), prints the file currently'
+                             ' processing.')
+
+    parser.add_argument('--version', action='version', version='v. 1.0')
+
+    args = parser.parse_args()
+
+    main(input_dir=args.input,
+         output_file=args.output,
+         atoms=parse_range_string(args.atoms),
+         bonds=parse_range_string(args.bonds),
+         heavy_atoms=parse_range_string(args.heavy_atoms),
+         verbose=args.verbose)
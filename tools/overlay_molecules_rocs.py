@@ -35,6 +35,7 @@ import sys
 import argparse
 from multiprocessing import cpu_count
 from biopandas.mol2.mol2_io import split_multimol2
+from _mol2_files import get_mol2_files
 
 
 def check_query(query_path):
@@ -59,23 +60,6 @@ def get_num_cpus(n_cpus):
     return n_cpus
 
 
-def get_mol2_files(dir_path):
-
-    files = []
-
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
-
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
-
-
 def run_rocs(source_file, target_file, n_processes, settings):
 
     prefix = ''.join(target_file.split('.mol2')[:-1])
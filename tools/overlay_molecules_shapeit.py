@@ -34,6 +34,7 @@ import subprocess
 import sys
 import argparse
 from biopandas.mol2.mol2_io import split_multimol2
+from _mol2_files import get_mol2_files
 
 
 def check_query(query_path):
@@ -50,23 +51,6 @@ def check_query(query_path):
                              % (n_ids, n_unique_ids))
 
 
-def get_mol2_files(dir_path):
-
-    files = []
-
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
-
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
-
-
 def run_shapeit(source_file, target_file, settings):
 
     prefix = ''.join(target_file.split('.mol2')[:-1])
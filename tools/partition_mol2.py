@@ -0,0 +1,226 @@
+# Sebastian Raschka 2017
+#
+# screenlamp is a Python toolkit
+# for hypothesis-driven virtual screening.
+#
+# Copyright (C) 2017 Michigan State University
+# License: Apache v2
+#
+# Software author: Sebastian Raschka <http://sebastianraschka.com>
+# Software author email: mail@sebastianraschka.com
+#
+# Software source repository: https://github.com/rasbt/screenlamp
+# Documentation: https://psa-lab.github.io/screenlamp
+#
+# screenlamp was developed in the
+# Protein Structural Analysis & Design Laboratory
+# (http://www.kuhnlab.bmb.msu.edu)
+#
+# If you are using screenlamp in your research, please cite
+# the following journal article:
+#
+# Raschka, Sebastian,  Anne M. Scott, Nan Liu,
+#   Santosh Gunturu, Mar Huertas, Weiming Li,
+#   and Leslie A. Kuhn. 2017
+#
+# Enabling the hypothesis-driven prioritization of
+#   ligand candidates in big databases:
+#   Screenlamp and its application to GPCR inhibitor
+#   discovery for invasive species control.
+#
+
+
+import argparse
+import heapq
+import os
+import sys
+import time
+
+import numpy as np
+
+from _mol2_files import get_mol2_files
+from _mol2_index import load_index
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import open_mol2_output
+from _mol2_reader import record_counts
+
+
+def str2bool(v):
+    if v.lower() in ('yes', 'true', 't', 'y', '1'):
+        return True
+    if v.lower() in ('no', 'false', 'f', 'n', '0'):
+        return False
+    else:
+        raise argparse.ArgumentTypeError('Boolean value expected.')
+
+
+def iter_ids_and_atoms(mol2_file):
+    index = load_index(mol2_file)
+    if index is not None:
+        for mol2_id, n_atoms in zip(index.ids, index.records['n_atoms']):
+            yield mol2_id, int(n_atoms)
+    else:
+        for mol2_id, record in iter_mol2_records(mol2_file):
+            yield mol2_id, record_counts(record)[0]
+
+
+def get_group_weights(mol2_files, verbose):
+    """Returns the total atom count of each group of consecutive
+    molecules that share the same ID (for example, conformers), in
+    input order."""
+    weights = []
+    prev_id = None
+    for mol2_file in mol2_files:
+        if verbose:
+            start = time.time()
+            sys.stdout.write('Scanning %s' % os.path.basename(mol2_file))
+            sys.stdout.flush()
+
+        n_molecules = 0
+        for n_molecules, (mol2_id, n_atoms) in enumerate(
+                iter_ids_and_atoms(mol2_file), 1):
+            if mol2_id == prev_id:
+                weights[-1] += n_atoms
+            else:
+                weights.append(n_atoms)
+                prev_id = mol2_id
+
+        if verbose:
+            elapsed = time.time() - start
+            sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
+                             (n_molecules, n_molecules / elapsed))
+            sys.stdout.flush()
+
+    return np.array(weights, dtype=np.int64)
+
+
+def assign_groups(weights, n_partitions):
+    """Assigns groups to partitions, largest group first, always to the
+    partition with the smallest total atom count so far."""
+    assignment = np.empty(len(weights), dtype=np.int32)
+    totals = [(0, p) for p in range(n_partitions)]
+    for group in np.argsort(-weights, kind='stable'):
+        total, partition = heapq.heappop(totals)
+        assignment[group] = partition
+        heapq.heappush(totals, (total + int(weights[group]), partition))
+    return assignment
+
+
+def write_partitions(mol2_files, assignment, out_paths, verbose, bgzf):
+    outfiles = [open_mol2_output(p, bgzf=bgzf) for p in out_paths]
+    try:
+        group = -1
+        prev_id = None
+        for mol2_file in mol2_files:
+            if verbose:
+                start = time.time()
+                sys.stdout.write('Writing %s' % os.path.basename(mol2_file))
+                sys.stdout.flush()
+
+            n_molecules = 0
+            for n_molecules, (mol2_id, record) in enumerate(
+                    iter_mol2_records(mol2_file), 1):
+                if mol2_id != prev_id:
+                    group += 1
+                    prev_id = mol2_id
+                outfiles[assignment[group]].write(record)
+
+            if verbose:
+                elapsed = time.time() - start
+                sys.stdout.write(' | scanned %d molecules | %d mol/sec\n' %
+                                 (n_molecules, n_molecules / elapsed))
+                sys.stdout.flush()
+    finally:
+        for f in outfiles:
+            f.close()
+
+
+def main(input_dir, output_dir, n_partitions, prefix, bgzf, verbose):
+    if n_partitions < 1:
+        raise ValueError('--n_partitions must be at least 1.')
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+
+    mol2_files = get_mol2_files(input_dir)
+    weights = get_group_weights(mol2_files, verbose)
+    assignment = assign_groups(weights, n_partitions)
+
+    suffix = '.mol2.gz' if bgzf else '.mol2'
+    out_paths = [os.path.join(output_dir, '%s_%d%s' % (prefix, p + 1, suffix))
+                 for p in range(n_partitions)]
+    write_partitions(mol2_files, assignment, out_paths, verbose, bgzf)
+
+    if verbose:
+        totals = np.bincount(assignment, weights=weights,
+                             minlength=n_partitions)
+        for path, total in zip(out_paths, totals):
+            sys.stdout.write('%s : %d atoms\n' % (os.path.basename(path),
+                                                   total))
+        print('Finished')
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description='Redistributes the molecules in MOL2 files into'
+                        ' a given number of MOL2 files (partitions)'
+                        '\nwith approximately equal total numbers of atoms.'
+                        ' Consecutive molecules with'
+                        '\nthe same ID (for example, conformers) are'
+                        ' always written to the same partition,'
+                        '\nand molecules keep their relative input order'
+                        ' within a partition.',
+            epilog="""Example:
+python partition_mol2.py -i mol2_dir/\\
+   --output partitions/\\
+   --n_partitions 16""",
+            formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('-i', '--input',
+                        required=True,
+                        type=str,
+                        help='(Required.) Path to a `.mol2` or `.mol2.gz`file,'
+                             '\nor a directory containing `.mol2`/`.mol2.gz`'
+                             ' files.')
+    parser.add_argument('-o', '--output',
+                        type=str,
+                        required=True,
+                        help='(Required.) Directory path for writing the'
+                             ' partitioned MOL2s.')
+    parser.add_argument('-n', '--n_partitions',
+                        type=int,
+                        required=True,
+                        help='(Required.) Number of output MOL2 files.')
+    parser.add_argument('--prefix',
+                        type=str,
+                        default='partition',
+                        help='(Optional, default: `partition`.) File name'
+                             ' prefix of the'
+                             '\noutput files; for example, `partition_1.mol2`,'
+                             '\n`partition_2.mol2`, ...')
+    parser.add_argument('--bgzf',
+                        type=str2bool,
+                        default=False,
+                        help='(Optional, default: `False`.) If True, writes'
+                             '\n`.mol2.gz` partitions as independently'
+                             '\ncompressed blocks (BGZF) that remain valid'
+                             '\ngzip files but can be decompressed in parallel'
+                             '\nand support random access.')
+    parser.add_argument('-v', '--verbose',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Verbosity level. If 0,'
+                             ' does not print any output.'
+                             '\nIf 1 (default), prints the file currently'
+                             ' processing.')
+
+    parser.add_argument('--version', action='version', version='v. 1.0')
+
+    args = parser.parse_args()
+
+    main(input_dir=args.input,
+         output_dir=args.output,
+         n_partitions=args.n_partitions,
+         prefix=args.prefix,
+         bgzf=args.bgzf,
+         verbose=args.verbose)
@@ -145,28 +145,9 @@ Step 01: SELECT MOLECULES FROM DATA TABLE
            '--input', DATATABLE_PATH,
            '--output', os.path.join(PROJECT_PATH, '01_ids_from_database.txt'),
            '--id_column', 'ZINC_ID',
-           '--selection', DATATABLE_FILTER]
-
-    print('Running command:\n%s\n' % ' '.join(cmd))
-    if incremental:
-        input('Press Enter to proceed or CTRL+C to quit')
-    subprocess.call(cmd)
-    print('\n\n')
-
-    cmd = ['python', os.path.join(SCREENLAMP_TOOLS_DIR, 'id_to_mol2.py'),
-           '--input', INPUT_MOL2_PATH,
-           '--id_file', os.path.join(PROJECT_PATH, '01_ids_from_database.txt'),
-           '--output', os.path.join(PROJECT_PATH, '01_selected-mol2s'),
-           '--includelist', 'True']
-
-    print('Running command:\n%s\n' % ' '.join(cmd))
-    if incremental:
-        input('Press Enter to proceed or CTRL+C to quit')
-    subprocess.call(cmd)
-    print('\n\nSELECTED MOL2s:')
-
-    cmd = ['python', os.path.join(SCREENLAMP_TOOLS_DIR, 'count_mol2.py'),
-           '--input', os.path.join(PROJECT_PATH, '01_selected-mol2s')]
+           '--selection', DATATABLE_FILTER,
+           '--mol2_input', INPUT_MOL2_PATH,
+           '--mol2_output', os.path.join(PROJECT_PATH, '01_selected-mol2s')]
 
     print('Running command:\n%s\n' % ' '.join(cmd))
     if incremental:
@@ -34,40 +34,50 @@ import argparse
 import sys
 import time
 import pandas as pd
-from biopandas.mol2 import split_multimol2
+from _bgzf import is_bgzf
+from _mol2_files import get_mol2_files
+from _mol2_reader import iter_mol2_records
+from _mol2_reader import open_mol2
+from _mol2_reader import replace_record_id
+from _mol2_index import load_index
+from _table_reader import FEATHER_SUFFIXES
+from _table_reader import PARQUET_SUFFIXES
+from _table_reader import read_table
 import tempfile
-import pickle
 
 
-def get_mol2_files(dir_path):
-
-    files = []
-    if os.path.isdir(dir_path):
-        for f in os.listdir(dir_path):
-            if f.endswith(('.mol2', 'mol2.gz')):
-                file_path = os.path.join(dir_path, f)
-                files.append(file_path)
-
-    elif (os.path.isfile(dir_path) and
-          dir_path.endswith(('.mol2', 'mol2.gz'))):
-        files.append(dir_path)
-
-    return files
+REPORT_SUFFIXES = PARQUET_SUFFIXES + FEATHER_SUFFIXES
 
 
 def parse_selection_string(s, df_name='df'):
     return s.replace('(', '(%s.' % df_name)
 
 
+def find_report(mol2_path):
+    """Returns the path of the ROCS report of a hits file: the `.rpt`
+    table if it exists, or otherwise a Parquet or Feather file of the
+    same name."""
+    dirname, base = os.path.split(mol2_path)
+    base = base.replace('_hits_', '_')
+    report_path = os.path.join(dirname, base.replace('.mol2', '.rpt'))
+    if not os.path.isfile(report_path):
+        stem = os.path.join(dirname, base.split('.mol2')[0])
+        for suffix in REPORT_SUFFIXES:
+            if os.path.isfile(stem + suffix):
+                return stem + suffix
+    return report_path
+
+
 def read_and_write(inp_mol2_path, report_path, output_dir, query_path,
-                   sortby, separator, verbose, id_suffix, selection):
+                   sortby, separator, verbose, id_suffix, selection,
+                   n_threads=1):
 
     if verbose:
         sys.stdout.write('Processing %s' % os.path.basename(inp_mol2_path))
         sys.stdout.flush()
 
-    df = pd.read_table(report_path, usecols=['Name', 'ShapeQuery'] + sortby,
-                       sep=separator)
+    df = read_table(report_path, columns=['Name', 'ShapeQuery'] + sortby,
+                    sep=separator, n_threads=n_threads)
 
     if sortby:
         df.sort_values(sortby, inplace=True, ascending=False)
@@ -84,63 +94,72 @@ def read_and_write(inp_mol2_path, report_path, output_dir, query_path,
     query_mol2s = {}
 
     multiconf_query = False
-    for idx, cont in enumerate(split_multimol2(query_path)):
+    for idx, cont in enumerate(iter_mol2_records(query_path)):
         if idx >= 1:
             multiconf_query = True
             break
 
     cnt = -1
 
-    if query_path.endswith('.gz'):
-        for id_, cont in split_multimol2(query_path):
-            cnt += 1
-            cont = b''.join(cont).decode('utf-8').split('\n')
-            if multiconf_query:
-                mol_idx = '%s_%d' % (id_.decode('utf-8'), cnt)
-            else:
-                mol_idx = id_
-            if mol_idx in query_names:
-                if id_suffix:
-                    cont[1] = mol_idx + '\n'
-                query_mol2s[mol_idx] = ''.join(cont)
-
-    else:
-        for id_, cont in split_multimol2(query_path):
-            cnt += 1
-            if multiconf_query:
-                mol_idx = '%s_%d' % (id_, cnt)
-            else:
-                mol_idx = id_
-            if mol_idx in query_names:
-                if id_suffix:
-                    cont[1] = mol_idx + '\n'
-                query_mol2s[mol_idx] = ''.join(cont)
+    for id_, cont in iter_mol2_records(query_path):
+        cnt += 1
+        id_ = id_.decode('utf-8')
+        if multiconf_query:
+            mol_idx = '%s_%d' % (id_, cnt)
+        else:
+            mol_idx = id_
+        if mol_idx in query_names:
+            if id_suffix:
+                cont = replace_record_id(cont, mol_idx.encode('utf-8'))
+            query_mol2s[mol_idx] = cont
 
     out_path_base = os.path.join(output_dir, os.path.basename(inp_mol2_path)
                                  .split('.mol2')[0])
     out_path_q = '%s_%s' % (out_path_base, 'query.mol2')
     out_path_d = '%s_%s' % (out_path_base, 'dbase.mol2')
 
-    with tempfile.TemporaryDirectory() as tmpdirname:
-        for id_, cont in split_multimol2(inp_mol2_path):
-            if id_:
-                tmp_path = os.path.join(tmpdirname, id_)
-                with open(tmp_path, 'wb') as f:
-                    pickle.dump(''.join(cont), f)
-
-        with open(out_path_d, 'w') as dof,\
-                open(out_path_q, 'w') as qof:
+    # records are fetched in score order, so the index is only used for
+    # files that support direct seeks; regular gzip files would be
+    # decompressed again from the start for every backward seek
+    index = None
+    if not inp_mol2_path.endswith('.gz') or is_bgzf(inp_mol2_path):
+        index = load_index(inp_mol2_path)
+    if index is not None:
+        with open(out_path_d, 'wb') as dof,\
+                open(out_path_q, 'wb') as qof,\
+                open_mol2(inp_mol2_path) as inp:
 
             if verbose:
                 start = time.time()
 
+            ordinals = {mol2_id.decode('utf-8'): i
+                        for i, mol2_id in enumerate(index.ids)}
             cnt = 0
             for d, q in dbase_query_pairs:
                 cnt += 1
                 qof.write(query_mol2s[q])
-                with open(os.path.join(tmpdirname, d), 'rb') as pkl:
-                    pkl_cont = pickle.load(pkl)
-                    dof.write(pkl_cont)
+                dof.write(index.read_record(inp, ordinals[d]))
+
+    else:
+        with tempfile.TemporaryDirectory() as tmpdirname:
+            for id_, cont in iter_mol2_records(inp_mol2_path):
+                if id_:
+                    tmp_path = os.path.join(tmpdirname, id_.decode('utf-8'))
+                    with open(tmp_path, 'wb') as f:
+                        f.write(cont)
+
+            with open(out_path_d, 'wb') as dof,\
+                    open(out_path_q, 'wb') as qof:
+
+                if verbose:
+                    start = time.time()
+
+                cnt = 0
+                for d, q in dbase_query_pairs:
+                    cnt += 1
+                    qof.write(query_mol2s[q])
+                    with open(os.path.join(tmpdirname, d), 'rb') as tmp:
+                        dof.write(tmp.read())
 
     if verbose:
         elapsed = time.time() - start
@@ -151,17 +170,16 @@ def read_and_write(inp_mol2_path, report_path, output_dir, query_path,
 
 
 def main(input_dir, output_dir, query_path,
-         sortby, separator, verbose, id_suffix, selection):
+         sortby, separator, verbose, id_suffix, selection, n_threads=1):
     if not os.path.exists(output_dir):
         os.mkdir(output_dir)
     inp_mol2_paths = get_mol2_files(input_dir)
 
     for mol2_path in inp_mol2_paths:
-        base = os.path.basename(mol2_path)
-        report_path = base.replace('.mol2', '.rpt').replace('_hits_', '_')
-        report_path = os.path.join(os.path.dirname(mol2_path), report_path)
+        report_path = find_report(mol2_path)
         read_and_write(mol2_path, report_path, output_dir, query_path,
-                       sortby, separator, verbose, id_suffix, selection)
+                       sortby, separator, verbose, id_suffix, selection,
+                       n_threads=n_threads)
 
 
 if __name__ == '__main__':
@@ -217,6 +235,14 @@ python sort_rocs_mol2.py -i rocs_results/\\
                         default='\t',
                         help=('(Optional, default: `"\\t"`.) Column separator used\nin the input table.\n'
                               'Assumes tab-separated values by default.'))
+    parser.add_argument('--threads',
+                        type=int,
+                        default=1,
+                        help='(Optional, default: `1`.) Number of threads for'
+                             '\nreading the ROCS reports with the optional'
+                             '\n`pyarrow` package. Reports may also be'
+                             '\nParquet or Feather files (for example,'
+                             '\n`<name>.parquet` instead of `<name>.rpt`).')
     parser.add_argument('--id_suffix',
                         type=str,
                         default='False',
@@ -272,4 +298,5 @@ python sort_rocs_mol2.py -i rocs_results/\\
          verbose=args.verbose,
          separator=args.separator,
          id_suffix=id_suffix,
-         selection=args.selection)
+         selection=args.selection,
+         n_threads=args.threads)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the tools import their shared modules as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
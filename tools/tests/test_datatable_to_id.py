@@ -0,0 +1,31 @@
+import datatable_to_id
+
+
+def run_selection(tmp_path, selection, **kwargs):
+    table = tmp_path / 'table.txt'
+    table.write_text('ZINC_ID\tNRB\tMWT\n'
+                     'ZINC1\t5\t250.0\n'
+                     'ZINC2\t9\t300.0\n'
+                     'ZINC3\t3\t150.0\n')
+    output = tmp_path / 'ids.txt'
+    datatable_to_id.main(input_dir=str(table),
+                         output_file=str(output),
+                         verbose=0,
+                         selection=selection,
+                         id_column='ZINC_ID',
+                         **kwargs)
+    return output.read_text().split()
+
+
+def test_selection_with_and(tmp_path):
+    assert run_selection(tmp_path, '(NRB <= 7) and (MWT > 200)') == ['ZINC1']
+
+
+def test_selection_with_or_and_not(tmp_path):
+    assert (run_selection(tmp_path, 'not (NRB <= 7) or (MWT < 200)') ==
+            ['ZINC2', 'ZINC3'])
+
+
+def test_selection_with_and_on_cache(tmp_path):
+    assert (run_selection(tmp_path, '(NRB <= 7) and (MWT > 200)',
+                          use_cache=True) == ['ZINC1'])
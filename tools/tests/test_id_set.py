@@ -0,0 +1,50 @@
+import _id_set
+from _id_set import IdSet
+
+
+def test_idfile_uses_vectorized_numeric_ids(tmp_path, monkeypatch):
+    path = tmp_path / 'ids.txt'
+    path.write_bytes(b''.join(b'ZINC%08d\n' % i for i in range(1000)))
+
+    calls = []
+    numeric_key = _id_set._numeric_key
+
+    def counting_numeric_key(mol2_id):
+        calls.append(mol2_id)
+        return numeric_key(mol2_id)
+
+    monkeypatch.setattr(_id_set, '_numeric_key', counting_numeric_key)
+    builder = _id_set._IdSetBuilder()
+    builder.add_lines([line.strip() for line in
+                       path.read_bytes().split(b'\n')])
+
+    # only the first ID is parsed individually
+    assert len(calls) == 1
+    assert list(builder.numeric) == [(b'ZINC', 8)]
+    assert not builder.strings
+
+    ids = IdSet.from_idfile(str(path))
+    assert len(ids) == 1000
+    assert b'ZINC00000999' in ids
+    assert b'ZINC00001000' not in ids
+
+
+def test_idfile_skips_comments_and_empty_lines(tmp_path):
+    path = tmp_path / 'ids.txt'
+    path.write_bytes(b'# header\nZINC00000001\n\nZINC00000002\nabc\n')
+    ids = IdSet.from_idfile(str(path))
+    assert len(ids) == 3
+    assert b'abc' in ids
+    assert b'# header' not in ids
+
+
+def test_index_many(monkeypatch):
+    mol2_ids = [b'ZINC00000003', b'ZINC00000001', b'abc', b'ZINC7']
+    queries = mol2_ids + [b'ZINC00000002', b'xyz']
+    for small_set_size in (_id_set.SMALL_SET_SIZE, 0):
+        monkeypatch.setattr(_id_set, 'SMALL_SET_SIZE', small_set_size)
+        ids = IdSet(mol2_ids)
+        index = ids.index_many(queries).tolist()
+        assert index[-2:] == [-1, -1]
+        assert sorted(index[:-2]) == list(range(len(ids)))
+        assert [list(ids)[i] for i in index[:-2]] == mol2_ids
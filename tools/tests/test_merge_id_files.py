@@ -0,0 +1,13 @@
+import merge_id_files
+
+
+def test_merge_keeps_first_occurrence_order(tmp_path):
+    id_file_1 = tmp_path / 'ids_1.txt'
+    id_file_1.write_bytes(b'# header\nZINC00000003\n ZINC00000001 \n'
+                          b'ZINC00000003\n\nabc\n')
+    id_file_2 = tmp_path / 'ids_2.txt'
+    id_file_2.write_bytes(b'ZINC00000002\nabc\n\nZINC00000001\nZINC7\n')
+    output = tmp_path / 'merged.txt'
+    merge_id_files.main(str(id_file_1), str(id_file_2), str(output))
+    assert output.read_bytes() == (b'ZINC00000003\nZINC00000001\n\n'
+                                   b'abc\nZINC00000002\nZINC7\n')
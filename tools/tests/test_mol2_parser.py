@@ -0,0 +1,35 @@
+from _mol2_parser import parse_atom_block
+from _mol2_parser import parse_atom_blocks
+
+
+MIXED_WIDTH_RECORD = (b'@<TRIPOS>MOLECULE\nmol\n2 0\n'
+                      b'@<TRIPOS>ATOM\n'
+                      b' 1 C1 1.0 2.0 3.0 C.3 1 LIG1 0.1 BACKBONE\n'
+                      b' 2 O1 4.0 5.0 6.0 O.2 1 LIG1\n'
+                      b'@<TRIPOS>BOND\n')
+
+RECORD = (b'@<TRIPOS>MOLECULE\nmol\n1 0\n'
+          b'@<TRIPOS>ATOM\n'
+          b' 1 N1 7.0 8.0 9.0 N.am 1 LIG1 -0.3\n')
+
+
+def test_parse_atom_block_with_mixed_width_rows():
+    atoms = parse_atom_block(MIXED_WIDTH_RECORD,
+                             ('atom_type', 'z', 'charge'))
+    assert atoms.atom_type.tolist() == ['C.3', 'O.2']
+    assert atoms.z.tolist() == [3.0, 6.0]
+    assert atoms.charge.tolist() == [0.1, 0.0]
+
+
+def test_parse_atom_blocks_with_mixed_width_rows():
+    atoms, offsets = parse_atom_blocks([RECORD, MIXED_WIDTH_RECORD, RECORD],
+                                       ('atom_type', 'x'))
+    assert atoms.atom_type.tolist() == ['N.am', 'C.3', 'O.2', 'N.am']
+    assert atoms.x.tolist() == [7.0, 1.0, 4.0, 7.0]
+    assert offsets.tolist() == [0, 1, 3, 4]
+
+
+def test_parse_atom_blocks_with_nine_column_rows():
+    atoms, offsets = parse_atom_blocks([RECORD, RECORD], ('charge',))
+    assert atoms.charge.tolist() == [-0.3, -0.3]
+    assert offsets.tolist() == [0, 1, 2]
@@ -0,0 +1,33 @@
+import molsize_to_id
+from _mol2_index import build_index
+
+
+def mol2_record(name, atom_types):
+    atoms = b''.join(b'%2d A%d 0.0 0.0 0.0 %s 1 LIG1 0.0\n' % (i, i, t)
+                     for i, t in enumerate(atom_types, 1))
+    return (b'@<TRIPOS>MOLECULE\n%s\n%d 0\nSMALL\nNO_CHARGES\n\n'
+            b'@<TRIPOS>ATOM\n%s@<TRIPOS>BOND\n'
+            % (name, len(atom_types), atoms))
+
+
+def run_molsize(tmp_path, index, **ranges):
+    mol2 = tmp_path / 'mols.mol2'
+    mol2.write_bytes(mol2_record(b'mol1', [b'C.3', b'H', b'H']) +
+                     mol2_record(b'mol2', [b'C.3', b'O.2', b'H']) +
+                     mol2_record(b'mol3', [b'C.3', b'O.2', b'N.am', b'H']))
+    if index:
+        build_index(str(mol2))
+    output = tmp_path / 'ids.txt'
+    kwargs = dict(atoms=None, bonds=None, heavy_atoms=None)
+    kwargs.update(ranges)
+    molsize_to_id.main(input_dir=str(mol2), output_file=str(output),
+                       verbose=0, **kwargs)
+    return output.read_text().split()
+
+
+def test_heavy_atoms_with_and_without_index(tmp_path):
+    for index in (False, True):
+        assert run_molsize(tmp_path, index, atoms=(3, 3),
+                           heavy_atoms=(2, 5)) == ['mol2']
+        assert run_molsize(tmp_path, index, heavy_atoms=(1, 2)) == ['mol1',
+                                                                   'mol2']
@@ -0,0 +1,22 @@
+from _selection import SelectionWriter
+from _selection import open_id_output
+from _selection import read_selection
+
+
+def test_selection_writer_flags_matches_with_empty_ids(tmp_path):
+    path = str(tmp_path / 'out.sel')
+    with SelectionWriter(path, ['lib/a.mol2']) as f:
+        f.write('lib/a.mol2', [b'ZINC1', None, b'', None])
+
+    selection = read_selection(path)
+    assert selection.file_mask('a.mol2').tolist() == [True, False,
+                                                      True, False]
+
+
+def test_id_file_writer_skips_unmatched_and_empty_ids(tmp_path):
+    path = str(tmp_path / 'out.txt')
+    with open_id_output(path) as f:
+        f.write('a.mol2', [b'ZINC1', None, b'', b'ZINC4'])
+
+    with open(path, 'rb') as f:
+        assert f.read() == b'ZINC1\nZINC4\n'
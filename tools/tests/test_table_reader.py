@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import _table_reader
+from _table_reader import iter_table_chunks
+
+
+def write_table(path, values):
+    rows = ['ZINC%08d\t%s' % (i, value) for i, value in enumerate(values)]
+    path.write_text('ZINC_ID\tMWT\n' + '\n'.join(rows) + '\n')
+
+
+def read_threaded(path, monkeypatch):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.csv
+
+    def read_csv(*args, **kwargs):
+        raise AssertionError('the table should be streamed')
+
+    monkeypatch.setattr(_table_reader, 'BLOCK_SIZE', 1 << 10)
+    monkeypatch.setattr(pyarrow.csv, 'read_csv', read_csv)
+    chunks = list(iter_table_chunks(str(path), n_threads=2))
+    assert len(chunks) > 1
+    return pd.concat(chunks)
+
+
+def test_threaded_text_reader_with_types_changing_between_blocks(
+        tmp_path, monkeypatch):
+    path = tmp_path / 'table.txt'
+    write_table(path, ['%d' % (100 + i % 50) for i in range(1000)] +
+                ['100.50'] * 10)
+
+    expected = pd.concat(iter_table_chunks(str(path), n_threads=1))
+    result = read_threaded(path, monkeypatch)
+
+    assert result['ZINC_ID'].tolist() == expected['ZINC_ID'].tolist()
+    assert result['MWT'].tolist() == expected['MWT'].tolist()
+
+
+def test_threaded_text_reader_with_text_after_numbers(tmp_path, monkeypatch):
+    path = tmp_path / 'table.txt'
+    write_table(path, ['%d' % i for i in range(1000)] + ['abc', '1.5'])
+
+    result = read_threaded(path, monkeypatch)
+
+    assert len(result) == 1002
+    values = result['MWT'].tolist()
+    assert values[0] == 0
+    assert values[-2:] == ['abc', '1.5']
@@ -0,0 +1,20 @@
+from _type_index import record_atom_types
+from _type_index import sets_contain_any
+from _atom_selection import AtomSelection
+
+
+MIXED_WIDTH_RECORD = (b'@<TRIPOS>MOLECULE\nmol\n2 0\n'
+                      b'@<TRIPOS>ATOM\n'
+                      b' 1 C1 1.0 2.0 3.0 C.3 1 LIG1 0.1 BACKBONE\n'
+                      b' 2 O1 4.0 5.0 6.0 O.2 1 LIG1\n'
+                      b'@<TRIPOS>BOND\n')
+
+
+def test_record_atom_types_with_mixed_width_rows():
+    assert record_atom_types(MIXED_WIDTH_RECORD) == {b'C.3', b'O.2'}
+
+
+def test_sets_contain_any():
+    type_sets = [record_atom_types(MIXED_WIDTH_RECORD), {b'N.am'}]
+    selection = AtomSelection("atom_type == 'O.2'")
+    assert sets_contain_any(type_sets, selection).tolist() == [True, False]